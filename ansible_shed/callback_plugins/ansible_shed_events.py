@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+# Loaded by ansible-playbook, not by ansible_shed: only import ansible + stdlib
+
+import json
+import os
+from time import monotonic
+from typing import Any
+
+from ansible.plugins.callback import CallbackBase
+
+DOCUMENTATION = """
+    name: ansible_shed_events
+    type: aggregate
+    short_description: Stream newline delimited JSON run events to ansible_shed
+    description:
+      - Writes play/task/host result/recap events to the file descriptor in
+        ANSIBLE_SHED_EVENTS_FD so ansible_shed doesn't scrape stdout.
+      - Does nothing when ANSIBLE_SHED_EVENTS_FD is unset.
+"""
+
+# Keep in sync with ansible_shed.constants.EVENTS_FD_ENV
+EVENTS_FD_ENV = "ANSIBLE_SHED_EVENTS_FD"
+# PLAY RECAP names for stats.summarize() keys
+RECAP_KEYS = {"failures": "failed"}
+
+
+class CallbackModule(CallbackBase):  # type: ignore[misc]
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = "aggregate"
+    CALLBACK_NAME = "ansible_shed_events"
+    # Load from ANSIBLE_CALLBACK_PLUGINS alone so callbacks_enabled in the
+    # repo's ansible.cfg (e.g. profile_tasks) isn't overridden
+    CALLBACK_NEEDS_ENABLED = False
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._events = None
+        self._task: dict[str, Any] | None = None
+        self._task_started = 0.0
+        events_fd = os.environ.get(EVENTS_FD_ENV)
+        if events_fd:
+            fd = int(events_fd)
+            # Forked workers may keep it, but exec'd ssh (ControlPersist
+            # masters outlive the run) must not hold the pipe open
+            os.set_inheritable(fd, False)
+            self._events = os.fdopen(fd, "w", buffering=1)
+
+    def _emit(self, event: str, **fields: Any) -> None:
+        if self._events is None:
+            return
+        try:
+            self._events.write(
+                json.dumps({"event": event, **fields}, separators=(",", ":")) + "\n"
+            )
+        except OSError:
+            # ansible_shed went away; keep the playbook running
+            self._events = None
+
+    def _end_task(self) -> None:
+        if self._task is not None:
+            self._emit(
+                "task_end",
+                duration=round(monotonic() - self._task_started, 3),
+                **self._task,
+            )
+            self._task = None
+
+    def v2_playbook_on_play_start(self, play: Any) -> None:
+        self._end_task()
+        self._emit("play_start", play=play.get_name().strip())
+
+    def v2_playbook_on_task_start(self, task: Any, is_conditional: bool) -> None:
+        self._end_task()
+        role = task._role.get_name(include_role_fqcn=False) if task._role else ""
+        self._task = {"role": role, "task": task.get_name(include_role_fqcn=False)}
+        self._task_started = monotonic()
+        self._emit("task_start", **self._task)
+
+    def v2_playbook_on_handler_task_start(self, task: Any) -> None:
+        self.v2_playbook_on_task_start(task, False)
+
+    def _host_result(self, result: Any, status: str) -> None:
+        self._emit(
+            "host_result",
+            host=result._host.get_name(),
+            status=status,
+            duration=round(monotonic() - self._task_started, 3),
+        )
+
+    def v2_runner_on_ok(self, result: Any) -> None:
+        self._host_result(result, "changed" if result._result.get("changed") else "ok")
+
+    def v2_runner_on_failed(self, result: Any, ignore_errors: bool = False) -> None:
+        self._host_result(result, "ignored" if ignore_errors else "failed")
+
+    def v2_runner_on_skipped(self, result: Any) -> None:
+        self._host_result(result, "skipped")
+
+    def v2_runner_on_unreachable(self, result: Any) -> None:
+        self._host_result(result, "unreachable")
+
+    def v2_playbook_on_stats(self, stats: Any) -> None:
+        self._end_task()
+        hosts = {}
+        for host in sorted(stats.processed):
+            summary = stats.summarize(host)
+            hosts[host] = {RECAP_KEYS.get(k, k): v for k, v in summary.items()}
+        self._emit("stats", hosts=hosts)
+        if self._events is not None:
+            self._events.close()
+            self._events = None
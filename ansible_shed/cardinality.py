@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import logging
+import re
+from collections.abc import Iterable, Mapping
+
+from aioprometheus.collectors import Gauge
+
+from ansible_shed.label_tracker import label_key, LabelKey, LabelTracker
+
+LOG = logging.getLogger(__name__)
+# Label value of the series everything past a limit is summed into
+OTHER = "other"
+NORMALIZED = "*"
+
+
+def compile_normalizers(raw: str) -> tuple[re.Pattern[str], ...]:
+    """One regex per line; invalid ones are logged and skipped"""
+    patterns = []
+    for line in raw.splitlines():
+        if not (line := line.strip()):
+            continue
+        try:
+            patterns.append(re.compile(line))
+        except re.error as err:
+            LOG.warning(f"Ignoring invalid label normalization regex {line!r}: {err}")
+    return tuple(patterns)
+
+
+def normalize(value: str, patterns: Iterable[re.Pattern[str]]) -> str:
+    """Replace every match of patterns in value with *"""
+    for pattern in patterns:
+        value = pattern.sub(NORMALIZED, value)
+    return value
+
+
+class SeriesBudget:
+    """Caps the series a labeled gauge gets per update.
+
+    The first limit distinct label sets added are kept (callers add the most
+    important first, e.g. slowest tasks); values of later ones are summed
+    into their OTHER series. Adding a label set twice sums it, so
+    normalized names that collapse together become one series.
+    limit=0 means unlimited.
+    """
+
+    __slots__ = ("metric", "limit", "_series", "_other", "_dropped")
+
+    def __init__(self, metric: str, limit: int = 0) -> None:
+        self.metric = metric
+        self.limit = limit
+        self._series: dict[LabelKey, float] = {}
+        self._other: dict[LabelKey, float] = {}
+        self._dropped: set[LabelKey] = set()
+
+    def add(
+        self,
+        labels: Mapping[str, str],
+        value: float,
+        other_labels: Mapping[str, str],
+    ) -> None:
+        key = label_key(labels)
+        if key in self._series:
+            self._series[key] += value
+        elif not self.limit or len(self._series) < self.limit:
+            self._series[key] = value
+        else:
+            other_key = label_key(other_labels)
+            self._other[other_key] = self._other.get(other_key, 0.0) + value
+            self._dropped.add(key)
+
+    def export(self, tracker: LabelTracker, gauge: Gauge) -> int:
+        """Set the kept and OTHER series and reset; returns the dropped count"""
+        for key, value in (*self._series.items(), *self._other.items()):
+            tracker.set(gauge, dict(key), value)
+        dropped = len(self._dropped)
+        if dropped:
+            LOG.debug(
+                f"{dropped} {self.metric} series over the {self.limit} series "
+                f"limit rolled up into {OTHER}"
+            )
+        self._series = {}
+        self._other = {}
+        self._dropped = set()
+        return dropped
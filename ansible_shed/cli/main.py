@@ -112,14 +112,38 @@ def pause(ctx: click.core.Context, timestamp: str) -> None:
 
 
 @main.command("force-run")
+@click.option(
+    "--job",
+    default=None,
+    help="Only force run this job (default: every job)",
+)
+@click.pass_context
+def force_run(ctx: click.core.Context, job: str | None) -> None:
+    config, base_url = _get_context_options(ctx)
+    payload = asyncio.run(
+        _run_command(
+            config=config,
+            base_url=base_url,
+            operation=lambda client: client.force_run(job=job),
+        )
+    )
+    _emit_json(payload)
+
+
+@main.command("invalidate-facts")
+@click.option(
+    "--host",
+    default=None,
+    help="Only drop this host's cached facts (default: every host)",
+)
 @click.pass_context
-def force_run(ctx: click.core.Context) -> None:
+def invalidate_facts(ctx: click.core.Context, host: str | None) -> None:
     config, base_url = _get_context_options(ctx)
     payload = asyncio.run(
         _run_command(
             config=config,
             base_url=base_url,
-            operation=lambda client: client.force_run(),
+            operation=lambda client: client.invalidate_facts(host=host),
         )
     )
     _emit_json(payload)
@@ -37,8 +37,15 @@ class AnsibleShedApiClient:
     async def pause(self, timestamp: str) -> dict[str, object]:
         return await self._request_json("POST", "/pause", json={"timestamp": timestamp})
 
-    async def force_run(self) -> dict[str, object]:
-        return await self._request_json("POST", "/force-run")
+    async def force_run(self, job: str | None = None) -> dict[str, object]:
+        return await self._request_json(
+            "POST", "/force-run", json={"job": job} if job else None
+        )
+
+    async def invalidate_facts(self, host: str | None = None) -> dict[str, object]:
+        return await self._request_json(
+            "POST", "/facts/invalidate", json={"host": host} if host else None
+        )
 
     async def healthz(self) -> dict[str, object]:
         return await self._request_json("GET", "/healthz", expected_statuses={200, 503})
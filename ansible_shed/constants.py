@@ -3,3 +3,7 @@
 SHED_CONFIG_SECTION = "ansible_shed"
 DEFAULT_API_TOKEN_PLACEHOLDER = "change-me-random-token"
 DEFAULT_API_PORT = 12345
+# File descriptor the bundled ansible_shed_events callback plugin writes to
+EVENTS_FD_ENV = "ANSIBLE_SHED_EVENTS_FD"
+# Optional section of ansible environment performance knobs
+PERFORMANCE_CONFIG_SECTION = "performance"
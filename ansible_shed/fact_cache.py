@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import logging
+from collections.abc import Iterable
+from pathlib import Path
+
+LOG = logging.getLogger(__name__)
+
+
+class FactCache:
+    """The jsonfile fact cache directory ansible-playbook is pointed at.
+
+    ansible's jsonfile cache plugin keeps one file per host, named after the
+    host, rewritten whenever facts are gathered. File mtimes are all that's
+    needed to tell cached hosts from freshly gathered ones.
+    """
+
+    def __init__(self, cache_dir: Path) -> None:
+        self.cache_dir = cache_dir
+
+    def _host_mtimes(self) -> dict[str, float]:
+        mtimes: dict[str, float] = {}
+        if not self.cache_dir.is_dir():
+            return mtimes
+        for path in self.cache_dir.iterdir():
+            try:
+                if path.is_file():
+                    mtimes[path.name] = path.stat().st_mtime
+            except OSError:
+                # Removed by ansible (expired) while we looked
+                continue
+        return mtimes
+
+    def run_counts(self, run_hosts: Iterable[str], run_start: float) -> tuple[int, int]:
+        """(hits, misses) for a run: hosts whose facts came from the cache vs
+        were gathered during it. Hosts with no cached facts aren't counted."""
+        mtimes = self._host_mtimes()
+        hits = misses = 0
+        for host in run_hosts:
+            if host not in mtimes:
+                continue
+            if mtimes[host] >= run_start:
+                misses += 1
+            else:
+                hits += 1
+        return hits, misses
+
+    def host_count_and_oldest_age(self, now: float) -> tuple[int, int]:
+        mtimes = self._host_mtimes()
+        oldest_age = int(now - min(mtimes.values())) if mtimes else 0
+        return len(mtimes), max(oldest_age, 0)
+
+    def invalidate(self, host: str | None = None) -> list[str]:
+        """Delete cached facts for host (every host if None). Returns the hosts
+        removed; unknown or path-like host names remove nothing."""
+        if host is None:
+            hosts = sorted(self._host_mtimes())
+        elif host in self._host_mtimes():
+            # Only ever a name listed from cache_dir, never a path from the API
+            hosts = [host]
+        else:
+            return []
+        for cached_host in hosts:
+            (self.cache_dir / cached_host).unlink(missing_ok=True)
+        LOG.info(f"Invalidated cached facts for {len(hosts)} hosts")
+        return hosts
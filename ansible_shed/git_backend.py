@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import asyncio
+import logging
+import os
+import signal
+from collections.abc import Mapping
+from pathlib import Path
+
+LOG = logging.getLogger(__name__)
+DEFAULT_GIT_TIMEOUT_SECONDS = 300
+GIT_KILL_GRACE_SECONDS = 5
+
+
+class GitError(Exception):
+    """A git command failed, timed out or couldn't be started"""
+
+
+def _git_error(args: tuple[str, ...], status: str, stderr: str = "") -> GitError:
+    return GitError(f"git {' '.join(args)} {status}: {stderr.strip()}")
+
+
+class AsyncGit:
+    """Run git commands as asyncio subprocesses against one repo.
+
+    Every command is a short lived `git` process: nothing is held open
+    between calls. Each call has a timeout; on timeout or cancellation the
+    whole process group (git and its ssh child) is killed so a stuck remote
+    can never wedge the caller. env (e.g. GIT_SSH_COMMAND) is applied to
+    every call on top of the current os.environ.
+    """
+
+    def __init__(
+        self,
+        repo_path: Path,
+        env: Mapping[str, str] | None = None,
+        timeout_seconds: float = DEFAULT_GIT_TIMEOUT_SECONDS,
+    ) -> None:
+        self.repo_path = repo_path
+        # Fail instead of waiting on a credential prompt nobody will answer
+        self.env = {"GIT_TERMINAL_PROMPT": "0", **(env or {})}
+        self.timeout_seconds = timeout_seconds
+
+    async def run(
+        self, *args: str, cwd: Path | None = None, timeout: float | None = None
+    ) -> str:
+        """Run `git <args>` in cwd (default repo_path) and return its stdout"""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "git",
+                *args,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=cwd or self.repo_path,
+                env={**os.environ, **self.env},
+                start_new_session=True,
+            )
+        except OSError as err:
+            raise _git_error(args, "failed to start", str(err)) from err
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                process.communicate(), timeout or self.timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            await self._kill(process)
+            raise _git_error(
+                args, f"timed out after {timeout or self.timeout_seconds}s"
+            ) from None
+        except asyncio.CancelledError:
+            await self._kill(process)
+            raise
+        if process.returncode != 0:
+            raise _git_error(
+                args,
+                f"exited {process.returncode}",
+                stderr.decode("utf-8", errors="replace"),
+            )
+        return stdout.decode("utf-8", errors="replace")
+
+    @staticmethod
+    async def _kill(process: asyncio.subprocess.Process) -> None:
+        if process.returncode is not None:
+            return
+        LOG.warning(f"Killing git (pid {process.pid})")
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            return
+        try:
+            await asyncio.wait_for(process.wait(), GIT_KILL_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            LOG.error(f"git (pid {process.pid}) didn't exit after SIGKILL")
+
+    async def clone(self, url: str, branch: str, options: list[str]) -> None:
+        await self.run(
+            "clone",
+            "--quiet",
+            "--branch",
+            branch,
+            *options,
+            "--",
+            url,
+            str(self.repo_path),
+            cwd=self.repo_path.parent,
+        )
+
+    async def fetch(self, depth: int = 0) -> None:
+        # Keep shallow clones shallow; a plain fetch would pull in whatever
+        # history links the new commits to the shallow boundary
+        depth_args = [f"--depth={depth}"] if depth else []
+        await self.run("fetch", "--quiet", *depth_args, "origin")
+
+    async def checkout(self, ref: str) -> None:
+        await self.run("checkout", "--quiet", ref)
+
+    async def rev_parse(self, ref: str) -> str:
+        return (await self.run("rev-parse", "--verify", f"{ref}^{{commit}}")).strip()
+
+    async def reset_hard(self, ref: str) -> None:
+        await self.run("reset", "--quiet", "--hard", ref)
+
+    async def clean(self) -> None:
+        await self.run("clean", "-ffdxq")
+
+    async def changed_paths(self, old_sha: str, new_sha: str) -> list[str]:
+        # --no-renames lists both sides of a rename
+        diff = await self.run("diff", "--name-only", "--no-renames", old_sha, new_sha)
+        return [path for path in diff.splitlines() if path]
+
+    async def worktree_add(self, path: Path, sha: str) -> None:
+        await self.run("worktree", "add", "--quiet", "--detach", str(path), sha)
+
+    async def worktree_remove(self, path: Path) -> None:
+        await self.run("worktree", "remove", "--force", str(path))
+
+    async def worktree_prune(self) -> None:
+        await self.run("worktree", "prune")
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+from collections.abc import ItemsView, Iterator, Mapping
+
+# PLAY RECAP counters, each exported as a {hostname, shed_job} gauge
+HOST_STAT_NAMES = (
+    "ok",
+    "changed",
+    "unreachable",
+    "failed",
+    "skipped",
+    "rescued",
+    "ignored",
+)
+# Counters that mean a --check run found drift, exported as ansible_check_*
+CHECK_STAT_NAMES = ("changed", "failed", "unreachable")
+
+
+class HostStats:
+    """One host's PLAY RECAP counters"""
+
+    __slots__ = HOST_STAT_NAMES
+
+    def __init__(
+        self,
+        ok: int = 0,
+        changed: int = 0,
+        unreachable: int = 0,
+        failed: int = 0,
+        skipped: int = 0,
+        rescued: int = 0,
+        ignored: int = 0,
+    ) -> None:
+        self.ok = ok
+        self.changed = changed
+        self.unreachable = unreachable
+        self.failed = failed
+        self.skipped = skipped
+        self.rescued = rescued
+        self.ignored = ignored
+
+    @classmethod
+    def from_recap(cls, recap: Mapping[str, int]) -> "HostStats":
+        """Build from a parser's {stat: count}; unknown stats are dropped"""
+        return cls(
+            ok=recap.get("ok", 0),
+            changed=recap.get("changed", 0),
+            unreachable=recap.get("unreachable", 0),
+            failed=recap.get("failed", 0),
+            skipped=recap.get("skipped", 0),
+            rescued=recap.get("rescued", 0),
+            ignored=recap.get("ignored", 0),
+        )
+
+    def values(self) -> tuple[int, ...]:
+        """Counters in HOST_STAT_NAMES order"""
+        return (
+            self.ok,
+            self.changed,
+            self.unreachable,
+            self.failed,
+            self.skipped,
+            self.rescued,
+            self.ignored,
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, HostStats):
+            return NotImplemented
+        return self.values() == other.values()
+
+    def __repr__(self) -> str:
+        stats = ", ".join(
+            f"{k}={v}" for k, v in zip(HOST_STAT_NAMES, self.values(), strict=True)
+        )
+        return f"HostStats({stats})"
+
+
+class HostStatsStore:
+    """A job's last run per host stats, keyed by hostname.
+
+    Full runs replace the whole store, so hosts missing from the latest PLAY
+    RECAP don't linger. Runs narrowed with --limit/--tags only update() the
+    hosts they ran on.
+    """
+
+    __slots__ = ("_hosts",)
+
+    def __init__(self) -> None:
+        self._hosts: dict[str, HostStats] = {}
+
+    def replace(self, host_stats: Mapping[str, Mapping[str, int]]) -> None:
+        self._hosts = {
+            hostname: HostStats.from_recap(recap)
+            for hostname, recap in host_stats.items()
+        }
+
+    def update(self, host_stats: Mapping[str, Mapping[str, int]]) -> None:
+        for hostname, recap in host_stats.items():
+            self._hosts[hostname] = HostStats.from_recap(recap)
+
+    def get(self, hostname: str) -> HostStats | None:
+        return self._hosts.get(hostname)
+
+    def items(self) -> ItemsView[str, HostStats]:
+        return self._hosts.items()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._hosts)
+
+    def __len__(self) -> int:
+        return len(self._hosts)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+from collections import defaultdict
+from configparser import ConfigParser, SectionProxy
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from ansible_shed.constants import SHED_CONFIG_SECTION
+from ansible_shed.host_stats import HostStatsStore
+from ansible_shed.live_log import LiveRunLog
+from ansible_shed.output_parser import AnsibleOutputParser
+
+DEFAULT_JOB_NAME = "default"
+JOB_SECTION_PREFIX = "job:"
+
+
+@dataclass(frozen=True)
+class JobConfig:
+    """One scheduled ansible-playbook invocation.
+
+    The [ansible_shed] section is always the "default" job. Each extra
+    [job:<name>] section adds another job; playbook, inventory, diff and
+    interval fall back to [ansible_shed] but limit/tags/skip_tags don't, so a
+    narrow tag job never inherits the main job's filters.
+    """
+
+    name: str
+    playbook: str
+    inventory: str
+    interval_seconds: int
+    # Lower runs first when several jobs are due at once
+    priority: int = 0
+    show_diff: bool = False
+    limit: str | None = None
+    tags: str | None = None
+    skip_tags: str | None = None
+
+
+@dataclass
+class JobState:
+    """Runtime state for a job that survives config reloads"""
+
+    prom_stats: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    # PLAY RECAP counters per host from the last full run, updated by
+    # targeted runs; --check runs only set check_host_stats
+    host_stats: HostStatsStore = field(default_factory=HostStatsStore)
+    check_host_stats: HostStatsStore = field(default_factory=HostStatsStore)
+    profile_task_runtimes: list[dict[str, float | str]] = field(default_factory=list)
+    profile_role_runtimes: dict[str, float] = field(default_factory=dict)
+    # Durations not yet observed by the histograms: (mode, seconds) with mode
+    # full/targeted/check, (role, seconds)
+    run_duration_samples: list[tuple[str, float]] = field(default_factory=list)
+    task_duration_samples: list[tuple[str, float]] = field(default_factory=list)
+    next_run_epoch: float = 0.0
+    force_run_pending: bool = False
+    running: bool = False
+    # Commit and job config of the last full run that exited 0
+    last_success_sha: str | None = None
+    last_success_job: JobConfig | None = None
+    # Start of the last run that wasn't --check or narrowed by targeted_runs
+    last_full_run_epoch: float = 0.0
+    # Last run decision ("run", "skip", "check" or "targeted") and why
+    last_decision: str = "run"
+    last_decision_reason: str = "startup"
+    # Set while ansible-playbook runs; one parser per process (shard)
+    run_started_epoch: float | None = None
+    live_parsers: list[AnsibleOutputParser] = field(default_factory=list)
+    live_log: LiveRunLog | None = None
+    # Checkout the running job was started from; kept from git_worktrees GC
+    checkout_path: Path | None = None
+    # Commit checked out at checkout_path when the job started
+    checkout_sha: str | None = None
+
+
+def _job_from_section(
+    name: str, section: SectionProxy, main_section: SectionProxy
+) -> JobConfig:
+    return JobConfig(
+        name=name,
+        playbook=section.get(
+            "ansible_playbook_init", fallback=main_section["ansible_playbook_init"]
+        ),
+        inventory=section.get(
+            "ansible_hosts_inventory",
+            fallback=main_section["ansible_hosts_inventory"],
+        ),
+        interval_seconds=section.getint(
+            "interval", fallback=main_section.getint("interval", fallback=60)
+        )
+        * 60,
+        priority=section.getint("priority", fallback=0),
+        show_diff=section.getboolean(
+            "ansible_show_diff",
+            fallback=main_section.getboolean("ansible_show_diff", fallback=False),
+        ),
+        limit=section.get("ansible_limit") or None,
+        tags=section.get("ansible_tags") or None,
+        skip_tags=section.get("ansible_skip_tags") or None,
+    )
+
+
+def load_job_configs(cp: ConfigParser) -> dict[str, JobConfig]:
+    """Build every configured job: "default" plus one per [job:<name>] section"""
+    main_section = cp[SHED_CONFIG_SECTION]
+    jobs = {
+        DEFAULT_JOB_NAME: _job_from_section(
+            DEFAULT_JOB_NAME, main_section, main_section
+        )
+    }
+    for section_name in cp.sections():
+        if not section_name.startswith(JOB_SECTION_PREFIX):
+            continue
+        job_name = section_name[len(JOB_SECTION_PREFIX) :].strip()
+        if not job_name or job_name in jobs:
+            raise ValueError(f"Invalid or duplicate job section [{section_name}]")
+        jobs[job_name] = _job_from_section(job_name, cp[section_name], main_section)
+    return jobs
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+from collections.abc import Mapping
+
+from aioprometheus.collectors import Counter, Gauge
+
+# Hashable, order independent form of a series' labels
+LabelKey = tuple[tuple[str, str], ...]
+# Collectors whose series are set to absolute values
+Settable = Counter | Gauge
+
+
+def label_key(labels: Mapping[str, str]) -> LabelKey:
+    return tuple(sorted(labels.items()))
+
+
+class LabelTracker:
+    """Active label sets of labeled gauges and counters, for stale series removal.
+
+    Each update sets its series through set(); prune() then removes every
+    series a gauge had after the previous prune() that wasn't set again.
+    Hosts, packages, tasks etc. that disappear stop being exported, in time
+    linear in the number of series.
+    """
+
+    __slots__ = ("_gauges", "_active", "_seen")
+
+    def __init__(self) -> None:
+        self._gauges: dict[str, Settable] = {}
+        # Series per gauge name as of the last prune() / in this update
+        self._active: dict[str, set[LabelKey]] = {}
+        self._seen: dict[str, set[LabelKey]] = {}
+
+    def set(self, gauge: Settable, labels: Mapping[str, str], value: float) -> None:
+        gauge.set(dict(labels), value)
+        self._gauges.setdefault(gauge.name, gauge)
+        self._seen.setdefault(gauge.name, set()).add(label_key(labels))
+
+    def active(self, gauge: Settable) -> frozenset[LabelKey]:
+        return frozenset(self._active.get(gauge.name, ()))
+
+    def prune(self) -> int:
+        """Drop series not set since the last prune; returns the active count"""
+        for name, gauge in self._gauges.items():
+            seen = self._seen.get(name, set())
+            for stale in self._active.get(name, set()) - seen:
+                gauge.values.pop(dict(stale), None)
+            self._active[name] = seen
+        self._seen = {}
+        return sum(len(series) for series in self._active.values())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import asyncio
+from collections import deque
+from collections.abc import AsyncIterator
+
+# Tail of a running job's log kept in memory for live followers
+LIVE_LOG_BUFFER_BYTES = 1024 * 1024
+
+
+class LiveRunLog:
+    """In memory fan-out of a running job's log to any number of followers.
+
+    publish() only appends to a bounded buffer and wakes followers, so it
+    never waits on them. Each follower reads from its own byte offset, which
+    matches the run's log file, at whatever pace its client manages; one that
+    falls more than max_bytes behind skips ahead to the oldest buffered byte.
+    """
+
+    def __init__(
+        self, run_id: str, job: str, max_bytes: int = LIVE_LOG_BUFFER_BYTES
+    ) -> None:
+        self.run_id = run_id
+        self.job = job
+        self.max_bytes = max_bytes
+        # Offset of the byte after the last one published
+        self.end_offset = 0
+        self.returncode: int | None = None
+        self.closed = False
+        # (offset, data) of buffered chunks, oldest first
+        self._chunks: deque[tuple[int, bytes]] = deque()
+        self._buffered_bytes = 0
+        self._updated = asyncio.Event()
+
+    @property
+    def start_offset(self) -> int:
+        """Oldest offset still buffered"""
+        return self._chunks[0][0] if self._chunks else self.end_offset
+
+    def publish(self, data: bytes) -> None:
+        if not data or self.closed:
+            return
+        self._chunks.append((self.end_offset, data))
+        self.end_offset += len(data)
+        self._buffered_bytes += len(data)
+        # Always keep the newest chunk, even if it alone is over max_bytes
+        while self._buffered_bytes > self.max_bytes and len(self._chunks) > 1:
+            _, dropped = self._chunks.popleft()
+            self._buffered_bytes -= len(dropped)
+        self._wake()
+
+    def close(self, returncode: int) -> None:
+        self.returncode = returncode
+        self.closed = True
+        self._wake()
+
+    def _wake(self) -> None:
+        # Followers wait on the event they saw; a new one for the next update
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    def read(self, offset: int) -> tuple[int, bytes]:
+        """(start, data): everything buffered from offset, or from the oldest
+        buffered byte if offset has already been dropped"""
+        offset = min(max(offset, self.start_offset), self.end_offset)
+        parts = []
+        for chunk_offset, data in reversed(self._chunks):
+            if chunk_offset + len(data) <= offset:
+                break
+            parts.append(data[max(offset - chunk_offset, 0) :])
+        return offset, b"".join(reversed(parts))
+
+    async def follow(self, offset: int = 0) -> AsyncIterator[tuple[int, bytes]]:
+        """Yield (start, data) from offset until the run's log is closed.
+
+        start is past the requested offset when a slow follower skipped bytes.
+        """
+        while True:
+            updated = self._updated
+            start, data = self.read(offset)
+            if data:
+                yield start, data
+                offset = start + len(data)
+            elif self.closed:
+                return
+            else:
+                await updated.wait()
@@ -39,6 +39,7 @@ async def async_main(debug: bool, config: str) -> int:
         return 1
 
     s = Shed(config_path)
+    asyncio.get_running_loop().set_default_executor(s.executor)
     await asyncio.gather(s.prometheus_server(), s.ansible_runner())
     return 0
 
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import gzip
+import hashlib
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from aioprometheus.collectors import Registry
+from aioprometheus.negotiator import negotiate
+from aioprometheus.renderer import render
+
+GZIP_LEVEL = 6
+
+
+@dataclass(frozen=True)
+class RenderedMetrics:
+    body: bytes
+    headers: dict[str, str]
+    etag: str
+
+
+class MetricsCache:
+    """Rendered /metrics bodies, reused until the registry next changes.
+
+    Metrics only change when the stats / live gauges are refreshed, which
+    call invalidate(). Every scrape in between (multiple Prometheus replicas,
+    federation) is served the same bytes without walking the registry.
+    """
+
+    def __init__(self) -> None:
+        self.generation = 0
+        self.renders = 0
+        self._rendered: dict[tuple[str, bool], RenderedMetrics] = {}
+
+    def invalidate(self) -> None:
+        self.generation += 1
+        self._rendered.clear()
+
+    def get(
+        self, registry: Registry, accepts: Sequence[str], compress: bool
+    ) -> RenderedMetrics:
+        key = (negotiate(accepts).__name__, compress)
+        if key not in self._rendered:
+            self.renders += 1
+            body, rendered_headers = render(registry, accepts)
+            headers: dict[str, str] = dict(rendered_headers)
+            # Content hash: unchanged output keeps its ETag across generations
+            digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+            opaque_tag = f"{digest}-gz" if compress else digest
+            # ETags are double quoted; !r would single quote them
+            etag = f'"{opaque_tag}"'  # noqa: B907
+            if compress:
+                body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+                headers["Content-Encoding"] = "gzip"
+            headers["ETag"] = etag
+            headers["Vary"] = "Accept, Accept-Encoding"
+            self._rendered[key] = RenderedMetrics(body, headers, etag)
+        return self._rendered[key]
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip; q=0 refuses a coding"""
+    qualities: dict[str, float] = {}
+    for coding in accept_encoding.split(","):
+        name, *params = (part.strip() for part in coding.split(";"))
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name.lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match check; weak comparison as RFC 9110 asks for GET"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
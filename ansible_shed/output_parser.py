@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+import heapq
+import re
+from collections.abc import Iterable
+from time import perf_counter
+from typing import Any
+
+
+class AnsibleOutputParser:
+    """Incremental parser for ansible-playbook output.
+
+    Lines are fed in as they are read from the subprocess pipe so a run's
+    output never has to be held in memory. State is bounded by the number
+    of hosts in the PLAY RECAP and by profile_tasks_top_n (or the number of
+    tasks with keep_task_runtimes), never by the size of the output.
+
+    With structured=True run results come from the ansible_shed_events
+    callback plugin via feed_event() and text lines only count warnings.
+    """
+
+    # Anchored: unanchored, a long run of word characters backtracks
+    # quadratically on every start position
+    ansible_stats_line_re = re.compile(r"^([\w.\-]+)\s+: (ok=.*)")
+    # ansible.posix.profile_tasks TASKS RECAP body row, e.g.:
+    #   "ansible_shed : Install latest ansible_shed --------- 29.80s"
+    profile_task_row_re = re.compile(
+        r"^(?P<name>.+?) -+\s+(?P<seconds>\d+(?:\.\d+)?)s\s*$"
+    )
+    profile_tasks_recap_header_re = re.compile(r"^TASKS RECAP \*+\s*$")
+    profile_task_header_re = re.compile(r"^TASK \[")
+    task_name_re = re.compile(r"^TASK \[(?P<name>.*)\]")
+    play_header_re = re.compile(r"^PLAY \[(?P<name>.*)\]")
+    # "fatal: [host]: FAILED! =>", "fatal: [host]: UNREACHABLE! =>" and
+    # loop item failures "failed: [host] (item=...) =>"
+    host_failure_re = re.compile(
+        r"^(?:fatal: \[(?P<fatal_host>[^\]\s]+)[^\]]*\]: "
+        r"(?P<kind>FAILED|UNREACHABLE)!"
+        r"|failed: \[(?P<failed_host>[^\]\s]+)[^\]]*\])"
+    )
+    profile_warning_re = re.compile(r"^\[WARNING\]:")
+    profile_deprecation_re = re.compile(r"^\[DEPRECATION WARNING\]:")
+
+    def __init__(
+        self,
+        profile_tasks_top_n: int = 20,
+        structured: bool = False,
+        keep_task_runtimes: bool = False,
+    ) -> None:
+        self.profile_tasks_top_n = profile_tasks_top_n
+        self.structured = structured
+        self.keep_task_runtimes = keep_task_runtimes
+        self.event_count = 0
+        self.host_stats: dict[str, dict[str, int]] = {}
+        self.task_count = 0
+        self.warnings_count = 0
+        self.deprecation_count = 0
+        self.recap_row_count = 0
+        self._recap_row_index = 0
+        self._in_recap = False
+        # Live progress, readable while the run is still going
+        self.current_play = ""
+        self.current_task = ""
+        self.live_host_failures: dict[str, dict[str, int]] = {}
+        # Min-heap of (seconds, -row_index, role, task) holding the top-N
+        # TASKS RECAP rows. The negated index keeps the earliest row on ties,
+        # matching a stable descending sort of every row.
+        self._top_recap_rows: list[tuple[float, int, str, str]] = []
+        # Every (role, task, seconds) row when keep_task_runtimes is set, for
+        # run history; grows with the playbook's tasks, not its output
+        self.task_runtimes: list[tuple[str, str, float]] = []
+        # Seconds spent in feed()/feed_event(); parsing happens as output
+        # streams in, so this is the parse cost of the run
+        self.feed_seconds = 0.0
+
+    def feed(self, output: str) -> None:
+        """Feed one or more complete lines of output into the parser."""
+        start = perf_counter()
+        for line in output.splitlines():
+            self._feed_line(line)
+        self.feed_seconds += perf_counter() - start
+
+    def _feed_line(self, line: str) -> None:
+        if self.structured:
+            self._feed_warning_line(line)
+            return
+
+        if lm := self.ansible_stats_line_re.match(line):
+            hostname = lm.group(1)
+            host_stats = self.host_stats.setdefault(hostname, {})
+            for stat in lm.group(2).split():
+                k, v = stat.split("=", maxsplit=1)
+                host_stats[k] = int(v)
+
+        if self.profile_task_header_re.match(line):
+            self.task_count += 1
+            if tm := self.task_name_re.match(line):
+                self.current_task = tm.group("name")
+        elif pm := self.play_header_re.match(line):
+            self.current_play = pm.group("name")
+            self.current_task = ""
+        elif fm := self.host_failure_re.match(line):
+            if fm.group("fatal_host"):
+                hostname = fm.group("fatal_host")
+                kind = fm.group("kind").lower()
+            else:
+                hostname, kind = fm.group("failed_host"), "failed"
+            self._count_host_failure(hostname, kind)
+        self._feed_warning_line(line)
+        self._feed_recap_line(line)
+
+    def _feed_warning_line(self, line: str) -> None:
+        if self.profile_deprecation_re.match(line):
+            self.deprecation_count += 1
+        elif self.profile_warning_re.match(line):
+            self.warnings_count += 1
+
+    def _count_host_failure(self, hostname: str, kind: str) -> None:
+        host_failures = self.live_host_failures.setdefault(hostname, {})
+        host_failures[kind] = host_failures.get(kind, 0) + 1
+
+    def feed_event(self, event: dict[str, Any]) -> None:
+        """Apply one decoded ansible_shed_events callback event.
+
+        Raises KeyError/TypeError/ValueError on a malformed event.
+        """
+        start = perf_counter()
+        try:
+            self._feed_event(event)
+        finally:
+            self.feed_seconds += perf_counter() - start
+
+    def _feed_event(self, event: dict[str, Any]) -> None:
+        self.event_count += 1
+        kind = event["event"]
+        if kind == "play_start":
+            self.current_play = str(event["play"])
+            self.current_task = ""
+        elif kind == "task_start":
+            self.task_count += 1
+            role, task = str(event["role"]), str(event["task"])
+            self.current_task = f"{role} : {task}" if role else task
+        elif kind == "host_result":
+            if event["status"] in ("failed", "unreachable"):
+                self._count_host_failure(str(event["host"]), event["status"])
+        elif kind == "task_end":
+            self.recap_row_count += 1
+            self._push_recap_row(
+                str(event["role"]), str(event["task"]), float(event["duration"])
+            )
+        elif kind == "stats":
+            for hostname, host_stats in event["hosts"].items():
+                self.host_stats[hostname] = {k: int(v) for k, v in host_stats.items()}
+
+    def _feed_recap_line(self, line: str) -> None:
+        if self.profile_tasks_recap_header_re.match(line):
+            self._in_recap = True
+            return
+        if not self._in_recap:
+            return
+        stripped = line.strip()
+        if stripped.startswith("PLAYBOOK RECAP") or (
+            not stripped and self.recap_row_count
+        ):
+            self._in_recap = False
+            return
+        row = self._parse_recap_row(line)
+        if row is None:
+            return
+        self.recap_row_count += 1
+        self._push_recap_row(*row)
+
+    def _push_recap_row(self, role: str, task: str, seconds: float) -> None:
+        if self.keep_task_runtimes:
+            self.task_runtimes.append((role, task, seconds))
+        self._push_top_row(role, task, seconds)
+
+    def _push_top_row(self, role: str, task: str, seconds: float) -> None:
+        entry = (seconds, -self._recap_row_index, role, task)
+        self._recap_row_index += 1
+        if self.profile_tasks_top_n <= 0:
+            return
+        if len(self._top_recap_rows) < self.profile_tasks_top_n:
+            heapq.heappush(self._top_recap_rows, entry)
+        elif entry > self._top_recap_rows[0]:
+            heapq.heapreplace(self._top_recap_rows, entry)
+
+    def _parse_recap_row(self, line: str) -> tuple[str, str, float] | None:
+        """Parse one TASKS RECAP body line into (role, task, seconds) or None."""
+        m = self.profile_task_row_re.match(line)
+        if not m:
+            return None
+        name = m.group("name").strip()
+        try:
+            seconds = float(m.group("seconds"))
+        except ValueError:
+            return None
+        if " : " in name:
+            role, task = name.split(" : ", 1)
+        else:
+            role, task = "", name
+        return role, task, seconds
+
+    def merge(self, other: "AnsibleOutputParser") -> None:
+        """Fold another parser's results (e.g. from a --limit shard) into this one.
+
+        Shards run the same playbook in parallel, so task_count is the most
+        TASK headers any one shard saw and a task's runtime is its slowest
+        shard's. Warnings, failures and feed_seconds add up.
+        """
+        for hostname, host_stats in other.host_stats.items():
+            self.host_stats.setdefault(hostname, {}).update(host_stats)
+        self.task_count = max(self.task_count, other.task_count)
+        self.warnings_count += other.warnings_count
+        self.deprecation_count += other.deprecation_count
+        self.recap_row_count += other.recap_row_count
+        self.event_count += other.event_count
+        self.feed_seconds += other.feed_seconds
+        for hostname, host_failures in other.live_host_failures.items():
+            merged = self.live_host_failures.setdefault(hostname, {})
+            for kind, count in host_failures.items():
+                merged[kind] = merged.get(kind, 0) + count
+        top_rows = _slowest_rows(
+            (*self.top_task_runtimes(), *other.top_task_runtimes())
+        )
+        self._top_recap_rows = []
+        for role, task, seconds in top_rows:
+            self._push_top_row(role, task, seconds)
+        self.task_runtimes = _slowest_rows((*self.task_runtimes, *other.task_runtimes))
+
+    def top_task_runtimes(self) -> list[tuple[str, str, float]]:
+        """Top-N (role, task, seconds) rows by descending duration."""
+        return [
+            (role, task, seconds)
+            for seconds, _, role, task in sorted(self._top_recap_rows, reverse=True)
+        ]
+
+
+def _slowest_rows(
+    rows: Iterable[tuple[str, str, float]],
+) -> list[tuple[str, str, float]]:
+    """One row per (role, task) with its longest seconds, in first seen order"""
+    slowest: dict[tuple[str, str], float] = {}
+    for role, task, seconds in rows:
+        slowest[(role, task)] = max(seconds, slowest.get((role, task), 0.0))
+    return [(role, task, seconds) for (role, task), seconds in slowest.items()]
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+from configparser import ConfigParser
+from dataclasses import dataclass
+from pathlib import Path
+
+from ansible_shed.constants import PERFORMANCE_CONFIG_SECTION
+
+ANSIBLE_STRATEGIES = ("linear", "free", "host_pinned", "debug")
+# %C is a hash of the connection (host, port, user): short enough for the
+# 104/108 byte unix socket path limit
+SSH_CONTROL_PATH = "%(directory)s/%%C"
+# Label value for settings left to the repo's ansible.cfg
+UNSET = "ansible.cfg"
+
+
+@dataclass(frozen=True)
+class PerformanceProfile:
+    """[performance] settings injected into ansible-playbook's environment.
+
+    None leaves the setting to ansible.cfg / ansible's default.
+    """
+
+    forks: int | None = None
+    pipelining: bool | None = None
+    # Seconds idle SSH masters are kept; 0 turns multiplexing off
+    control_persist: int | None = None
+    control_path_dir: Path | None = None
+    strategy: str | None = None
+    callbacks: tuple[str, ...] | None = None
+    # Seconds cached facts are valid (0 never expires); None disables the
+    # shed managed jsonfile fact cache
+    fact_cache_ttl: int | None = None
+    fact_cache_dir: Path | None = None
+
+    def env(self) -> dict[str, str]:
+        env = {}
+        if self.forks is not None:
+            env["ANSIBLE_FORKS"] = str(self.forks)
+        if self.pipelining is not None:
+            env["ANSIBLE_PIPELINING"] = str(self.pipelining)
+        if self.control_persist is not None:
+            if self.control_persist:
+                env["ANSIBLE_SSH_ARGS"] = (
+                    "-C -o ControlMaster=auto "
+                    f"-o ControlPersist={self.control_persist}s"
+                )
+            else:
+                env["ANSIBLE_SSH_ARGS"] = "-C -o ControlMaster=no"
+        if self.control_persist and self.control_path_dir:
+            env["ANSIBLE_SSH_CONTROL_PATH_DIR"] = str(self.control_path_dir)
+            env["ANSIBLE_SSH_CONTROL_PATH"] = SSH_CONTROL_PATH
+        if self.strategy is not None:
+            env["ANSIBLE_STRATEGY"] = self.strategy
+        if self.callbacks is not None:
+            env["ANSIBLE_CALLBACKS_ENABLED"] = ",".join(self.callbacks)
+        if self.fact_cache_ttl is not None and self.fact_cache_dir:
+            env["ANSIBLE_GATHERING"] = "smart"
+            env["ANSIBLE_CACHE_PLUGIN"] = "jsonfile"
+            env["ANSIBLE_CACHE_PLUGIN_CONNECTION"] = str(self.fact_cache_dir)
+            env["ANSIBLE_CACHE_PLUGIN_TIMEOUT"] = str(self.fact_cache_ttl)
+        return env
+
+    def info_labels(self) -> dict[str, str]:
+        """Effective settings as ansible_performance_info labels"""
+
+        def label(value: object) -> str:
+            return UNSET if value is None else str(value).lower()
+
+        return {
+            "forks": label(self.forks),
+            "pipelining": label(self.pipelining),
+            "control_persist": label(self.control_persist),
+            "strategy": label(self.strategy),
+            "callbacks": UNSET if self.callbacks is None else ",".join(self.callbacks),
+            "fact_cache_ttl": label(self.fact_cache_ttl),
+        }
+
+
+def load_performance_profile(
+    config: ConfigParser, default_control_path_dir: Path, default_fact_cache_dir: Path
+) -> PerformanceProfile:
+    """Parse the optional [performance] section. Raises ValueError if invalid"""
+    if not config.has_section(PERFORMANCE_CONFIG_SECTION):
+        return PerformanceProfile()
+    section = config[PERFORMANCE_CONFIG_SECTION]
+
+    forks = section.getint("forks", fallback=None)
+    if forks is not None and forks < 1:
+        raise ValueError(f"[{PERFORMANCE_CONFIG_SECTION}] forks must be >= 1")
+    control_persist = section.getint("control_persist", fallback=None)
+    if control_persist is not None and control_persist < 0:
+        raise ValueError(f"[{PERFORMANCE_CONFIG_SECTION}] control_persist must be >= 0")
+    strategy = section.get("strategy", fallback=None)
+    if strategy is not None and strategy not in ANSIBLE_STRATEGIES:
+        raise ValueError(
+            f"[{PERFORMANCE_CONFIG_SECTION}] strategy must be one of "
+            f"{', '.join(ANSIBLE_STRATEGIES)}"
+        )
+    callbacks_raw = section.get("callbacks", fallback=None)
+    callbacks = (
+        tuple(c.strip() for c in callbacks_raw.split(",") if c.strip())
+        if callbacks_raw is not None
+        else None
+    )
+    fact_cache_ttl = section.getint("fact_cache_ttl", fallback=None)
+    if fact_cache_ttl is not None and fact_cache_ttl < 0:
+        raise ValueError(f"[{PERFORMANCE_CONFIG_SECTION}] fact_cache_ttl must be >= 0")
+    control_path_dir = section.get("control_path_dir", fallback=None)
+    fact_cache_dir = section.get("fact_cache_dir", fallback=None)
+    return PerformanceProfile(
+        forks=forks,
+        pipelining=section.getboolean("pipelining", fallback=None),
+        control_persist=control_persist,
+        control_path_dir=(
+            Path(control_path_dir) if control_path_dir else default_control_path_dir
+        ),
+        strategy=strategy,
+        callbacks=callbacks,
+        fact_cache_ttl=fact_cache_ttl,
+        fact_cache_dir=(
+            Path(fact_cache_dir) if fact_cache_dir else default_fact_cache_dir
+        ),
+    )
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+
+import logging
+import sqlite3
+from collections.abc import Callable, Mapping, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from math import ceil
+from pathlib import Path
+from time import time
+from typing import TypeVar
+
+from ansible_shed.host_stats import HOST_STAT_NAMES, HostStats
+
+LOG = logging.getLogger(__name__)
+T = TypeVar("T")
+# Task rows returned in a summary, slowest p95 first
+SUMMARY_TASKS_LIMIT = 20
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    job TEXT NOT NULL,
+    sha TEXT,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    returncode INTEGER NOT NULL,
+    check_mode INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_job_start ON runs (job, start);
+CREATE INDEX IF NOT EXISTS runs_start ON runs (start);
+CREATE TABLE IF NOT EXISTS run_hosts (
+    run_id TEXT NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    hostname TEXT NOT NULL,
+    {", ".join(f"{name} INTEGER NOT NULL" for name in HOST_STAT_NAMES)},
+    PRIMARY KEY (run_id, hostname)
+);
+CREATE TABLE IF NOT EXISTS run_tasks (
+    run_id TEXT NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    task TEXT NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS run_tasks_run_id ON run_tasks (run_id);
+"""
+
+
+@dataclass
+class RunRecord:
+    """One finished ansible-playbook run (every shard)"""
+
+    run_id: str
+    job: str
+    sha: str | None
+    start: float
+    end: float
+    returncode: int
+    check_mode: bool = False
+    hosts: Mapping[str, HostStats] = field(default_factory=dict)
+    # (role, task, seconds) from the profile_tasks TASKS RECAP
+    tasks: Sequence[tuple[str, str, float]] = ()
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Nearest rank percentile of already sorted values (0.0 if empty)"""
+    if not sorted_values:
+        return 0.0
+    rank = max(ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def _duration_summary(values: list[float]) -> dict[str, float]:
+    values.sort()
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": values[-1] if values else 0.0,
+    }
+
+
+class RunHistory:
+    """Every run's outcome, per host recap and task timings in SQLite.
+
+    The connection lives on one worker thread so queries and writes stay off
+    the event loop and never share a connection across threads. WAL lets the
+    sqlite3 CLI read the database while runs are written.
+    """
+
+    def __init__(
+        self, db_path: Path, max_runs: int = 0, max_age_seconds: int = 0
+    ) -> None:
+        self.db_path = db_path
+        self.max_runs = max_runs
+        self.max_age_seconds = max_age_seconds
+        self._conn: sqlite3.Connection | None = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="ansible_shed_run_history"
+        )
+
+    def submit(self, fn: Callable[..., T], *args: object) -> Future[T]:
+        """Run fn(*args) on the database thread"""
+        return self._executor.submit(fn, *args)
+
+    def record(self, run: RunRecord) -> Future[None]:
+        future = self.submit(self.add_run, run)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    def close(self) -> None:
+        def _close() -> None:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+        self.submit(_close).result()
+        self._executor.shutdown()
+
+    @staticmethod
+    def _log_failure(future: Future[None]) -> None:
+        if err := future.exception():
+            LOG.error(f"Problem recording run history: {err}")
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def add_run(self, run: RunRecord) -> None:
+        with self.conn as conn:
+            conn.execute("DELETE FROM runs WHERE run_id = ?", (run.run_id,))
+            conn.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run.run_id,
+                    run.job,
+                    run.sha,
+                    run.start,
+                    run.end,
+                    run.returncode,
+                    int(run.check_mode),
+                ),
+            )
+            conn.executemany(
+                f"INSERT INTO run_hosts VALUES (?, ?, {', '.join('?' * len(HOST_STAT_NAMES))})",
+                (
+                    (run.run_id, hostname, *stats.values())
+                    for hostname, stats in run.hosts.items()
+                ),
+            )
+            conn.executemany(
+                "INSERT INTO run_tasks VALUES (?, ?, ?, ?)",
+                (
+                    (run.run_id, role, task, seconds)
+                    for role, task, seconds in run.tasks
+                ),
+            )
+            self._prune(conn, time())
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        if self.max_age_seconds:
+            conn.execute(
+                "DELETE FROM runs WHERE end < ?", (now - self.max_age_seconds,)
+            )
+        if self.max_runs:
+            conn.execute(
+                "DELETE FROM runs WHERE run_id NOT IN "
+                "(SELECT run_id FROM runs ORDER BY start DESC LIMIT ?)",
+                (self.max_runs,),
+            )
+
+    @staticmethod
+    def _run_dict(row: sqlite3.Row) -> dict[str, object]:
+        run = dict(row)
+        run["check_mode"] = bool(run["check_mode"])
+        run["duration"] = run["end"] - run["start"]
+        return run
+
+    def list_runs(
+        self, job: str | None = None, since: float = 0, limit: int = 100
+    ) -> list[dict[str, object]]:
+        """Newest first"""
+        rows = self.conn.execute(
+            "SELECT * FROM runs WHERE (? IS NULL OR job = ?) AND start >= ? "
+            "ORDER BY start DESC LIMIT ?",
+            (job, job, since, limit),
+        )
+        return [self._run_dict(row) for row in rows]
+
+    def get_run(self, run_id: str) -> dict[str, object] | None:
+        row = self.conn.execute(
+            "SELECT * FROM runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        run = self._run_dict(row)
+        run["hosts"] = {
+            host_row["hostname"]: {name: host_row[name] for name in HOST_STAT_NAMES}
+            for host_row in self.conn.execute(
+                "SELECT * FROM run_hosts WHERE run_id = ? ORDER BY hostname",
+                (run_id,),
+            )
+        }
+        run["tasks"] = [
+            dict(task_row)
+            for task_row in self.conn.execute(
+                "SELECT role, task, seconds FROM run_tasks WHERE run_id = ? "
+                "ORDER BY seconds DESC",
+                (run_id,),
+            )
+        ]
+        return run
+
+    def summary(self, job: str | None = None, since: float = 0) -> dict[str, object]:
+        """p50/p95/max run and per task durations of runs started since"""
+        run_durations = [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT end - start FROM runs WHERE (? IS NULL OR job = ?) "
+                "AND start >= ?",
+                (job, job, since),
+            )
+        ]
+        task_durations: dict[tuple[str, str], list[float]] = {}
+        for row in self.conn.execute(
+            "SELECT t.role, t.task, t.seconds FROM run_tasks t "
+            "JOIN runs r ON r.run_id = t.run_id "
+            "WHERE (? IS NULL OR r.job = ?) AND r.start >= ?",
+            (job, job, since),
+        ):
+            task_durations.setdefault((row[0], row[1]), []).append(row[2])
+        task_summaries = sorted(
+            (
+                (_duration_summary(values), role, task, len(values))
+                for (role, task), values in task_durations.items()
+            ),
+            key=lambda t: t[0]["p95"],
+            reverse=True,
+        )
+        tasks = [
+            {"role": role, "task": task, "runs": runs, **durations}
+            for durations, role, task, runs in task_summaries[:SUMMARY_TASKS_LIMIT]
+        ]
+        return {
+            "runs": len(run_durations),
+            "duration": _duration_summary(run_durations),
+            "tasks": tasks,
+        }
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+import gzip
+import logging
+import lzma
+import os
+import shutil
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from json import dumps, JSONDecodeError, loads
+from pathlib import Path
+from time import time
+
+from ansible_shed.jobs import DEFAULT_JOB_NAME
+
+LOG = logging.getLogger(__name__)
+# log_compression option -> file suffix
+LOG_COMPRESSIONS = {"none": "", "gzip": ".gz", "xz": ".xz"}
+RUN_LOG_PREFIX = "ansible_shed_run_"
+INDEX_FILE_NAME = "index.jsonl"
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """How finished run logs are compressed and pruned. 0 means unlimited"""
+
+    compression: str = "none"
+    max_count: int = 0
+    max_age_seconds: int = 0
+    max_bytes: int = 0
+
+
+@dataclass
+class RunLogEntry:
+    """One run's line in the log_dir index"""
+
+    run_id: str
+    job: str
+    log_name: str
+    start: float
+    end: float
+    returncode: int | None = None
+    # Uncompressed size and size on disk
+    size_bytes: int = 0
+    stored_bytes: int = 0
+
+
+def _open_compressed(path: Path, compression: str) -> gzip.GzipFile | lzma.LZMAFile:
+    if compression == "xz":
+        return lzma.LZMAFile(path, "wb")
+    return gzip.GzipFile(path, "wb")
+
+
+class RunLogStore:
+    """Index, compress and prune the run logs in log_dir.
+
+    All writes happen on one worker thread: compression stays off the event
+    loop and the index only ever has a single writer. The index is replaced
+    atomically so it can be read from any thread.
+    """
+
+    def __init__(self, log_dir: Path, latest_symlink: Path | None = None) -> None:
+        self.log_dir = log_dir
+        self.index_path = log_dir / INDEX_FILE_NAME
+        self.latest_symlink = latest_symlink
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="ansible_shed_run_logs"
+        )
+        # Queued first so logs still being written are never indexed
+        self._executor.submit(self._create_index).add_done_callback(self._log_failure)
+
+    def submit(self, entry: RunLogEntry, policy: RetentionPolicy) -> Future[None]:
+        """Index a finished run, then compress and prune in the background"""
+        future = self._executor.submit(self.finish_run, entry, policy)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    def flush(self) -> None:
+        """Block until every submitted run has been processed"""
+        self._executor.submit(lambda: None).result()
+
+    @staticmethod
+    def _log_failure(future: Future[None]) -> None:
+        if err := future.exception():
+            LOG.error(f"Problem indexing/pruning run logs: {err}")
+
+    def finish_run(self, entry: RunLogEntry, policy: RetentionPolicy) -> None:
+        log_path = self.log_dir / entry.log_name
+        if log_path.exists():
+            entry.size_bytes = entry.stored_bytes = log_path.stat().st_size
+        entries = [e for e in self.load_index() if e.run_id != entry.run_id]
+        entries.append(entry)
+        if policy.compression != "none":
+            self._compress_finished(entries, policy.compression)
+        self._write_index(self._prune(entries, policy, time()))
+
+    def load_index(self) -> list[RunLogEntry]:
+        entries: list[RunLogEntry] = []
+        if not self.index_path.exists():
+            return entries
+        with self.index_path.open("r") as f:
+            for line in f:
+                try:
+                    entries.append(RunLogEntry(**loads(line)))
+                except (JSONDecodeError, TypeError):
+                    LOG.warning(f"Skipping bad line in {self.index_path}: {line!r}")
+        return entries
+
+    def find(self, run_id: str) -> RunLogEntry | None:
+        return next((e for e in self.load_index() if e.run_id == run_id), None)
+
+    def log_path(self, run_id: str) -> Path | None:
+        """Where a finished run's log is now (it may have been compressed),
+        None if the run is unknown or its log was pruned"""
+        entry = self.find(run_id)
+        if entry and not (self.log_dir / entry.log_name).exists():
+            # Compressed or pruned since; the index is rewritten after either
+            self.flush()
+            entry = self.find(run_id)
+        if entry is None:
+            return None
+        path = self.log_dir / Path(entry.log_name).name
+        return path if path.exists() else None
+
+    def _create_index(self) -> None:
+        """Index logs written before there was an index (one directory scan)"""
+        if self.index_path.exists() or not self.log_dir.exists():
+            return
+        entries = []
+        for log_path in sorted(self.log_dir.glob(f"{RUN_LOG_PREFIX}*.log*")):
+            if log_path.suffix == ".tmp":
+                continue
+            run_id = log_path.name.split(".log", 1)[0]
+            # ansible_shed_run_<ts> or ansible_shed_run_<job>_<ts>
+            job_and_ts = run_id[len(RUN_LOG_PREFIX) :]
+            job = job_and_ts.rsplit("_", 1)[0] if "_" in job_and_ts else None
+            stat = log_path.stat()
+            entries.append(
+                RunLogEntry(
+                    run_id=run_id,
+                    job=job or DEFAULT_JOB_NAME,
+                    log_name=log_path.name,
+                    start=stat.st_mtime,
+                    end=stat.st_mtime,
+                    size_bytes=stat.st_size,
+                    stored_bytes=stat.st_size,
+                )
+            )
+        self._write_index(sorted(entries, key=lambda e: e.start))
+
+    def _latest_log_name(self) -> str | None:
+        if not self.latest_symlink or not self.latest_symlink.is_symlink():
+            return None
+        return Path(os.readlink(self.latest_symlink)).name
+
+    def _compress_finished(self, entries: list[RunLogEntry], compression: str) -> None:
+        """Compress every uncompressed log except the one latest.log points at"""
+        suffix = LOG_COMPRESSIONS[compression]
+        latest = self._latest_log_name()
+        for entry in entries:
+            if entry.log_name == latest or not entry.log_name.endswith(".log"):
+                continue
+            src = self.log_dir / entry.log_name
+            if not src.exists():
+                continue
+            dest = src.with_name(src.name + suffix)
+            tmp = dest.with_name(dest.name + ".tmp")
+            with src.open("rb") as f_in, _open_compressed(tmp, compression) as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.replace(tmp, dest)
+            src.unlink()
+            entry.log_name = dest.name
+            entry.stored_bytes = dest.stat().st_size
+
+    def _prune(
+        self, entries: list[RunLogEntry], policy: RetentionPolicy, now: float
+    ) -> list[RunLogEntry]:
+        """Drop the oldest logs past max age, count or total bytes.
+
+        The log latest.log points at is always kept.
+        """
+        latest = self._latest_log_name()
+        # Newest first
+        kept = sorted(entries, key=lambda e: e.start, reverse=True)
+        removed = []
+        total_bytes = sum(e.stored_bytes for e in kept)
+        for idx in range(len(kept) - 1, -1, -1):
+            entry = kept[idx]
+            if entry.log_name == latest:
+                continue
+            if (
+                (policy.max_age_seconds and now - entry.end > policy.max_age_seconds)
+                or (policy.max_count and idx >= policy.max_count)
+                or (policy.max_bytes and total_bytes > policy.max_bytes)
+            ):
+                removed.append(kept.pop(idx))
+                total_bytes -= entry.stored_bytes
+        for entry in removed:
+            (self.log_dir / entry.log_name).unlink(missing_ok=True)
+        if removed:
+            LOG.info(f"Pruned {len(removed)} run logs from {self.log_dir}")
+        return sorted(kept, key=lambda e: e.start)
+
+    def _write_index(self, entries: list[RunLogEntry]) -> None:
+        tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+        with tmp.open("w") as f:
+            for entry in entries:
+                f.write(dumps(asdict(entry), sort_keys=True) + "\n")
+        os.replace(tmp, self.index_path)
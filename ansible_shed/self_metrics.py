@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+import asyncio
+import logging
+import os
+import threading
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from time import monotonic, perf_counter
+from typing import ParamSpec, TypeVar
+
+from aioprometheus.collectors import Counter, Gauge, Histogram, Registry
+
+LOG = logging.getLogger(__name__)
+PREFIX = "ansible_shed_"
+PROC_SELF_STAT = Path("/proc/self/stat")
+# Seconds; from a fast parse up to a slow clone / playbook run
+OPERATION_BUCKETS = (
+    0.001,
+    0.005,
+    0.025,
+    0.1,
+    0.5,
+    2.5,
+    10.0,
+    60.0,
+    300.0,
+    1800.0,
+)
+# Timings kept if nothing exports them (exporter not running yet)
+MAX_PENDING_TIMINGS = 10000
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+def read_proc_self_stat() -> tuple[float, int] | None:
+    """(CPU seconds, RSS bytes) of this process, None without /proc"""
+    try:
+        stat = PROC_SELF_STAT.read_text()
+    except OSError:
+        return None
+    # Fields after "(comm)", which may contain spaces; utime is field 14
+    fields = stat.rsplit(")", 1)[1].split()
+    ticks = os.sysconf("SC_CLK_TCK")
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / ticks
+    rss_bytes = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+    return cpu_seconds, rss_bytes
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that counts work submitted and started.
+
+    queue_depth() is what's waiting for a thread, without reading the
+    executor's private work queue.
+    """
+
+    def __init__(
+        self, max_workers: int | None = None, thread_name_prefix: str = ""
+    ) -> None:
+        super().__init__(max_workers, thread_name_prefix)
+        self._count_lock = threading.Lock()
+        self._submitted = 0
+        self._started = 0
+
+    def submit(
+        self, fn: Callable[P, T], /, *args: P.args, **kwargs: P.kwargs
+    ) -> "Future[T]":
+        @wraps(fn)
+        def counted() -> T:
+            with self._count_lock:
+                self._started += 1
+            return fn(*args, **kwargs)
+
+        with self._count_lock:
+            self._submitted += 1
+        try:
+            return super().submit(counted)
+        except RuntimeError:
+            # Shut down; nothing was queued
+            with self._count_lock:
+                self._submitted -= 1
+            raise
+
+    def queue_depth(self) -> int:
+        with self._count_lock:
+            return self._submitted - self._started
+
+
+class SelfMetrics:
+    """Where ansible_shed itself spends its time.
+
+    timed() and observe() only append to a deque (safe from executor
+    threads); run()
+    turns those into histograms and samples loop lag, executor queue depth,
+    RSS and CPU every interval, so collecting stays cheap enough to leave on.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self._pending: deque[tuple[str, float]] = deque(maxlen=MAX_PENDING_TIMINGS)
+
+    @contextmanager
+    def timed(self, operation: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self._pending.append((operation, perf_counter() - start))
+
+    def observe(self, operation: str, seconds: float) -> None:
+        """Record seconds measured elsewhere, e.g. summed over a run"""
+        if self.enabled:
+            self._pending.append((operation, seconds))
+
+    def drain(self, histogram: Histogram) -> None:
+        while self._pending:
+            operation, seconds = self._pending.popleft()
+            histogram.observe({"operation": operation}, seconds)
+
+    async def run(
+        self,
+        registry: Registry,
+        interval_seconds: float,
+        executor_queue_depth: Callable[[], int] | None = None,
+        on_update: Callable[[], None] | None = None,
+    ) -> None:
+        operation_histogram = Histogram(
+            f"{PREFIX}operation_duration_seconds",
+            "Time ansible_shed spent in its own operations",
+            registry=registry,
+            buckets=OPERATION_BUCKETS,
+        )
+        gauges: dict[str, Counter | Gauge] = {
+            "lag": Gauge(
+                f"{PREFIX}event_loop_lag_seconds",
+                "How late the last self metrics wakeup ran on the event loop",
+                registry=registry,
+            ),
+            "queue": Gauge(
+                f"{PREFIX}executor_queue_depth",
+                "Work items waiting for a default executor thread",
+                registry=registry,
+            ),
+            "rss": Gauge(
+                f"{PREFIX}resident_memory_bytes",
+                "Resident set size from /proc/self/stat",
+                registry=registry,
+            ),
+            "cpu": Counter(
+                f"{PREFIX}cpu_seconds_total",
+                "User + system CPU seconds from /proc/self/stat",
+                registry=registry,
+            ),
+        }
+        while True:
+            expected_wakeup = monotonic() + interval_seconds
+            await asyncio.sleep(interval_seconds)
+            gauges["lag"].set({}, max(monotonic() - expected_wakeup, 0.0))
+            if executor_queue_depth:
+                gauges["queue"].set({}, executor_queue_depth())
+            if proc_stat := read_proc_self_stat():
+                gauges["cpu"].set({}, proc_stat[0])
+                gauges["rss"].set({}, proc_stat[1])
+            self.drain(operation_histogram)
+            if on_update:
+                on_update()
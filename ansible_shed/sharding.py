@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+import re
+from collections.abc import Iterable, Sequence
+from hashlib import sha1
+
+SHARD_MODES = ("none", "hash", "group", "explicit")
+
+_list_hosts_header_re = re.compile(r"^\s*hosts \(\d+\):\s*$")
+
+
+def parse_list_hosts(output: str) -> list[str]:
+    """Parse the host names out of `ansible <pattern> --list-hosts` output"""
+    hosts: list[str] = []
+    in_hosts = False
+    for line in output.splitlines():
+        if _list_hosts_header_re.match(line):
+            in_hosts = True
+            continue
+        if not in_hosts:
+            continue
+        host = line.strip()
+        if not host or not line[:1].isspace():
+            in_hosts = False
+            continue
+        hosts.append(host)
+    return hosts
+
+
+def hash_shards(hosts: Iterable[str], shard_count: int) -> list[list[str]]:
+    """Split hosts into shard_count shards by a stable hash of the hostname.
+
+    A stable hash keeps each host in the same shard across runs (and across
+    restarts, unlike hash()) so per-shard SSH connections stay warm.
+    Empty shards are dropped.
+    """
+    shards: list[list[str]] = [[] for _ in range(max(shard_count, 1))]
+    for host in sorted(set(hosts)):
+        digest = sha1(host.encode("utf-8"), usedforsecurity=False).digest()
+        shards[int.from_bytes(digest[:8], "big") % len(shards)].append(host)
+    return [shard for shard in shards if shard]
+
+
+def dedupe_shards(shards: Sequence[Sequence[str]]) -> list[list[str]]:
+    """Drop hosts already claimed by an earlier shard (and empty shards).
+
+    Group and explicit shards can overlap; a host must only ever be run by
+    one ansible-playbook process at a time.
+    """
+    seen: set[str] = set()
+    deduped: list[list[str]] = []
+    for shard in shards:
+        unique_hosts = [h for h in dict.fromkeys(shard) if h not in seen]
+        seen.update(unique_hosts)
+        if unique_hosts:
+            deduped.append(unique_hosts)
+    return deduped
@@ -1,37 +1,107 @@
 #!/usr/bin/env python3
 
 import asyncio
+import codecs
+import hashlib
+import heapq
+import hmac
 import ipaddress
 import logging
 import os
-import re
 import secrets
 import shutil
-from collections import defaultdict
-from collections.abc import Mapping
-from configparser import ConfigParser
+import signal
+from collections.abc import Iterable, Mapping
+from configparser import ConfigParser, Error as ConfigParserError
 from datetime import datetime, timezone
+from itertools import pairwise
 from json import dumps, JSONDecodeError, loads
 from pathlib import Path
 from random import randint
-from subprocess import PIPE, Popen, run, STDOUT
+from tempfile import TemporaryDirectory
 from time import time
-from typing import TypedDict
+from typing import BinaryIO, TypedDict
 
 import aiohttp
 import aiohttp.web
-from aioprometheus.collectors import Gauge, Registry
-from aioprometheus.renderer import render
-from git.repo.base import Repo
+from aioprometheus.collectors import Counter, Gauge, Histogram, Registry
 
+from ansible_shed import callback_plugins
+from ansible_shed.cardinality import compile_normalizers, normalize, OTHER, SeriesBudget
 from ansible_shed.constants import (
     DEFAULT_API_PORT,
     DEFAULT_API_TOKEN_PLACEHOLDER,
+    EVENTS_FD_ENV,
     SHED_CONFIG_SECTION,
 )
+from ansible_shed.fact_cache import FactCache
+from ansible_shed.git_backend import AsyncGit, DEFAULT_GIT_TIMEOUT_SECONDS, GitError
+from ansible_shed.host_stats import CHECK_STAT_NAMES, HOST_STAT_NAMES, HostStats
+from ansible_shed.jobs import DEFAULT_JOB_NAME, JobConfig, JobState, load_job_configs
+from ansible_shed.label_tracker import LabelTracker
+from ansible_shed.live_log import LiveRunLog
+from ansible_shed.metrics_cache import accepts_gzip, etag_matches, MetricsCache
+from ansible_shed.output_parser import AnsibleOutputParser
+from ansible_shed.performance import load_performance_profile, PerformanceProfile
+from ansible_shed.run_history import RunHistory, RunRecord
+from ansible_shed.run_logs import (
+    LOG_COMPRESSIONS,
+    RetentionPolicy,
+    RUN_LOG_PREFIX,
+    RunLogEntry,
+    RunLogStore,
+)
+from ansible_shed.self_metrics import CountingExecutor, SelfMetrics
+from ansible_shed.sharding import (
+    dedupe_shards,
+    hash_shards,
+    parse_list_hosts,
+    SHARD_MODES,
+)
+from ansible_shed.targeting import load_target_rules, narrow_job, resolve_target
 
 LOG = logging.getLogger(__name__)
+# Label naming the shed job a series belongs to. aioprometheus reserves "job"
+# (Prometheus sets it to the scrape job)
+JOB_LABEL = "shed_job"
+# prom_stats keys describing the repo rather than a job's run; exported
+# without a job label
+REPO_STAT_KEYS = frozenset(
+    {
+        "version_check_state_results",
+        "version_check_state_checked_at",
+        "git_fetch_duration_seconds",
+        "git_last_fetch_timestamp",
+        "git_checkout_fetch_age_seconds",
+        "git_clone_duration_seconds",
+        "git_clone_bytes",
+        "git_recovery_duration_seconds",
+        "git_recovery_bytes",
+        "webhook_pushes_total",
+        "webhook_runs_triggered_total",
+        "git_worktrees",
+        "ansible_fact_cache_hosts",
+        "ansible_fact_cache_oldest_age_seconds",
+    }
+)
 HEALTHCHECK_TIMEOUT_SECONDS = 5
+# Default histogram buckets (seconds); +Inf is always added
+RUN_DURATION_BUCKETS = (30.0, 60.0, 120.0, 300.0, 600.0, 900.0, 1800.0, 3600.0, 7200.0)
+TASK_DURATION_BUCKETS = (1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+# GET /runs defaults: a week of runs, newest 100 listed
+RUN_HISTORY_WINDOW_SECONDS = 7 * 86400
+RUN_HISTORY_LIMIT = 100
+RUN_LOG_CONTENT_TYPE = "text/plain; charset=utf-8"
+INVENTORY_LIST_TIMEOUT_SECONDS = 300
+ANSIBLE_OUTPUT_CHUNK_BYTES = 64 * 1024
+ANSIBLE_TERMINATE_GRACE_SECONDS = 30
+CALLBACK_PLUGINS_DIR = Path(callback_plugins.__file__).parent
+# How often the git prefetcher re-checks the schedule while idle
+GIT_PREFETCH_POLL_SECONDS = 60
+# Only pushes to the branch runs check out trigger a webhook run
+WEBHOOK_BRANCH_REF = "refs/heads/main"
+# What to do when HEAD and the job haven't changed since its last clean run
+UNCHANGED_MODES = ("run", "skip", "check")
 
 
 class HealthcheckCommandResult(TypedDict, total=False):
@@ -48,46 +118,89 @@ def _load_shed_config(config_path: Path) -> ConfigParser:
 
 
 class Shed:
-    ansible_stats_line_re = re.compile(r"([a-z\.0-9]*)\s+: (ok=.*)")
-    # ansible.posix.profile_tasks TASKS RECAP body row, e.g.:
-    #   "ansible_shed : Install latest ansible_shed --------- 29.80s"
-    profile_task_row_re = re.compile(
-        r"^(?P<name>.+?) -+\s+(?P<seconds>\d+(?:\.\d+)?)s\s*$"
-    )
-    profile_tasks_recap_header_re = re.compile(r"^TASKS RECAP \*+\s*$")
-    profile_task_header_re = re.compile(r"^TASK \[")
-    profile_warning_re = re.compile(r"^\[WARNING\]:")
-    profile_deprecation_re = re.compile(r"^\[DEPRECATION WARNING\]:")
-
     def __init__(self, config_path: Path) -> None:
         self.config = _load_shed_config(config_path)
         self.config_path = config_path
         self._default_api_token_warning_logged = False
+        # Config warnings from the last reload_config_vars(), so each is logged
+        # once per config change rather than on every scheduler wakeup
+        self._config_warnings: set[str] = set()
+        self._logged_config_warnings: set[str] = set()
+        self.job_states: dict[str, JobState] = {}
         self.reload_config_vars()
 
-        self.prom_stats: dict[str, int] = defaultdict(int)
         self.prom_stats_update = asyncio.Event()
+        self.metrics_cache = MetricsCache()
+        # Enabled/disabled at startup; see self_metrics in reload_config_vars
+        self.self_metrics = SelfMetrics(self.self_metrics_enabled)
+        # Installed as the loop's default executor by async_main(), before any work
+        # is submitted, so self_metrics can report its queue depth
+        self.executor = CountingExecutor(thread_name_prefix="ansible_shed")
         self.force_run_requested = asyncio.Event()
+        self.webhook_run_requested = asyncio.Event()
+        self._webhook_debounce_task: asyncio.Task[None] | None = None
+        self._job_finished = asyncio.Event()
+        self._repo_lock = asyncio.Lock()
+        self._active_runs = 0
+        self.repo_head_sha: str | None = None
+        # Where ansible-playbook runs from: repo_path, or with git_worktrees
+        # the worktree current_checkout_link points at
+        self.checkout_path = self.repo_path
+        if self.git_worktrees and self.current_checkout_link.is_dir():
+            self.checkout_path = (
+                self.worktrees_dir / self.current_checkout_link.resolve().name
+            )
+        self.last_fetch_epoch = 0.0
         self.version_check_packages: list[dict[str, str]] = []
-        self.profile_task_runtimes: list[dict[str, float | str]] = []
-        self.profile_role_runtimes: dict[str, float] = {}
         self.paused_until_epoch: int | None = None
 
         # Set and create log directory
         log_dir = self.config[SHED_CONFIG_SECTION].get("log_dir")
         self.latest_log_symlink = None
+        self.run_logs: RunLogStore | None = None
         self.log_dir_path = Path(log_dir) if log_dir else None
         if self.log_dir_path:
             self.log_dir_path.mkdir(exist_ok=True, parents=True)
             self.latest_log_symlink = self.log_dir_path / "latest.log"
+            self.run_logs = RunLogStore(self.log_dir_path, self.latest_log_symlink)
+        self.run_history: RunHistory | None = None
+        if run_history_db := self.config[SHED_CONFIG_SECTION].get("run_history_db"):
+            self.run_history = RunHistory(
+                Path(run_history_db),
+                max_runs=self.config[SHED_CONFIG_SECTION].getint(
+                    "run_history_max_runs", fallback=10000
+                ),
+                max_age_seconds=self.config[SHED_CONFIG_SECTION].getint(
+                    "run_history_days", fallback=90
+                )
+                * 86400,
+            )
 
     def reload_config_vars(self) -> None:
+        self._logged_config_warnings = self._config_warnings
+        self._config_warnings = set()
         self.repo_path = Path(self.config[SHED_CONFIG_SECTION]["repo_path"])
         self.init_file = (
             Path(self.config[SHED_CONFIG_SECTION]["repo_path"])
             / self.config[SHED_CONFIG_SECTION]["ansible_playbook_init"]
         )
         self.repo_url = self.config[SHED_CONFIG_SECTION]["repo_url"]
+        self.git = AsyncGit(
+            self.repo_path,
+            {"GIT_SSH_COMMAND": self._git_ssh_cmd()},
+            self.config[SHED_CONFIG_SECTION].getint(
+                "git_timeout", fallback=DEFAULT_GIT_TIMEOUT_SECONDS
+            ),
+        )
+        self.git_worktrees = self.config[SHED_CONFIG_SECTION].getboolean(
+            "git_worktrees", fallback=False
+        )
+        self.worktrees_dir = self.repo_path.with_name(
+            f"{self.repo_path.name}.worktrees"
+        )
+        self.current_checkout_link = self.repo_path.with_name(
+            f"{self.repo_path.name}.current"
+        )
         self.run_interval_seconds = (
             self.config[SHED_CONFIG_SECTION].getint("interval", fallback=60) * 60
         )
@@ -101,6 +214,100 @@ class Shed:
         self.profile_tasks_top_n = self.config[SHED_CONFIG_SECTION].getint(
             "profile_tasks_top_n", fallback=20
         )
+        self.run_duration_buckets = self._load_buckets(
+            "run_duration_buckets", RUN_DURATION_BUCKETS
+        )
+        self.task_duration_buckets = self._load_buckets(
+            "task_duration_buckets", TASK_DURATION_BUCKETS
+        )
+        self.run_timeout_seconds = (
+            self.config[SHED_CONFIG_SECTION].getint("run_timeout", fallback=0) * 60
+        )
+        self.unchanged_mode = self.config[SHED_CONFIG_SECTION].get(
+            "unchanged_mode", fallback="run"
+        )
+        if self.unchanged_mode not in UNCHANGED_MODES:
+            self._config_warning(
+                f"Unknown unchanged_mode {self.unchanged_mode!r}, expected one of "
+                f"{', '.join(UNCHANGED_MODES)}. Always running"
+            )
+            self.unchanged_mode = "run"
+        self.max_skip_interval_seconds = (
+            self.config[SHED_CONFIG_SECTION].getint("max_skip_interval", fallback=0)
+            * 60
+        )
+        self.targeted_runs = self.config[SHED_CONFIG_SECTION].getboolean(
+            "targeted_runs", fallback=False
+        )
+        if self.targeted_runs and self.unchanged_mode == "run":
+            self._config_warning(
+                "targeted_runs only narrows runs of new commits. With "
+                "unchanged_mode=run an unchanged HEAD still runs in full every "
+                "interval; set unchanged_mode to skip or check to avoid that"
+            )
+        self.target_map_file = self.config[SHED_CONFIG_SECTION].get("target_map_file")
+        self.targeted_full_run_interval_seconds = (
+            self.config[SHED_CONFIG_SECTION].getint(
+                "targeted_full_run_interval", fallback=1440
+            )
+            * 60
+        )
+        self.ansible_events = self.config[SHED_CONFIG_SECTION].getboolean(
+            "ansible_events", fallback=False
+        )
+        self.metrics_gzip = self.config[SHED_CONFIG_SECTION].getboolean(
+            "metrics_gzip", fallback=True
+        )
+        self.task_runtime_series_limit = max(
+            self.config[SHED_CONFIG_SECTION].getint(
+                "task_runtime_series_limit", fallback=200
+            ),
+            0,
+        )
+        self.version_check_package_series_limit = max(
+            self.config[SHED_CONFIG_SECTION].getint(
+                "version_check_package_series_limit", fallback=200
+            ),
+            0,
+        )
+        self.task_label_normalizers = compile_normalizers(
+            self.config[SHED_CONFIG_SECTION].get("task_label_normalize", "")
+        )
+        self.self_metrics_enabled = self.config[SHED_CONFIG_SECTION].getboolean(
+            "self_metrics", fallback=True
+        )
+        self.self_metrics_interval_seconds = max(
+            self.config[SHED_CONFIG_SECTION].getint(
+                "self_metrics_interval", fallback=15
+            ),
+            1,
+        )
+        self.live_stats_interval_seconds = max(
+            self.config[SHED_CONFIG_SECTION].getint("live_stats_interval", fallback=5),
+            1,
+        )
+        self._load_log_retention()
+        self.git_prefetch_lead_seconds = self.config[SHED_CONFIG_SECTION].getint(
+            "git_prefetch_lead", fallback=0
+        )
+        self.git_clone_depth = max(
+            self.config[SHED_CONFIG_SECTION].getint("git_clone_depth", fallback=0), 0
+        )
+        self.git_clone_filter = self.config[SHED_CONFIG_SECTION].get(
+            "git_clone_filter", fallback=""
+        )
+        self.webhook_secret = self.config[SHED_CONFIG_SECTION].get("webhook_secret")
+        self.webhook_debounce_seconds = max(
+            self.config[SHED_CONFIG_SECTION].getint("webhook_debounce", fallback=10),
+            0,
+        )
+        self.max_concurrent_jobs = max(
+            self.config[SHED_CONFIG_SECTION].getint("max_concurrent_jobs", fallback=1),
+            1,
+        )
+        self._load_shard_config()
+        self._load_performance_profile()
+        self._load_job_configs()
         self._activate_ansible_virtualenv()
         configured_api_token = self.config[SHED_CONFIG_SECTION].get("api_token")
         if configured_api_token == DEFAULT_API_TOKEN_PLACEHOLDER:
@@ -115,6 +322,132 @@ class Shed:
         self.api_token = configured_api_token
         self._default_api_token_warning_logged = False
 
+    def _config_warning(self, message: str) -> None:
+        """LOG.warning() unless the previous reload already logged message"""
+        if message not in self._logged_config_warnings:
+            LOG.warning(message)
+        self._config_warnings.add(message)
+
+    def _load_job_configs(self) -> None:
+        self.jobs = load_job_configs(self.config)
+        for job_name in self.jobs:
+            self.job_states.setdefault(job_name, JobState())
+        for job_name in list(self.job_states):
+            if job_name not in self.jobs and not self.job_states[job_name].running:
+                LOG.info(f"Job {job_name} removed from config")
+                del self.job_states[job_name]
+
+    @property
+    def default_job(self) -> JobConfig:
+        return self.jobs[DEFAULT_JOB_NAME]
+
+    # The default job's stats, kept as Shed attributes for the single job case
+    @property
+    def prom_stats(self) -> dict[str, int]:
+        return self.job_states[DEFAULT_JOB_NAME].prom_stats
+
+    @property
+    def profile_task_runtimes(self) -> list[dict[str, float | str]]:
+        return self.job_states[DEFAULT_JOB_NAME].profile_task_runtimes
+
+    @property
+    def profile_role_runtimes(self) -> dict[str, float]:
+        return self.job_states[DEFAULT_JOB_NAME].profile_role_runtimes
+
+    def _load_buckets(
+        self, option: str, default: tuple[float, ...]
+    ) -> tuple[float, ...]:
+        """Comma separated, increasing, positive histogram bucket bounds"""
+        raw = self.config[SHED_CONFIG_SECTION].get(option)
+        if raw is None:
+            return default
+        try:
+            buckets = tuple(float(b) for b in raw.split(",") if b.strip())
+        except ValueError:
+            buckets = ()
+        if not buckets or buckets[0] <= 0 or any(a >= b for a, b in pairwise(buckets)):
+            self._config_warning(
+                f"Invalid {option} {raw!r}, expected increasing positive seconds. "
+                "Using the defaults"
+            )
+            return default
+        return buckets
+
+    def _load_log_retention(self) -> None:
+        section = self.config[SHED_CONFIG_SECTION]
+        compression = section.get("log_compression", fallback="none")
+        if compression not in LOG_COMPRESSIONS:
+            self._config_warning(
+                f"Unknown log_compression {compression!r}, expected one of "
+                f"{', '.join(LOG_COMPRESSIONS)}. Not compressing"
+            )
+            compression = "none"
+        self.log_retention = RetentionPolicy(
+            compression=compression,
+            max_count=section.getint("log_retention_count", fallback=0),
+            max_age_seconds=section.getint("log_retention_days", fallback=0) * 86400,
+            max_bytes=section.getint("log_retention_mb", fallback=0) * 1024 * 1024,
+        )
+
+    def _load_shard_config(self) -> None:
+        section = self.config[SHED_CONFIG_SECTION]
+        self.shard_mode = section.get("shard_mode", fallback="none")
+        if self.shard_mode not in SHARD_MODES:
+            self._config_warning(
+                f"Unknown shard_mode {self.shard_mode!r}, expected one of "
+                f"{', '.join(SHARD_MODES)}. Running unsharded"
+            )
+            self.shard_mode = "none"
+        self.shard_count = section.getint("shards", fallback=1)
+        self.shard_groups = [
+            g.strip() for g in section.get("shard_groups", "").split(",") if g.strip()
+        ]
+        self.shard_limits = [
+            p.strip() for p in section.get("shard_limits", "").split(";") if p.strip()
+        ]
+        self.shard_concurrency = section.getint("shard_concurrency", fallback=0)
+
+    def _load_performance_profile(self) -> None:
+        # Default ControlPath dir: next to the repo so SSH masters outlive runs
+        default_control_path_dir = self.repo_path.with_name(
+            f"{self.repo_path.name}.ssh"
+        )
+        # Cached facts must survive repo recovery / re-clones too
+        default_fact_cache_dir = self.repo_path.with_name(
+            f"{self.repo_path.name}.facts"
+        )
+        try:
+            self.performance = load_performance_profile(
+                self.config, default_control_path_dir, default_fact_cache_dir
+            )
+        except ValueError as err:
+            self._config_warning(f"Ignoring invalid [performance] config: {err}")
+            self.performance = PerformanceProfile()
+        self.fact_cache = (
+            FactCache(self.performance.fact_cache_dir)
+            if self.performance.fact_cache_ttl is not None
+            and self.performance.fact_cache_dir
+            else None
+        )
+
+    def _ansible_env(self, events_fd: int | None = None) -> dict[str, str] | None:
+        """ansible-playbook environment: [performance] settings + events pipe.
+
+        None (inherit ours unchanged) when there's nothing to add.
+        """
+        performance_env = self.performance.env()
+        if not performance_env and events_fd is None:
+            return None
+        env = (
+            dict(os.environ)
+            if events_fd is None
+            else self._ansible_events_env(events_fd)
+        )
+        env.update(performance_env)
+        if control_path_dir := performance_env.get("ANSIBLE_SSH_CONTROL_PATH_DIR"):
+            Path(control_path_dir).mkdir(mode=0o700, parents=True, exist_ok=True)
+        return env
+
     def _activate_ansible_virtualenv(self) -> None:
         ansible_playbook_binary = self.config[SHED_CONFIG_SECTION].get(
             "ansible_playbook_binary"
@@ -126,7 +459,7 @@ class Shed:
             return
         activate_script = binary_dir / "activate"
         if not activate_script.exists():
-            LOG.warning(
+            self._config_warning(
                 "ansible_playbook_binary should point to a Python virtualenv binary "
                 f"(missing activate script: {activate_script})"
             )
@@ -152,6 +485,20 @@ class Shed:
             return False
         return secrets.compare_digest(request_token, self.api_token)
 
+    def _has_valid_webhook_signature(
+        self, body: bytes, headers: Mapping[str, str]
+    ) -> bool:
+        """Check a GitHub/Gitea style X-Hub-Signature-256 HMAC of the body"""
+        if not self.webhook_secret:
+            return False
+        signature = headers.get("X-Hub-Signature-256")
+        if signature is None:
+            return False
+        digest = hmac.new(self.webhook_secret.encode(), body, hashlib.sha256)
+        return hmac.compare_digest(
+            signature.encode(), f"sha256={digest.hexdigest()}".encode()
+        )
+
     @staticmethod
     def _parse_timestamp_to_epoch(timestamp_raw: str) -> int | None:
         timestamp_str = timestamp_raw.strip()
@@ -240,10 +587,19 @@ class Shed:
     async def _handle_metrics(
         self, request: aiohttp.web.Request
     ) -> aiohttp.web.Response:
-        content, http_headers = render(
-            self.prom_registry, request.headers.getall("Accept", [])
+        compress = self.metrics_gzip and accepts_gzip(
+            request.headers.get("Accept-Encoding", "")
         )
-        return aiohttp.web.Response(body=content, headers=http_headers)
+        with self.self_metrics.timed("metrics_render"):
+            rendered = self.metrics_cache.get(
+                self.prom_registry, request.headers.getall("Accept", []), compress
+            )
+        if etag_matches(request.headers.get("If-None-Match", ""), rendered.etag):
+            return aiohttp.web.Response(
+                status=304,
+                headers={"ETag": rendered.etag, "Vary": rendered.headers["Vary"]},
+            )
+        return aiohttp.web.Response(body=rendered.body, headers=rendered.headers)
 
     async def _handle_pause(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
         if not self._has_valid_api_token(request.headers):
@@ -284,10 +640,283 @@ class Shed:
     ) -> aiohttp.web.Response:
         if not self._has_valid_api_token(request.headers):
             return aiohttp.web.json_response({"error": "unauthorized"}, status=401)
-        self.force_run_requested.set()
-        LOG.info("Force run requested via API")
+        try:
+            body = await request.json() if request.can_read_body else {}
+        except (JSONDecodeError, aiohttp.ContentTypeError):
+            body = {}
+        job_name = body.get("job") if isinstance(body, dict) else None
+        if job_name is None:
+            job_name = request.query.get("job")
+        if job_name is not None and job_name not in self.jobs:
+            return aiohttp.web.json_response(
+                {"error": f"unknown job {job_name!r}"}, status=404
+            )
+        self.request_force_run(job_name)
+        LOG.info(f"Force run requested via API for {job_name or 'all jobs'}")
         return aiohttp.web.json_response({"status": "scheduled"})
 
+    async def _handle_invalidate_facts(
+        self, request: aiohttp.web.Request
+    ) -> aiohttp.web.Response:
+        if not self._has_valid_api_token(request.headers):
+            return aiohttp.web.json_response({"error": "unauthorized"}, status=401)
+        if not self.fact_cache:
+            return aiohttp.web.json_response(
+                {"error": "fact cache is not enabled"}, status=404
+            )
+        try:
+            body = await request.json() if request.can_read_body else {}
+        except (JSONDecodeError, aiohttp.ContentTypeError):
+            body = {}
+        host = body.get("host") if isinstance(body, dict) else None
+        if host is None:
+            host = request.query.get("host")
+        if host is not None and not isinstance(host, str):
+            return aiohttp.web.json_response(
+                {"error": "host must be a string"}, status=400
+            )
+        loop = asyncio.get_running_loop()
+        invalidated = await loop.run_in_executor(None, self.fact_cache.invalidate, host)
+        if host is not None and not invalidated:
+            return aiohttp.web.json_response(
+                {"error": f"no cached facts for host {host!r}"}, status=404
+            )
+        await self._update_fact_cache_stats()
+        LOG.info(f"Fact cache invalidated via API for {host or 'all hosts'}")
+        return aiohttp.web.json_response({"invalidated": invalidated})
+
+    async def _handle_git_webhook(
+        self, request: aiohttp.web.Request
+    ) -> aiohttp.web.Response:
+        body = await request.read()
+        if not self._has_valid_webhook_signature(body, request.headers):
+            return aiohttp.web.json_response({"error": "unauthorized"}, status=401)
+        if request.headers.get("X-GitHub-Event") == "ping":
+            return aiohttp.web.json_response({"status": "pong"})
+        try:
+            payload = loads(body) if body else {}
+        except (JSONDecodeError, UnicodeDecodeError):
+            payload = {}
+        ref = payload.get("ref") if isinstance(payload, dict) else None
+        if ref is not None and ref != WEBHOOK_BRANCH_REF:
+            return aiohttp.web.json_response({"status": "ignored", "ref": ref})
+        self.prom_stats["webhook_pushes_total"] += 1
+        status = "scheduled" if self.request_webhook_run() else "coalesced"
+        LOG.info(f"Git push webhook received ({status})")
+        return aiohttp.web.json_response({"status": status}, status=202)
+
+    def _run_history_query_args(
+        self, request: aiohttp.web.Request
+    ) -> tuple[str | None, float, int] | None:
+        """(job, since, limit) from the query string; None if invalid"""
+        try:
+            window = float(request.query.get("window", RUN_HISTORY_WINDOW_SECONDS))
+            limit = int(request.query.get("limit", RUN_HISTORY_LIMIT))
+        except ValueError:
+            return None
+        if window < 0 or limit < 1:
+            return None
+        return request.query.get("job"), time() - window, limit
+
+    async def _handle_runs(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
+        if not self._has_valid_api_token(request.headers):
+            return aiohttp.web.json_response({"error": "unauthorized"}, status=401)
+        if not self.run_history:
+            return aiohttp.web.json_response(
+                {"error": "run_history_db is not configured"}, status=404
+            )
+        query_args = self._run_history_query_args(request)
+        if query_args is None:
+            return aiohttp.web.json_response(
+                {"error": "window must be seconds >= 0 and limit an integer >= 1"},
+                status=400,
+            )
+        job, since, limit = query_args
+        runs = await asyncio.wrap_future(
+            self.run_history.submit(self.run_history.list_runs, job, since, limit)
+        )
+        summary = await asyncio.wrap_future(
+            self.run_history.submit(self.run_history.summary, job, since)
+        )
+        return aiohttp.web.json_response({"runs": runs, "summary": summary})
+
+    async def _handle_run(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
+        if not self._has_valid_api_token(request.headers):
+            return aiohttp.web.json_response({"error": "unauthorized"}, status=401)
+        if not self.run_history:
+            return aiohttp.web.json_response(
+                {"error": "run_history_db is not configured"}, status=404
+            )
+        run_id = request.match_info["run_id"]
+        run = await asyncio.wrap_future(
+            self.run_history.submit(self.run_history.get_run, run_id)
+        )
+        if run is None:
+            return aiohttp.web.json_response(
+                {"error": f"unknown run {run_id!r}"}, status=404
+            )
+        return aiohttp.web.json_response(run)
+
+    @staticmethod
+    def _run_log_headers(log_name: str, accept_encoding: str) -> dict[str, str]:
+        """Headers to send a stored run log as is.
+
+        gzip logs are sent with Content-Encoding: gzip to clients accepting
+        it. xz (not an HTTP content coding) and gzip to other clients are
+        sent as the archive file.
+        """
+        if log_name.endswith(".log"):
+            return {"Content-Type": RUN_LOG_CONTENT_TYPE}
+        if log_name.endswith(".gz"):
+            headers = {"Vary": "Accept-Encoding"}
+            if accepts_gzip(accept_encoding):
+                headers["Content-Type"] = RUN_LOG_CONTENT_TYPE
+                headers["Content-Encoding"] = "gzip"
+                return headers
+            headers["Content-Type"] = "application/gzip"
+        else:
+            headers = {"Content-Type": "application/x-xz"}
+        # A quoted-string; !r would single quote it
+        headers["Content-Disposition"] = (
+            f'attachment; filename="{log_name}"'  # noqa: B907
+        )
+        return headers
+
+    async def _handle_run_log(
+        self, request: aiohttp.web.Request
+    ) -> aiohttp.web.StreamResponse:
+        """A finished run's log from log_dir, compressed or not, as stored.
+
+        FileResponse sends it with sendfile and handles Range, so paging
+        through a huge log never reads it into memory.
+        """
+        if not self._has_valid_api_token(request.headers):
+            return aiohttp.web.json_response({"error": "unauthorized"}, status=401)
+        if not self.run_logs:
+            return aiohttp.web.json_response(
+                {"error": "log_dir is not configured"}, status=404
+            )
+        run_id = request.match_info["run_id"]
+        log_path = await asyncio.get_running_loop().run_in_executor(
+            None, self.run_logs.log_path, run_id
+        )
+        if log_path is None:
+            return aiohttp.web.json_response(
+                {"error": f"no finished run log for {run_id!r}"}, status=404
+            )
+        return aiohttp.web.FileResponse(
+            log_path,
+            headers=self._run_log_headers(
+                log_path.name, request.headers.get("Accept-Encoding", "")
+            ),
+        )
+
+    def _current_live_log(self, job_name: str | None) -> LiveRunLog | None:
+        """The live log of job_name's run, else of the first running job"""
+        if job_name is not None:
+            job_state = self.job_states.get(job_name)
+            return job_state.live_log if job_state else None
+        return next((s.live_log for s in self.job_states.values() if s.live_log), None)
+
+    @staticmethod
+    def _live_log_offset(request: aiohttp.web.Request, run_id: str) -> int | None:
+        """Resume offset from an SSE Last-Event-ID ("<run_id>:<offset>") of
+        this run, else ?offset= (default 0). None if invalid"""
+        event_run_id, _, event_offset = request.headers.get(
+            "Last-Event-ID", ""
+        ).rpartition(":")
+        raw_offset = (
+            event_offset if event_run_id == run_id else request.query.get("offset", "0")
+        )
+        try:
+            offset = int(raw_offset)
+        except ValueError:
+            return None
+        return offset if offset >= 0 else None
+
+    async def _handle_current_run_log(
+        self, request: aiohttp.web.Request
+    ) -> aiohttp.web.StreamResponse:
+        """Follow a running job's log as Server-Sent Events or WebSocket frames.
+
+        Fed from the run's in memory LiveRunLog, so slow clients only fall
+        behind (and skip ahead) themselves and never hold up ansible-playbook.
+        """
+        if not self._has_valid_api_token(request.headers):
+            return aiohttp.web.json_response({"error": "unauthorized"}, status=401)
+        live_log = self._current_live_log(request.query.get("job"))
+        if live_log is None:
+            return aiohttp.web.json_response(
+                {"error": "no run in progress"}, status=404
+            )
+        offset = self._live_log_offset(request, live_log.run_id)
+        if offset is None:
+            return aiohttp.web.json_response(
+                {"error": "offset must be an integer >= 0"}, status=400
+            )
+        ws = aiohttp.web.WebSocketResponse()
+        if ws.can_prepare(request).ok:
+            await ws.prepare(request)
+            try:
+                await self._send_live_log_ws(ws, live_log, offset)
+            except ConnectionResetError:
+                LOG.debug("Live log WebSocket client went away")
+            return ws
+        response = aiohttp.web.StreamResponse(
+            headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+        )
+        await response.prepare(request)
+        try:
+            await self._send_live_log_sse(response, live_log, offset)
+        except ConnectionResetError:
+            LOG.debug("Live log SSE client went away")
+        return response
+
+    @staticmethod
+    async def _send_live_log_sse(
+        response: aiohttp.web.StreamResponse, live_log: LiveRunLog, offset: int
+    ) -> None:
+        """One event per chunk of lines, with id "<run_id>:<end offset>" so
+        EventSource reconnects resume where they left off"""
+        async for start, data in live_log.follow(offset):
+            if start > offset:
+                skipped = dumps({"from": offset, "to": start})
+                await response.write(f"event: skipped\ndata: {skipped}\n\n".encode())
+            offset = start + len(data)
+            lines = data.decode("utf-8", errors="replace").splitlines()
+            event = "".join(f"data: {line}\n" for line in lines)
+            await response.write(f"id: {live_log.run_id}:{offset}\n{event}\n".encode())
+        end = dumps({"returncode": live_log.returncode})
+        await response.write(
+            f"event: end\nid: {live_log.run_id}:{offset}\ndata: {end}\n\n".encode()
+        )
+        await response.write_eof()
+
+    @staticmethod
+    async def _send_live_log_ws(
+        ws: aiohttp.web.WebSocketResponse, live_log: LiveRunLog, offset: int
+    ) -> None:
+        """One JSON text frame per chunk, then an "end" frame. offset is where
+        to resume from, start is past the last frame's offset after a skip"""
+        async for start, data in live_log.follow(offset):
+            await ws.send_json(
+                {
+                    "run_id": live_log.run_id,
+                    "start": start,
+                    "offset": start + len(data),
+                    "data": data.decode("utf-8", errors="replace"),
+                }
+            )
+        await ws.send_json(
+            {
+                "run_id": live_log.run_id,
+                "offset": live_log.end_offset,
+                "end": True,
+                "returncode": live_log.returncode,
+            }
+        )
+        await ws.close()
+
     async def _handle_healthz(
         self, request: aiohttp.web.Request
     ) -> aiohttp.web.Response:
@@ -297,47 +926,191 @@ class Shed:
         status = 200 if bool(health.get("ok")) else 503
         return aiohttp.web.json_response(health, status=status)
 
-    def _rebase_or_clone_repo(self) -> None:
-        git_ssh_cmd = f"ssh -i {self.config[SHED_CONFIG_SECTION].get('repo_key')}"
+    def _git_ssh_cmd(self) -> str:
+        return f"ssh -i {self.config[SHED_CONFIG_SECTION].get('repo_key')}"
+
+    def _git_object_bytes(self) -> int:
+        """Size of the local object store, to measure what a clone/fetch pulled"""
+        objects_dir = self.repo_path / ".git" / "objects"
+        total = 0
+        for root, _, files in os.walk(objects_dir):
+            for name in files:
+                try:
+                    total += (Path(root) / name).stat().st_size
+                except OSError:
+                    continue
+        return total
+
+    async def _fetch_repo(self) -> None:
+        fetch_start = time()
+        await self.git.fetch(self.git_clone_depth)
+        self.last_fetch_epoch = time()
+        self.prom_stats["git_fetch_duration_seconds"] = int(
+            self.last_fetch_epoch - fetch_start
+        )
+        self.prom_stats["git_last_fetch_timestamp"] = int(self.last_fetch_epoch)
+
+    def _prefetch_is_fresh(self) -> bool:
+        """A prefetch from within twice the lead time is reused by a run"""
+        return bool(
+            self.git_prefetch_lead_seconds
+            and time() - self.last_fetch_epoch <= 2 * self.git_prefetch_lead_seconds
+        )
+
+    async def prefetch_repo(self) -> None:
+        """Fetch origin without touching the checkout jobs are running from"""
+        LOG.info(f"Prefetching {self.repo_url} into {self.repo_path}")
+        await self._fetch_repo()
+
+    async def _rebase_or_clone_repo(self) -> None:
         if self.init_file.exists():
             LOG.info(f"Rebasing {self.repo_path} from {self.repo_url}")
-            # Repo must be closed (context manager) or it leaks a persistent
-            # `git cat-file --batch-check` helper subprocess per call. A
-            # fresh Repo(...) is created every run_interval_seconds here, so
-            # an unclosed one accumulates one leaked process per cycle
-            # forever - eventually enough of them pile up (holding the repo
-            # open) that a later fetch/checkout hangs indefinitely, wedging
-            # this whole coroutine with no exception and no crash.
-            with Repo(self.repo_path) as repo:
-                with repo.git.custom_environment(GIT_SSH_COMMAND=git_ssh_cmd):
-                    repo.remotes.origin.fetch()
-                    repo.remotes.origin.refs.main.checkout()
-            self._setup_vault_pass()
+            if self._prefetch_is_fresh():
+                LOG.info("Checking out the prefetched origin/main")
+            else:
+                await self._fetch_repo()
+            if self.git_worktrees:
+                # Checked out into a new worktree by _activate_checkout
+                self.repo_head_sha = await self.git.rev_parse("origin/main")
+            else:
+                await self.git.checkout("origin/main")
+                self.repo_head_sha = await self.git.rev_parse("HEAD")
+            self.prom_stats["git_checkout_fetch_age_seconds"] = int(
+                time() - self.last_fetch_epoch
+            )
+            await self._activate_checkout()
+            return
+
+        loop = asyncio.get_running_loop()
+        # if we are at the point where init doesn't exist, git failed in the first
+        # pass. Try to repair the checkout from the objects we already have
+        # before throwing them away for a full clone.
+        if self.repo_path.exists() and await self._recover_repo():
+            await self._activate_checkout()
             return
 
-        # if we are at the point where init doesn't exist, git failed in the first pass
-        # clear house and start again. Never hurts to start clean.
         if self.repo_path.exists():
             LOG.info("Repo is corrupted, re-cloning")
             # must use shutil because rmdir requires empty directory which is not guaranteed
-            shutil.rmtree(self.repo_path)
+            await loop.run_in_executor(None, shutil.rmtree, self.repo_path)
 
         self.repo_path.mkdir(parents=True)
         LOG.info(f"Cloning {self.repo_url} to {self.repo_path}")
 
-        with Repo.clone_from(
-            self.repo_url,
-            self.repo_path,
-            env={"GIT_SSH_COMMAND": git_ssh_cmd},
-            branch="main",
-        ):
-            pass
+        clone_options = []
+        if self.git_clone_depth:
+            clone_options.append(f"--depth={self.git_clone_depth}")
+        if self.git_clone_filter:
+            clone_options.append(f"--filter={self.git_clone_filter}")
+        clone_start = time()
+        await self.git.clone(self.repo_url, "main", clone_options)
+        self.repo_head_sha = await self.git.rev_parse("HEAD")
+        self.last_fetch_epoch = time()
+        self.prom_stats["git_clone_duration_seconds"] = int(
+            self.last_fetch_epoch - clone_start
+        )
+        self.prom_stats["git_clone_bytes"] = await loop.run_in_executor(
+            None, self._git_object_bytes
+        )
+        self.prom_stats["git_last_fetch_timestamp"] = int(self.last_fetch_epoch)
+        self.prom_stats["git_checkout_fetch_age_seconds"] = 0
 
-        self._setup_vault_pass()
+        await self._activate_checkout()
 
-    def _setup_vault_pass(self) -> None:
+    async def _recover_repo(self) -> bool:
+        """fetch + reset --hard + clean an existing checkout in place.
+
+        Returns False if it isn't a usable git repo or still lacks init_file,
+        so the caller falls back to a fresh clone.
+        """
+        if not (self.repo_path / ".git").exists():
+            # git would otherwise use whatever repo a parent directory is in
+            LOG.warning(f"{self.repo_path} is not a git repo")
+            return False
+        LOG.info(f"{self.init_file} is missing, recovering {self.repo_path} in place")
+        loop = asyncio.get_running_loop()
+        recovery_start = time()
+        objects_before = await loop.run_in_executor(None, self._git_object_bytes)
+        try:
+            await self._fetch_repo()
+            await self.git.reset_hard("origin/main")
+            await self.git.clean()
+            self.repo_head_sha = await self.git.rev_parse("HEAD")
+        except GitError as err:
+            LOG.warning(f"Recovering {self.repo_path} failed: {err}")
+            return False
+        if not self.init_file.exists():
+            LOG.warning(f"{self.init_file} is still missing after recovery")
+            return False
+        self.prom_stats["git_recovery_duration_seconds"] = int(time() - recovery_start)
+        objects_after = await loop.run_in_executor(None, self._git_object_bytes)
+        self.prom_stats["git_recovery_bytes"] = max(objects_after - objects_before, 0)
+        self.prom_stats["git_checkout_fetch_age_seconds"] = 0
+        return True
+
+    async def _activate_checkout(self) -> None:
+        """Point checkout_path at repo_head_sha for the runs that follow"""
+        if not self.git_worktrees or self.repo_head_sha is None:
+            self.checkout_path = self.repo_path
+            self._setup_vault_pass()
+            return
+
+        worktree = self.worktrees_dir / self.repo_head_sha
+        if worktree != self.checkout_path and worktree not in self._worktrees_in_use():
+            # Left over from a crash or an older run of the same commit
+            await self._remove_worktree(worktree)
+            LOG.info(f"Checking out {self.repo_head_sha} into {worktree}")
+            await self.git.worktree_add(worktree, self.repo_head_sha)
+        self._setup_vault_pass(worktree)
+        if worktree != self.checkout_path:
+            # Atomic swap: the link always points at a complete checkout
+            tmp_link = self.current_checkout_link.with_name(
+                f"{self.current_checkout_link.name}.tmp"
+            )
+            tmp_link.unlink(missing_ok=True)
+            tmp_link.symlink_to(worktree, target_is_directory=True)
+            os.replace(tmp_link, self.current_checkout_link)
+            self.checkout_path = worktree
+        await self._gc_worktrees()
+
+    def _worktrees_in_use(self) -> set[Path]:
+        return {
+            job_state.checkout_path
+            for job_state in self.job_states.values()
+            if job_state.checkout_path is not None
+        }
+
+    async def _remove_worktree(self, worktree: Path) -> None:
+        if not worktree.exists():
+            return
+        try:
+            await self.git.worktree_remove(worktree)
+        except GitError:
+            # Not a registered worktree (e.g. repo_path was re-cloned)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, shutil.rmtree, worktree, True)
+
+    async def _gc_worktrees(self) -> None:
+        """Remove worktrees that aren't current or used by a running job"""
+        keep = {self.checkout_path, *self._worktrees_in_use()}
+        for worktree in sorted(self.worktrees_dir.iterdir()):
+            if worktree not in keep:
+                LOG.info(f"Removing unused worktree {worktree}")
+                await self._remove_worktree(worktree)
+        await self.git.worktree_prune()
+        self.prom_stats["git_worktrees"] = sum(1 for _ in self.worktrees_dir.iterdir())
+
+    def _job_checkout(self, job_name: str) -> Path:
+        """The checkout job_name runs from, pinned while it's running"""
+        return self.job_states[job_name].checkout_path or self.checkout_path
+
+    def _job_checkout_sha(self, job_name: str) -> str | None:
+        """The commit job_name runs; repo_head_sha moves on with later rebases"""
+        return self.job_states[job_name].checkout_sha or self.repo_head_sha
+
+    def _setup_vault_pass(self, checkout: Path | None = None) -> None:
         """Copy vault password file to .vault_pass in repo if configured"""
-        vault_pass_dest = self.repo_path / ".vault_pass"
+        vault_pass_dest = (checkout or self.repo_path) / ".vault_pass"
 
         if not self.vault_pass_file:
             LOG.info("No vault_pass_file configured in config")
@@ -357,13 +1130,21 @@ class Shed:
         # Set restrictive permissions (owner read/write only) for security
         vault_pass_dest.chmod(0o600)
 
-    def _create_logfile(self) -> Path | None:
+    @staticmethod
+    def _new_run_id(job_name: str = DEFAULT_JOB_NAME) -> str:
+        """Timestamped run id, also the run's log file name"""
+        now = datetime.now().strftime("%Y%m%d%H%M%S")
+        if job_name != DEFAULT_JOB_NAME:
+            return f"{RUN_LOG_PREFIX}{job_name}_{now}"
+        return f"{RUN_LOG_PREFIX}{now}"
+
+    def _create_logfile(
+        self, job_name: str = DEFAULT_JOB_NAME, run_id: str | None = None
+    ) -> Path | None:
         """Create a timestamped logfile"""
         if not self.log_dir_path:
             return None
-
-        now = datetime.now().strftime("%Y%m%d%H%M%S")
-        return self.log_dir_path / f"ansible_shed_run_{now}.log"
+        return self.log_dir_path / f"{run_id or self._new_run_id(job_name)}.log"
 
     def _update_latest_log_symlink(self, latest_log: Path) -> None:
         if not self.latest_log_symlink:
@@ -371,193 +1152,570 @@ class Shed:
             return
 
         try:
-            if self.latest_log_symlink.exists():
+            # is_symlink() as exists() is False for a dangling link
+            if self.latest_log_symlink.is_symlink() or self.latest_log_symlink.exists():
                 self.latest_log_symlink.unlink()
             self.latest_log_symlink.symlink_to(latest_log)
         except OSError:
             LOG.exception("Problem creating latest log symlink")
 
-    def _run_ansible(self) -> tuple[int, str]:
-        """Run ansible-playbook and parse out statistics for prometheus"""
-        run_log_path = self._create_logfile()
+    def _ansible_playbook_cmd(
+        self, job: JobConfig, limit: str | None = None, check_mode: bool = False
+    ) -> list[str]:
+        """Build the ansible-playbook command line for job.
 
+        limit overrides the job's ansible_limit (used by shards, whose host
+        lists were already resolved within ansible_limit). check_mode adds
+        --check for a drift probe that changes nothing.
+        """
         cmd = [
             self.config[SHED_CONFIG_SECTION]["ansible_playbook_binary"],
             "--inventory",
-            self.config[SHED_CONFIG_SECTION]["ansible_hosts_inventory"],
-            self.config[SHED_CONFIG_SECTION]["ansible_playbook_init"],
+            job.inventory,
+            job.playbook,
         ]
         # Add vault password file if it exists
-        vault_pass_file = self.repo_path / ".vault_pass"
+        vault_pass_file = self._job_checkout(job.name) / ".vault_pass"
         if vault_pass_file.exists():
             cmd.extend(["--vault-password-file", str(vault_pass_file)])
         # Handle optional parameters
-        if (
-            "ansible_show_diff" in self.config[SHED_CONFIG_SECTION]
-            and self.config[SHED_CONFIG_SECTION]["ansible_show_diff"]
-        ):
+        if job.show_diff:
             cmd.append("--diff")
-        if (
-            "ansible_limit" in self.config[SHED_CONFIG_SECTION]
-            and self.config[SHED_CONFIG_SECTION]["ansible_limit"]
-        ):
-            cmd.extend(["--limit", self.config[SHED_CONFIG_SECTION]["ansible_limit"]])
-        if (
-            "ansible_tags" in self.config[SHED_CONFIG_SECTION]
-            and self.config[SHED_CONFIG_SECTION]["ansible_tags"]
-        ):
-            cmd.extend(["--tags", self.config[SHED_CONFIG_SECTION]["ansible_tags"]])
-        if (
-            "ansible_skip_tags" in self.config[SHED_CONFIG_SECTION]
-            and self.config[SHED_CONFIG_SECTION]["ansible_skip_tags"]
-        ):
-            cmd.extend(
-                ["--skip-tags", self.config[SHED_CONFIG_SECTION]["ansible_skip_tags"]]
+        if limit or job.limit:
+            cmd.extend(["--limit", limit or str(job.limit)])
+        if job.tags:
+            cmd.extend(["--tags", job.tags])
+        if job.skip_tags:
+            cmd.extend(["--skip-tags", job.skip_tags])
+        if check_mode:
+            cmd.append("--check")
+        return cmd
+
+    async def _drain_ansible_stream(
+        self,
+        stream: asyncio.StreamReader | None,
+        parser: AnsibleOutputParser,
+        run_log: BinaryIO | None,
+        run_log_lock: asyncio.Lock,
+        log_prefix: bytes = b"",
+        live_log: LiveRunLog | None = None,
+    ) -> None:
+        """Feed complete lines from stream to parser, the run log and live_log.
+
+        Reads fixed size chunks rather than using readline() so an overly
+        long --diff line can't overrun the StreamReader limit. log_prefix is
+        prepended to every logged line (shards share one run log).
+        """
+        if stream is None:
+            return
+        loop = asyncio.get_running_loop()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # Chunks of an unfinished line; only new chunks are searched for a
+        # newline so a very long line stays linear
+        pending: list[bytes] = []
+        while True:
+            chunk = await stream.read(ANSIBLE_OUTPUT_CHUNK_BYTES)
+            if chunk:
+                last_newline = chunk.rfind(b"\n")
+                if last_newline == -1:
+                    pending.append(chunk)
+                    continue
+                lines = b"".join((*pending, chunk[: last_newline + 1]))
+                pending = [chunk[last_newline + 1 :]]
+            else:
+                lines, pending = b"".join(pending), []
+            if lines:
+                parser.feed(decoder.decode(lines))
+                if log_prefix:
+                    lines = b"".join(
+                        log_prefix + line for line in lines.splitlines(keepends=True)
+                    )
+                # Published under the lock so live offsets match the run log
+                async with run_log_lock:
+                    if run_log:
+                        await loop.run_in_executor(None, run_log.write, lines)
+                    if live_log:
+                        live_log.publish(lines)
+            if not chunk:
+                return
+
+    def _ansible_events_env(self, events_fd: int) -> dict[str, str]:
+        """Environment enabling the bundled callback plugin to write to events_fd"""
+        env = dict(os.environ)
+        plugin_paths = [str(CALLBACK_PLUGINS_DIR)]
+        if env.get("ANSIBLE_CALLBACK_PLUGINS"):
+            plugin_paths.append(env["ANSIBLE_CALLBACK_PLUGINS"])
+        env["ANSIBLE_CALLBACK_PLUGINS"] = os.pathsep.join(plugin_paths)
+        env[EVENTS_FD_ENV] = str(events_fd)
+        return env
+
+    async def _drain_ansible_events(
+        self, stream: asyncio.StreamReader, parser: AnsibleOutputParser
+    ) -> None:
+        """Feed newline delimited JSON callback events to parser"""
+        pending = b""
+        while chunk := await stream.read(ANSIBLE_OUTPUT_CHUNK_BYTES):
+            *lines, pending = (pending + chunk).split(b"\n")
+            for line in lines:
+                if not line:
+                    continue
+                try:
+                    parser.feed_event(loads(line))
+                except (JSONDecodeError, KeyError, TypeError, ValueError):
+                    LOG.warning(f"Ignoring bad ansible_shed_events event: {line!r}")
+
+    async def _terminate_ansible(self, process: asyncio.subprocess.Process) -> None:
+        """SIGTERM the ansible-playbook process group, SIGKILL if it lingers"""
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            if process.returncode is not None:
+                return
+            LOG.warning(f"Sending {sig.name} to ansible-playbook (pid {process.pid})")
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                return
+            try:
+                await asyncio.wait_for(
+                    process.wait(), timeout=ANSIBLE_TERMINATE_GRACE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                continue
+
+    async def _run_ansible_process(
+        self,
+        cmd: list[str],
+        cwd: Path,
+        parser: AnsibleOutputParser,
+        run_log: BinaryIO | None,
+        run_log_lock: asyncio.Lock,
+        deadline: float | None,
+        log_prefix: bytes = b"",
+        live_log: LiveRunLog | None = None,
+    ) -> int:
+        """Run one ansible-playbook process to completion, the deadline or cancel.
+
+        A structured parser is fed by the ansible_shed_events callback plugin
+        over a pipe instead of from stdout.
+        """
+        loop = asyncio.get_running_loop()
+        events_fd = events_transport = None
+        events_reader = asyncio.StreamReader()
+        pass_fds: tuple[int, ...] = ()
+        if parser.structured:
+            events_fd, events_write_fd = os.pipe()
+            pass_fds = (events_write_fd,)
+        env = self._ansible_env(pass_fds[0] if pass_fds else None)
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=cwd,
+                env=env,
+                pass_fds=pass_fds,
+                # Own process group so timeouts/cancellation reach ssh children
+                start_new_session=True,
             )
-        LOG.info(f"Running ansible-playbook: '{' '.join(cmd)}'")
-        ansible_start_time = time()
+        except BaseException:
+            if events_fd is not None:
+                os.close(events_fd)
+            raise
+        finally:
+            # Only ansible-playbook holds the write end so EOF means it exited
+            for fd in pass_fds:
+                os.close(fd)
+        if events_fd is not None:
+            events_transport, _ = await loop.connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(events_reader),
+                os.fdopen(events_fd, "rb", buffering=0),
+            )
+        else:
+            events_reader.feed_eof()
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    self._drain_ansible_stream(
+                        process.stdout,
+                        parser,
+                        run_log,
+                        run_log_lock,
+                        log_prefix,
+                        live_log,
+                    ),
+                    self._drain_ansible_stream(
+                        process.stderr,
+                        parser,
+                        run_log,
+                        run_log_lock,
+                        log_prefix,
+                        live_log,
+                    ),
+                    self._drain_ansible_events(events_reader, parser),
+                    process.wait(),
+                ),
+                timeout=None if deadline is None else max(deadline - loop.time(), 0),
+            )
+        except asyncio.TimeoutError:
+            LOG.error(
+                f"ansible-playbook exceeded run_timeout of "
+                f"{self.run_timeout_seconds}s, terminating"
+            )
+            await self._terminate_ansible(process)
+        except asyncio.CancelledError:
+            LOG.warning("ansible-playbook run cancelled, terminating")
+            await self._terminate_ansible(process)
+            raise
+        finally:
+            if events_transport:
+                events_transport.close()
+        if parser.structured and not parser.event_count:
+            LOG.warning(
+                "No events from the ansible_shed_events callback plugin; is "
+                "ANSIBLE_CALLBACK_PLUGINS overridden? Run stats will be empty"
+            )
+        return process.returncode if process.returncode is not None else -1
 
-        if not run_log_path:
-            cp = run(
-                cmd, stdout=PIPE, stderr=STDOUT, cwd=self.repo_path, encoding="utf-8"
+    async def _list_inventory_hosts(
+        self, job: JobConfig, pattern: str
+    ) -> list[str] | None:
+        """Resolve an inventory pattern (within the job's limit) to host names"""
+        section = self.config[SHED_CONFIG_SECTION]
+        cmd = [
+            str(Path(section["ansible_playbook_binary"]).with_name("ansible")),
+            pattern,
+            "--inventory",
+            job.inventory,
+            "--list-hosts",
+        ]
+        checkout = self._job_checkout(job.name)
+        vault_pass_file = checkout / ".vault_pass"
+        if vault_pass_file.exists():
+            cmd.extend(["--vault-password-file", str(vault_pass_file)])
+        if job.limit:
+            cmd.extend(["--limit", job.limit])
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                cwd=checkout,
+            )
+            stdout, _ = await asyncio.wait_for(
+                process.communicate(), timeout=INVENTORY_LIST_TIMEOUT_SECONDS
             )
-            ansible_output = cp.stdout
-            return_code = cp.returncode
+        except (OSError, asyncio.TimeoutError) as err:
+            LOG.error(f"Unable to list inventory hosts for {pattern!r}: {err!r}")
+            return None
+        if process.returncode != 0:
+            LOG.error(
+                f"Listing inventory hosts for {pattern!r} failed with returncode "
+                f"{process.returncode}"
+            )
+            return None
+        return parse_list_hosts(stdout.decode("utf-8", errors="replace"))
+
+    async def _resolve_shards(self, job: JobConfig) -> list[list[str]]:
+        """Split the inventory into --limit shards per shard_mode.
+
+        Returns an empty list when sharding is off or the inventory could not
+        be resolved, in which case a single unsharded run is done.
+        """
+        if self.shard_mode == "hash":
+            if self.shard_count <= 1:
+                return []
+            hosts = await self._list_inventory_hosts(job, "all")
+            return hash_shards(hosts, self.shard_count) if hosts else []
+
+        if self.shard_mode == "group":
+            # Hosts in none of the shard groups run together in a final shard
+            patterns = [*self.shard_groups, "all"]
+        elif self.shard_mode == "explicit":
+            patterns = self.shard_limits
         else:
-            ansible_output = ""
+            return []
+
+        shards: list[list[str]] = []
+        for pattern in patterns:
+            hosts = await self._list_inventory_hosts(job, pattern)
+            if hosts is None:
+                LOG.warning("Could not resolve shards, running unsharded")
+                return []
+            shards.append(hosts)
+        return dedupe_shards(shards)
+
+    async def _run_ansible_shards(
+        self,
+        job: JobConfig,
+        shards: list[list[str]],
+        parser: AnsibleOutputParser,
+        run_log: BinaryIO | None,
+        run_log_lock: asyncio.Lock,
+        deadline: float | None,
+        check_mode: bool = False,
+    ) -> int:
+        """Run one ansible-playbook --limit process per shard concurrently.
+
+        Each shard gets its own parser (interleaved lines would confuse the
+        recap state machines) which are merged into parser afterwards.
+        Returns the first non-zero shard returncode, else 0.
+        """
+        semaphore = asyncio.Semaphore(self.shard_concurrency or len(shards))
+        shard_parsers = [self._run_output_parser() for _ in shards]
+        self.job_states[job.name].live_parsers.extend(shard_parsers)
+
+        async def run_shard(shard_id: int, limit_file: Path) -> int:
+            cmd = self._ansible_playbook_cmd(
+                job, limit=f"@{limit_file}", check_mode=check_mode
+            )
+            async with semaphore:
+                LOG.info(
+                    f"Running shard {shard_id} ({len(shards[shard_id])} hosts): "
+                    f"'{' '.join(cmd)}'"
+                )
+                return await self._run_ansible_process(
+                    cmd,
+                    self._job_checkout(job.name),
+                    shard_parsers[shard_id],
+                    run_log,
+                    run_log_lock,
+                    deadline,
+                    log_prefix=f"[shard {shard_id}] ".encode(),
+                    live_log=self.job_states[job.name].live_log,
+                )
+
+        with TemporaryDirectory(prefix="ansible_shed_shards_") as limit_dir:
+            tasks = []
+            async with asyncio.TaskGroup() as tg:
+                for shard_id, hosts in enumerate(shards):
+                    limit_file = Path(limit_dir) / f"shard{shard_id}.limit"
+                    limit_file.write_text("\n".join(hosts) + "\n")
+                    tasks.append(tg.create_task(run_shard(shard_id, limit_file)))
+
+        for shard_parser in shard_parsers:
+            parser.merge(shard_parser)
+        return_codes = [task.result() for task in tasks]
+        return next((rc for rc in return_codes if rc != 0), 0)
+
+    async def _run_ansible(
+        self,
+        job: JobConfig | None = None,
+        check_mode: bool = False,
+        targeted: bool = False,
+    ) -> tuple[int, AnsibleOutputParser]:
+        """Run ansible-playbook and parse out statistics for prometheus"""
+        job = job or self.default_job
+        run_id = self._new_run_id(job.name)
+        run_log_path = self._create_logfile(job.name, run_id)
+        run_sha = self._job_checkout_sha(job.name)
+        ansible_start_time = time()
+        parser = self._run_output_parser()
+        loop = asyncio.get_running_loop()
+        deadline = (
+            loop.time() + self.run_timeout_seconds if self.run_timeout_seconds else None
+        )
+
+        job_state = self.job_states[job.name]
+        run_log: BinaryIO | None = None
+        if run_log_path:
             self._update_latest_log_symlink(run_log_path)
-            with (
-                Popen(
-                    cmd, stderr=PIPE, stdout=PIPE, cwd=self.repo_path, encoding="utf8"
-                ) as p,
-                run_log_path.open("w", buffering=1) as lf,
-            ):
-                if p.stdout:
-                    for output_line in p.stdout:
-                        ansible_output += output_line
-                        lf.write(output_line)
-
-                if p.stderr:
-                    stderr_output = p.stderr.read()
-                    ansible_output += stderr_output
-                    lf.write(stderr_output)
-
-            return_code = p.returncode
+            run_log = run_log_path.open("wb")
+        run_log_lock = asyncio.Lock()
+        job_state.run_started_epoch = ansible_start_time
+        job_state.live_parsers = [parser]
+        live_log = job_state.live_log = LiveRunLog(run_id, job.name)
+        # Stays -1 in the run log index if the run raises or is cancelled
+        return_code = -1
+        try:
+            shards = await self._resolve_shards(job)
+            if shards:
+                return_code = await self._run_ansible_shards(
+                    job, shards, parser, run_log, run_log_lock, deadline, check_mode
+                )
+            else:
+                cmd = self._ansible_playbook_cmd(job, check_mode=check_mode)
+                LOG.info(f"Running {job.name} ansible-playbook: '{' '.join(cmd)}'")
+                return_code = await self._run_ansible_process(
+                    cmd,
+                    self._job_checkout(job.name),
+                    parser,
+                    run_log,
+                    run_log_lock,
+                    deadline,
+                    live_log=live_log,
+                )
+        finally:
+            job_state.run_started_epoch = None
+            job_state.live_parsers = []
+            live_log.close(return_code)
+            job_state.live_log = None
+            if run_log:
+                run_log.close()
+            if run_log_path and self.run_logs:
+                self.run_logs.submit(
+                    RunLogEntry(
+                        run_id=run_id,
+                        job=job.name,
+                        log_name=run_log_path.name,
+                        start=ansible_start_time,
+                        end=time(),
+                        returncode=return_code,
+                    ),
+                    self.log_retention,
+                )
+            if self.run_history:
+                self.run_history.record(
+                    RunRecord(
+                        run_id=run_id,
+                        job=job.name,
+                        sha=run_sha,
+                        start=ansible_start_time,
+                        end=time(),
+                        returncode=return_code,
+                        check_mode=check_mode,
+                        hosts={
+                            hostname: HostStats.from_recap(recap)
+                            for hostname, recap in parser.host_stats.items()
+                        },
+                        tasks=parser.task_runtimes,
+                    )
+                )
 
+        # Wall clock time across every shard
         runtime = int(time() - ansible_start_time)
-        self.prom_stats["ansible_last_run_time"] = runtime
-        LOG.info(f"Finished running ansible in {runtime}s")
-        return (return_code, ansible_output)
-
-    def parse_ansible_stats(self, ansible_output: str, returncode: int) -> None:
-        LOG.info("Parsing ansible run output to update stats")
-        # Clear out old stats
-        for key in list(self.prom_stats.keys()):
-            if key.startswith("host_"):
-                del self.prom_stats[key]
-
-        # Parse Ansible output to get stats
-        for output_line in ansible_output.splitlines():
-            if not (lm := self.ansible_stats_line_re.search(output_line)):
-                continue
-
-            hostname = lm.group(1)
-            results = lm.group(2)
-            for stat in results.split():
-                k, v = stat.split("=", maxsplit=1)
-                self.prom_stats[f"host_{hostname}_{k}"] = int(v)
+        job_stats = job_state.prom_stats
+        job_stats["ansible_last_run_time"] = runtime
+        # Probes and narrowed runs would skew the full run quantiles
+        run_mode = "check" if check_mode else "targeted" if targeted else "full"
+        job_state.run_duration_samples.append((run_mode, time() - ansible_start_time))
+        job_stats["ansible_last_run_shards"] = max(len(shards), 1)
+        job_stats["ansible_last_run_check_mode"] = int(check_mode)
+        if self.fact_cache:
+            await self._update_fact_cache_stats(
+                job_stats, parser.host_stats, ansible_start_time
+            )
+        LOG.info(f"Finished running {job.name} ansible in {runtime}s")
+        return (return_code, parser)
 
-        self.prom_stats["ansible_last_run_returncode"] = returncode
-        self.prom_stats["ansible_stats_last_updated"] = int(time())
-        self.parse_ansible_profile(ansible_output)
+    async def _update_fact_cache_stats(
+        self,
+        job_stats: dict[str, int] | None = None,
+        run_hosts: Iterable[str] = (),
+        run_start: float = 0,
+    ) -> None:
+        """Count a run's fact cache hits / misses (if job_stats is passed) and
+        refresh the repo wide cached host count and oldest entry age"""
+        if not self.fact_cache:
+            return
+        loop = asyncio.get_running_loop()
+        if job_stats is not None:
+            hits, misses = await loop.run_in_executor(
+                None, self.fact_cache.run_counts, list(run_hosts), run_start
+            )
+            job_stats["ansible_fact_cache_hits"] = hits
+            job_stats["ansible_fact_cache_misses"] = misses
+        hosts, oldest_age = await loop.run_in_executor(
+            None, self.fact_cache.host_count_and_oldest_age, time()
+        )
+        self.prom_stats["ansible_fact_cache_hosts"] = hosts
+        self.prom_stats["ansible_fact_cache_oldest_age_seconds"] = oldest_age
         self.prom_stats_update.set()
 
-    def _count_run_artifacts(self, lines: list[str]) -> tuple[int, int, int]:
-        """Count TASK headers, [WARNING]: lines and [DEPRECATION WARNING]: lines."""
-        task_count = 0
-        warnings_count = 0
-        deprecation_count = 0
-        for line in lines:
-            if self.profile_task_header_re.match(line):
-                task_count += 1
-            if self.profile_deprecation_re.match(line):
-                deprecation_count += 1
-            elif self.profile_warning_re.match(line):
-                warnings_count += 1
-        return task_count, warnings_count, deprecation_count
-
-    def _parse_recap_row(self, line: str) -> tuple[str, str, float] | None:
-        """Parse one TASKS RECAP body line into (role, task, seconds) or None."""
-        m = self.profile_task_row_re.match(line)
-        if not m:
-            return None
-        name = m.group("name").strip()
-        try:
-            seconds = float(m.group("seconds"))
-        except ValueError:
-            return None
-        if " : " in name:
-            role, task = name.split(" : ", 1)
+    def _run_output_parser(self) -> AnsibleOutputParser:
+        """Parser for one ansible-playbook process; run history keeps every task"""
+        return AnsibleOutputParser(
+            self.profile_tasks_top_n,
+            self.ansible_events,
+            keep_task_runtimes=self.run_history is not None,
+        )
+
+    def _output_parser(
+        self, ansible_output: str | AnsibleOutputParser
+    ) -> AnsibleOutputParser:
+        """Return a parser for ansible_output, feeding it first if it's raw text"""
+        if isinstance(ansible_output, AnsibleOutputParser):
+            return ansible_output
+        parser = AnsibleOutputParser(self.profile_tasks_top_n)
+        parser.feed(ansible_output)
+        return parser
+
+    def parse_ansible_stats(
+        self,
+        ansible_output: str | AnsibleOutputParser,
+        returncode: int,
+        job_name: str = DEFAULT_JOB_NAME,
+        check_mode: bool = False,
+        targeted: bool = False,
+    ) -> None:
+        """Update job_name's stats from a finished run.
+
+        Per host stats come from the last full run: a targeted run only
+        updates the hosts it ran on and a --check run sets the separate
+        check stats, so neither hides the rest of the fleet.
+        """
+        LOG.info(f"Parsing {job_name} ansible run output to update stats")
+        parser = self._output_parser(ansible_output)
+        # Output is parsed as it streams in (profile_tasks recap included), so
+        # report that rather than the cost of copying the results out below
+        self.self_metrics.observe("parse_ansible_stats", parser.feed_seconds)
+        job_state = self.job_states[job_name]
+        prom_stats = job_state.prom_stats
+        if check_mode:
+            job_state.check_host_stats.replace(parser.host_stats)
+        elif targeted:
+            job_state.host_stats.update(parser.host_stats)
         else:
-            role, task = "", name
-        return role, task, seconds
-
-    def _extract_recap_rows(self, lines: list[str]) -> list[tuple[str, str, float]]:
-        """Pull (role, task, seconds) tuples out of the TASKS RECAP block."""
-        rows: list[tuple[str, str, float]] = []
-        in_recap = False
-        for line in lines:
-            if self.profile_tasks_recap_header_re.match(line):
-                in_recap = True
-                continue
-            if not in_recap:
-                continue
-            stripped = line.strip()
-            if stripped.startswith("PLAYBOOK RECAP") or (not stripped and rows):
-                in_recap = False
-                continue
-            row = self._parse_recap_row(line)
-            if row is not None:
-                rows.append(row)
-        return rows
+            job_state.host_stats.replace(parser.host_stats)
+        prom_stats["ansible_last_run_returncode"] = returncode
+        prom_stats["ansible_stats_last_updated"] = int(time())
+        self.parse_ansible_profile(parser, job_name)
+        self.prom_stats_update.set()
 
-    def parse_ansible_profile(self, ansible_output: str) -> None:
+    def parse_ansible_profile(
+        self,
+        ansible_output: str | AnsibleOutputParser,
+        job_name: str = DEFAULT_JOB_NAME,
+    ) -> None:
         """Parse output from ansible.posix.profile_tasks / .timer callbacks.
 
-        Populates self.profile_task_runtimes and self.profile_role_runtimes
+        Populates the job's profile_task_runtimes and profile_role_runtimes
         from the TASKS RECAP block (truncated to self.profile_tasks_top_n by
         descending duration). Also counts TASK headers, [WARNING]: lines and
         [DEPRECATION WARNING]: lines for companion gauges.
 
         Silently no-ops when the callbacks aren't producing output.
         """
-        self.profile_task_runtimes = []
-        self.profile_role_runtimes = {}
+        job_state = self.job_states[job_name]
+        job_state.profile_task_runtimes = []
+        job_state.profile_role_runtimes = {}
 
-        lines = ansible_output.splitlines()
-        task_count, warnings_count, deprecation_count = self._count_run_artifacts(lines)
-        recap_rows = self._extract_recap_rows(lines)
-
-        recap_rows.sort(key=lambda row: row[2], reverse=True)
-        for role, task, seconds in recap_rows[: self.profile_tasks_top_n]:
-            self.profile_task_runtimes.append(
+        parser = self._output_parser(ansible_output)
+        for role, task, seconds in parser.top_task_runtimes():
+            job_state.profile_task_runtimes.append(
                 {"role": role, "task": task, "seconds": seconds}
             )
-            self.profile_role_runtimes[role] = (
-                self.profile_role_runtimes.get(role, 0.0) + seconds
+            job_state.task_duration_samples.append((role, seconds))
+            job_state.profile_role_runtimes[role] = (
+                job_state.profile_role_runtimes.get(role, 0.0) + seconds
             )
 
-        self.prom_stats["ansible_task_count_total"] = task_count
-        self.prom_stats["ansible_warnings_count"] = warnings_count
-        self.prom_stats["ansible_deprecation_warnings_count"] = deprecation_count
-        self.prom_stats["ansible_profile_tasks_detected"] = 1 if recap_rows else 0
+        prom_stats = job_state.prom_stats
+        prom_stats["ansible_task_count_total"] = parser.task_count
+        prom_stats["ansible_warnings_count"] = parser.warnings_count
+        prom_stats["ansible_deprecation_warnings_count"] = parser.deprecation_count
+        prom_stats["ansible_profile_tasks_detected"] = (
+            1 if parser.recap_row_count else 0
+        )
 
-    def parse_version_check_state(self) -> None:
+    def parse_version_check_state(self, checkout: Path | None = None) -> None:
         """Parse version_check_state.json and update prometheus stats if enabled"""
         if not self.version_check_state_enabled:
             return
 
-        version_check_state_file = self.repo_path / "version_check_state.json"
+        version_check_state_file = (
+            checkout or self.checkout_path
+        ) / "version_check_state.json"
         if not version_check_state_file.exists():
             LOG.warning(
                 f"version_check_state_enabled is set but {version_check_state_file} does not exist"
@@ -583,7 +1741,7 @@ class Shed:
 
     async def _update_prom_stats(self) -> None:
         """Check for new stats every 30 seconds - Only run if last updated is newer"""
-        prom_gauges = {
+        prom_gauges: dict[str, Counter | Gauge] = {
             "ansible_last_run_returncode": Gauge(
                 "ansible_last_run_returncode",
                 "UNIX return code of the ansible-playbook process",
@@ -594,6 +1752,46 @@ class Shed:
                 "Time in seconds it took the ansible-playbook process to execute",
                 registry=self.prom_registry,
             ),
+            "ansible_last_run_shards": Gauge(
+                "ansible_last_run_shards",
+                "Number of --limit shards the last ansible-playbook run was split into",
+                registry=self.prom_registry,
+            ),
+            "ansible_fact_cache_hits": Gauge(
+                "ansible_fact_cache_hits",
+                "Hosts whose facts came from the fact cache in the last run",
+                registry=self.prom_registry,
+            ),
+            "ansible_fact_cache_misses": Gauge(
+                "ansible_fact_cache_misses",
+                "Hosts whose facts were gathered (cache miss or expired) in the last run",
+                registry=self.prom_registry,
+            ),
+            "ansible_fact_cache_hosts": Gauge(
+                "ansible_fact_cache_hosts",
+                "Hosts with facts in the fact cache",
+                registry=self.prom_registry,
+            ),
+            "ansible_fact_cache_oldest_age_seconds": Gauge(
+                "ansible_fact_cache_oldest_age_seconds",
+                "Age of the oldest host's cached facts when last checked",
+                registry=self.prom_registry,
+            ),
+            "ansible_last_run_skipped": Gauge(
+                "ansible_last_run_skipped",
+                "1 if the last run was skipped because HEAD was already applied cleanly",
+                registry=self.prom_registry,
+            ),
+            "ansible_last_run_targeted": Gauge(
+                "ansible_last_run_targeted",
+                "1 if the last run was narrowed to the --tags/--limit touched by new commits",
+                registry=self.prom_registry,
+            ),
+            "ansible_last_run_check_mode": Gauge(
+                "ansible_last_run_check_mode",
+                "1 if the last run was a --check drift probe instead of a full run",
+                registry=self.prom_registry,
+            ),
             "ansible_stats_last_updated": Gauge(
                 "ansible_stats_last_updated",
                 "UNIX timestamp of last time we updated the stats",
@@ -634,6 +1832,14 @@ class Shed:
                 "Number of ignored plays on hosts",
                 registry=self.prom_registry,
             ),
+            **{
+                f"check_{stat_name}": Gauge(
+                    f"ansible_check_{stat_name}",
+                    f"Number of {stat_name!r} plays in the last --check run",
+                    registry=self.prom_registry,
+                )
+                for stat_name in CHECK_STAT_NAMES
+            },
             "version_check_state_results": Gauge(
                 "version_check_state_results",
                 "Total number of packages needing upgrades",
@@ -644,6 +1850,56 @@ class Shed:
                 "Timestamp (seconds since epoch) of last version check",
                 registry=self.prom_registry,
             ),
+            "git_fetch_duration_seconds": Gauge(
+                "git_fetch_duration_seconds",
+                "Seconds the last git fetch of repo_url took",
+                registry=self.prom_registry,
+            ),
+            "git_last_fetch_timestamp": Gauge(
+                "git_last_fetch_timestamp",
+                "UNIX timestamp of the last successful git fetch or clone",
+                registry=self.prom_registry,
+            ),
+            "git_checkout_fetch_age_seconds": Gauge(
+                "git_checkout_fetch_age_seconds",
+                "Age of the fetch the last checkout used (staleness of the code run)",
+                registry=self.prom_registry,
+            ),
+            "git_clone_duration_seconds": Gauge(
+                "git_clone_duration_seconds",
+                "Seconds the last full clone of repo_url took",
+                registry=self.prom_registry,
+            ),
+            "git_clone_bytes": Gauge(
+                "git_clone_bytes",
+                "Object store bytes after the last full clone",
+                registry=self.prom_registry,
+            ),
+            "git_recovery_duration_seconds": Gauge(
+                "git_recovery_duration_seconds",
+                "Seconds the last in place fetch + reset --hard recovery took",
+                registry=self.prom_registry,
+            ),
+            "git_recovery_bytes": Gauge(
+                "git_recovery_bytes",
+                "Object store bytes added by the last in place recovery",
+                registry=self.prom_registry,
+            ),
+            "git_worktrees": Gauge(
+                "git_worktrees",
+                "git_worktrees checkouts on disk (current plus in use by runs)",
+                registry=self.prom_registry,
+            ),
+            "webhook_pushes_total": Counter(
+                "webhook_pushes_total",
+                "Authenticated pushes received on /webhook/git",
+                registry=self.prom_registry,
+            ),
+            "webhook_runs_triggered_total": Counter(
+                "webhook_runs_triggered_total",
+                "Runs triggered by /webhook/git after debouncing",
+                registry=self.prom_registry,
+            ),
             "ansible_task_count_total": Gauge(
                 "ansible_task_count_total",
                 "Total number of TASK [...] headers seen in the last run",
@@ -671,7 +1927,6 @@ class Shed:
             "Package that needs an upgrade (value=1)",
             registry=self.prom_registry,
         )
-        prev_pkg_labels: list[dict[str, str]] = []
 
         role_runtime_gauge = Gauge(
             "ansible_role_runtime_seconds",
@@ -683,92 +1938,281 @@ class Shed:
             "Per-task runtime from ansible.posix.profile_tasks (seconds)",
             registry=self.prom_registry,
         )
-        prev_role_labels: list[dict[str, str]] = []
-        prev_task_labels: list[dict[str, str]] = []
+
+        run_decision_gauge = Gauge(
+            "ansible_last_run_decision",
+            "Decision (run/skip/check/targeted) and reason for the last run (value=1)",
+            registry=self.prom_registry,
+        )
+
+        performance_info_gauge = Gauge(
+            "ansible_performance_info",
+            "Effective [performance] settings injected into ansible-playbook (value=1)",
+            registry=self.prom_registry,
+        )
+        run_duration_histogram = Histogram(
+            "ansible_run_duration_seconds",
+            "ansible-playbook run durations (every shard, wall clock) by run mode",
+            registry=self.prom_registry,
+            buckets=self.run_duration_buckets,
+        )
+        task_duration_histogram = Histogram(
+            "ansible_task_duration_seconds",
+            "Top-N profile_tasks task durations per role from every run",
+            registry=self.prom_registry,
+            buckets=self.task_duration_buckets,
+        )
+        series_dropped_gauge = Gauge(
+            "ansible_shed_series_dropped",
+            "Label sets over a metric's series limit, summed into its 'other' series",
+            registry=self.prom_registry,
+        )
+        tracker = LabelTracker()
 
         while True:
             await self.prom_stats_update.wait()
             LOG.debug("Updating prometheus stats due to event being set")
 
-            metric_count = 0
-            for k, v in self.prom_stats.items():
-                metric_count += 1
-                if not k.startswith("host_"):
-                    prom_gauges[k].set({}, v)
-                    continue
-
-                _, hostname, metric_name = k.split("_", maxsplit=2)
-                prom_gauges[metric_name].set({"hostname": hostname}, v)
-
-            current_pkg_labels: list[dict[str, str]] = []
-            for pkg in self.version_check_packages:
+            self._observe_duration_samples(
+                run_duration_histogram, task_duration_histogram
+            )
+            self._export_job_stats(tracker, prom_gauges)
+            dropped = {
+                "version_check_state_package": self._refresh_version_check_packages(
+                    tracker, version_check_state_package_gauge
+                ),
+                "ansible_task_runtime_seconds": self._refresh_profile_gauges(
+                    tracker, task_runtime_gauge, role_runtime_gauge
+                ),
+            }
+            for metric, count in dropped.items():
+                tracker.set(series_dropped_gauge, {"metric": metric}, count)
+            for job_name, job_state in self.job_states.items():
                 labels = {
-                    "name": pkg["name"],
-                    "current_version": pkg["current_version"],
-                    "latest_version": pkg["latest_version"],
+                    JOB_LABEL: job_name,
+                    "decision": job_state.last_decision,
+                    "reason": job_state.last_decision_reason,
                 }
-                version_check_state_package_gauge.set(labels, 1)
-                current_pkg_labels.append(labels)
-                metric_count += 1
-
-            # Remove gauge entries for packages no longer in the list
-            for old_labels in prev_pkg_labels:
-                if old_labels not in current_pkg_labels:
-                    version_check_state_package_gauge.values.pop(old_labels, None)
-            prev_pkg_labels = current_pkg_labels
-
-            prev_task_labels, prev_role_labels = self._refresh_profile_gauges(
-                task_runtime_gauge,
-                role_runtime_gauge,
-                prev_task_labels,
-                prev_role_labels,
-            )
-            metric_count += len(prev_task_labels) + len(prev_role_labels)
+                tracker.set(run_decision_gauge, labels, 1)
+            self._refresh_performance_info(tracker, performance_info_gauge)
+            # Series not set this time (decommissioned hosts, upgraded
+            # packages, renamed tasks ...) stop being exported
+            metric_count = tracker.prune()
 
             LOG.info(f"Updated {metric_count} metrics")
+            self.metrics_cache.invalidate()
             self.prom_stats_update.clear()
 
+    def _observe_duration_samples(
+        self, run_histogram: Histogram, task_histogram: Histogram
+    ) -> None:
+        """Move durations recorded since the last update into the histograms.
+
+        Histograms are cumulative, so no run is lost between scrapes.
+        """
+        for job_name, job_state in self.job_states.items():
+            for mode, seconds in job_state.run_duration_samples:
+                run_histogram.observe({JOB_LABEL: job_name, "mode": mode}, seconds)
+            for role, seconds in job_state.task_duration_samples:
+                task_histogram.observe({JOB_LABEL: job_name, "role": role}, seconds)
+            job_state.run_duration_samples.clear()
+            job_state.task_duration_samples.clear()
+
+    def _export_job_stats(
+        self, tracker: LabelTracker, prom_gauges: dict[str, Counter | Gauge]
+    ) -> None:
+        """Set every job's prom_stats and per host gauges"""
+        for job_name, job_state in self.job_states.items():
+            for k, v in job_state.prom_stats.items():
+                if k in REPO_STAT_KEYS:
+                    tracker.set(prom_gauges[k], {}, v)
+                else:
+                    tracker.set(prom_gauges[k], {JOB_LABEL: job_name}, v)
+            for hostname, host_stats in job_state.host_stats.items():
+                labels = {"hostname": hostname, JOB_LABEL: job_name}
+                for stat_name, value in zip(
+                    HOST_STAT_NAMES, host_stats.values(), strict=True
+                ):
+                    tracker.set(prom_gauges[stat_name], labels, value)
+            for hostname, host_stats in job_state.check_host_stats.items():
+                labels = {"hostname": hostname, JOB_LABEL: job_name}
+                for stat_name in CHECK_STAT_NAMES:
+                    tracker.set(
+                        prom_gauges[f"check_{stat_name}"],
+                        labels,
+                        getattr(host_stats, stat_name),
+                    )
+
+    def _refresh_performance_info(self, tracker: LabelTracker, gauge: Gauge) -> None:
+        """ansible_performance_info; the old series goes when settings change"""
+        tracker.set(gauge, self.performance.info_labels(), 1)
+
+    def _refresh_version_check_packages(
+        self, tracker: LabelTracker, gauge: Gauge
+    ) -> int:
+        """Set version_check_state_package; returns the series over the limit.
+
+        Packages past version_check_package_series_limit are counted in one
+        name="other" series.
+        """
+        budget = SeriesBudget(
+            "version_check_state_package", self.version_check_package_series_limit
+        )
+        other_labels = {
+            "name": OTHER,
+            "current_version": OTHER,
+            "latest_version": OTHER,
+        }
+        for pkg in self.version_check_packages:
+            labels = {
+                "name": pkg["name"],
+                "current_version": pkg["current_version"],
+                "latest_version": pkg["latest_version"],
+            }
+            budget.add(labels, 1, other_labels)
+        return budget.export(tracker, gauge)
+
     def _refresh_profile_gauges(
-        self,
-        task_gauge: Gauge,
-        role_gauge: Gauge,
-        prev_task_labels: list[dict[str, str]],
-        prev_role_labels: list[dict[str, str]],
-    ) -> tuple[list[dict[str, str]], list[dict[str, str]]]:
-        """Set/clean ansible_task_runtime_seconds + ansible_role_runtime_seconds.
-
-        Removes labels from prev_*_labels that are no longer present so renamed
-        or absent tasks/roles do not leak as stale series.
+        self, tracker: LabelTracker, task_gauge: Gauge, role_gauge: Gauge
+    ) -> int:
+        """Set ansible_task_runtime_seconds + ansible_role_runtime_seconds.
+
+        Task names go through task_label_normalize and each job's tasks past
+        task_runtime_series_limit (slowest first) are summed into its
+        role="other", task="other" series. Returns the task series dropped.
         """
-        current_task_labels: list[dict[str, str]] = []
-        for entry in self.profile_task_runtimes:
-            labels = {"role": str(entry["role"]), "task": str(entry["task"])}
-            task_gauge.set(labels, float(entry["seconds"]))
-            current_task_labels.append(labels)
-        for old_labels in prev_task_labels:
-            if old_labels not in current_task_labels:
-                task_gauge.values.pop(old_labels, None)
-
-        current_role_labels: list[dict[str, str]] = []
-        for role, seconds in self.profile_role_runtimes.items():
-            labels = {"role": role}
-            role_gauge.set(labels, seconds)
-            current_role_labels.append(labels)
-        for old_labels in prev_role_labels:
-            if old_labels not in current_role_labels:
-                role_gauge.values.pop(old_labels, None)
-
-        return current_task_labels, current_role_labels
+        dropped = 0
+        for job_name, job_state in self.job_states.items():
+            # Per job so one big playbook can't crowd out every other job
+            task_budget = SeriesBudget(
+                "ansible_task_runtime_seconds", self.task_runtime_series_limit
+            )
+            other_labels = {JOB_LABEL: job_name, "role": OTHER, "task": OTHER}
+            for entry in job_state.profile_task_runtimes:
+                labels = {
+                    JOB_LABEL: job_name,
+                    "role": str(entry["role"]),
+                    "task": normalize(str(entry["task"]), self.task_label_normalizers),
+                }
+                task_budget.add(labels, float(entry["seconds"]), other_labels)
+            dropped += task_budget.export(tracker, task_gauge)
+            for role, seconds in job_state.profile_role_runtimes.items():
+                tracker.set(role_gauge, {JOB_LABEL: job_name, "role": role}, seconds)
+        return dropped
 
-    async def prometheus_server(self) -> None:
-        """Use aioprometheus to server statistics to prometheus"""
-        self.prom_registry = Registry()
+    async def _update_live_stats(self) -> None:
+        """Export the progress of running ansible-playbook processes.
+
+        Refreshed every live_stats_interval seconds rather than per output
+        line so a chatty run can't thrash the registry.
+        """
+        gauges = {
+            "in_progress": Gauge(
+                "ansible_run_in_progress",
+                "1 while ansible-playbook is running for the job",
+                registry=self.prom_registry,
+            ),
+            "elapsed": Gauge(
+                "ansible_run_elapsed_seconds",
+                "Seconds the in progress ansible-playbook run has been going",
+                registry=self.prom_registry,
+            ),
+            "tasks": Gauge(
+                "ansible_run_tasks_seen",
+                "TASK [...] headers seen so far in the in progress run",
+                registry=self.prom_registry,
+            ),
+            "current_task": Gauge(
+                "ansible_run_current_task",
+                "Play and task the in progress run is on, per shard (value=1)",
+                registry=self.prom_registry,
+            ),
+            "failed": Gauge(
+                "ansible_run_host_failed",
+                "Failed task results per host so far in the in progress run",
+                registry=self.prom_registry,
+            ),
+            "unreachable": Gauge(
+                "ansible_run_host_unreachable",
+                "Unreachable task results per host so far in the in progress run",
+                registry=self.prom_registry,
+            ),
+        }
+        tracker = LabelTracker()
+        was_running = True
+        while True:
+            self._refresh_live_gauges(gauges, tracker)
+            # Idle refreshes rewrite the same values; keep the cached render
+            running = any(
+                js.run_started_epoch is not None for js in self.job_states.values()
+            )
+            if running or was_running:
+                self.metrics_cache.invalidate()
+            was_running = running
+            await asyncio.sleep(self.live_stats_interval_seconds)
+
+    def _refresh_live_gauges(
+        self, gauges: dict[str, Gauge], tracker: LabelTracker
+    ) -> None:
+        """Set the in progress run gauges from every job's live parsers.
+
+        Labeled series (current task, per host failures) from a previous
+        refresh that are no longer present are pruned, so nothing lingers
+        once a run finishes; the final counts live in ansible_failed etc.
+        """
+        now = time()
+        for job_name, job_state in self.job_states.items():
+            job_labels = {JOB_LABEL: job_name}
+            started = job_state.run_started_epoch
+            tracker.set(gauges["in_progress"], job_labels, int(started is not None))
+            tracker.set(
+                gauges["elapsed"],
+                job_labels,
+                int(now - started) if started is not None else 0,
+            )
+            tracker.set(
+                gauges["tasks"],
+                job_labels,
+                # Shards run the same tasks; match merge()'s final task_count
+                max((p.task_count for p in job_state.live_parsers), default=0),
+            )
+            host_failures: dict[str, dict[str, int]] = {}
+            for parser in job_state.live_parsers:
+                if parser.current_play or parser.current_task:
+                    labels = {
+                        JOB_LABEL: job_name,
+                        "play": parser.current_play,
+                        "task": parser.current_task,
+                    }
+                    tracker.set(gauges["current_task"], labels, 1)
+                for hostname, failures in parser.live_host_failures.items():
+                    merged = host_failures.setdefault(hostname, {})
+                    for kind, count in failures.items():
+                        merged[kind] = merged.get(kind, 0) + count
+            for hostname, failures in host_failures.items():
+                for kind, count in failures.items():
+                    labels = {"hostname": hostname, JOB_LABEL: job_name}
+                    tracker.set(gauges[kind], labels, count)
+        tracker.prune()
+
+    def _api_app(self) -> aiohttp.web.Application:
         app = aiohttp.web.Application()
         app.router.add_route("GET", "/metrics", self._handle_metrics)
         app.router.add_route("POST", "/pause", self._handle_pause)
         app.router.add_route("POST", "/force-run", self._handle_force_run)
+        app.router.add_route("POST", "/facts/invalidate", self._handle_invalidate_facts)
+        app.router.add_route("POST", "/webhook/git", self._handle_git_webhook)
         app.router.add_route("GET", "/healthz", self._handle_healthz)
-        runner = aiohttp.web.AppRunner(app, shutdown_timeout=2.0)
+        app.router.add_route("GET", "/runs", self._handle_runs)
+        app.router.add_route("GET", "/runs/current/log", self._handle_current_run_log)
+        app.router.add_route("GET", "/runs/{run_id}/log", self._handle_run_log)
+        app.router.add_route("GET", "/runs/{run_id}", self._handle_run)
+        return app
+
+    async def prometheus_server(self) -> None:
+        """Use aioprometheus to server statistics to prometheus"""
+        self.prom_registry = Registry()
+        runner = aiohttp.web.AppRunner(self._api_app(), shutdown_timeout=2.0)
         await runner.setup()
         bind_addr = self.config[SHED_CONFIG_SECTION].get("prometheus_bind_addr", "::")
         site = aiohttp.web.TCPSite(runner, bind_addr, self.stats_port)
@@ -781,15 +2225,368 @@ class Shed:
                 "api_token is not configured or uses the default placeholder; "
                 "authenticated API endpoints are unavailable"
             )
+        updaters = [self._update_prom_stats(), self._update_live_stats()]
+        if self.self_metrics.enabled:
+            updaters.append(self._run_self_metrics())
         try:
-            await self._update_prom_stats()
+            await asyncio.gather(*updaters)
         finally:
             await runner.cleanup()
 
+    async def _run_self_metrics(self) -> None:
+        await self.self_metrics.run(
+            self.prom_registry,
+            self.self_metrics_interval_seconds,
+            executor_queue_depth=self.executor.queue_depth,
+            on_update=self.metrics_cache.invalidate,
+        )
+
+    def request_force_run(self, job_name: str | None = None) -> None:
+        """Mark job_name (or every job) to run now, even while paused"""
+        for name, job_state in self.job_states.items():
+            if job_name is None or name == job_name:
+                job_state.force_run_pending = True
+        self.force_run_requested.set()
+
+    def request_webhook_run(self) -> bool:
+        """Fetch and run every job once the webhook_debounce window closes.
+
+        Pushes within the window share one run. Returns False when the push
+        joined an already open window.
+        """
+        if self._webhook_debounce_task and not self._webhook_debounce_task.done():
+            return False
+        self._webhook_debounce_task = asyncio.create_task(self._debounced_webhook_run())
+        return True
+
+    async def _debounced_webhook_run(self) -> None:
+        await asyncio.sleep(self.webhook_debounce_seconds)
+        # Make the run fetch even if a prefetch would otherwise be reused
+        self.last_fetch_epoch = 0.0
+        # A running job becomes due again when it finishes: however many
+        # pushes arrive during a run, it gets one follow-up run. Paused jobs
+        # are skipped as for any interval run.
+        now = time()
+        for job_state in self.job_states.values():
+            job_state.next_run_epoch = min(job_state.next_run_epoch, now)
+        self.prom_stats["webhook_runs_triggered_total"] += 1
+        self.webhook_run_requested.set()
+
+    def _next_due_job(self) -> tuple[JobConfig | None, float]:
+        """Pick the job to run next, or how long until one is due.
+
+        Due jobs are ordered by (next run time, priority). While paused only
+        force-run jobs are due; others are skipped to their next interval.
+        """
+        now = time()
+        due: list[tuple[float, int, str]] = []
+        wait_seconds = float(self.run_interval_seconds)
+        for job in self.jobs.values():
+            job_state = self.job_states[job.name]
+            if job_state.running:
+                continue
+            if job_state.force_run_pending:
+                heapq.heappush(due, (0.0, job.priority, job.name))
+                continue
+            if job_state.next_run_epoch > now:
+                wait_seconds = min(wait_seconds, job_state.next_run_epoch - now)
+                continue
+            if self._is_paused() and self.paused_until_epoch is not None:
+                pause_until = datetime.fromtimestamp(
+                    self.paused_until_epoch, tz=timezone.utc
+                ).isoformat()
+                LOG.info(f"Paused until {pause_until}, skipping {job.name} runtime")
+                job_state.next_run_epoch = now + job.interval_seconds
+                wait_seconds = min(wait_seconds, job.interval_seconds)
+                continue
+            heapq.heappush(due, (job_state.next_run_epoch, job.priority, job.name))
+        if not due:
+            return None, max(wait_seconds, 0.0)
+        return self.jobs[heapq.heappop(due)[2]], 0.0
+
+    async def _wait_for_scheduler_wakeup(self, timeout_seconds: float) -> None:
+        """Sleep until timeout_seconds pass, a force/webhook run or a job finishes"""
+        waiters = [
+            asyncio.create_task(self.force_run_requested.wait()),
+            asyncio.create_task(self.webhook_run_requested.wait()),
+            asyncio.create_task(self._job_finished.wait()),
+        ]
+        try:
+            await asyncio.wait(
+                waiters, timeout=timeout_seconds, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        self._job_finished.clear()
+        self.webhook_run_requested.clear()
+        if await self._wait_for_force_run(0):
+            LOG.info("Force run requested; starting next run now")
+
+    def _unchanged_run_decision(
+        self, job: JobConfig, job_state: JobState, forced: bool
+    ) -> tuple[str, str]:
+        """Decide whether to "run", "skip" or "check" job, and the reason.
+
+        Only skips (or downgrades to a --check drift probe) when HEAD and the
+        job's config are unchanged since its last clean full run and that run
+        is newer than max_skip_interval.
+        """
+        if self.unchanged_mode == "run":
+            return "run", "always"
+        if forced:
+            return "run", "forced"
+        head_sha = self._job_checkout_sha(job.name)
+        if head_sha is None or job_state.last_success_sha is None:
+            return "run", "no_clean_run"
+        if job_state.last_success_sha != head_sha:
+            return "run", "head_changed"
+        if job_state.last_success_job != job:
+            return "run", "config_changed"
+        if (
+            self.max_skip_interval_seconds
+            and time() - job_state.last_full_run_epoch >= self.max_skip_interval_seconds
+        ):
+            return "run", "max_skip_interval"
+        return self.unchanged_mode, "unchanged"
+
+    async def _changed_paths(self, old_sha: str, new_sha: str) -> list[str] | None:
+        """Repo relative paths changed between two commits, None if unknown"""
+        try:
+            return await self.git.changed_paths(old_sha, new_sha)
+        except GitError as err:
+            LOG.error(f"Unable to diff {old_sha}..{new_sha}: {err}")
+            return None
+
+    async def _target_job(
+        self, job: JobConfig, job_state: JobState
+    ) -> tuple[str, str, JobConfig] | None:
+        """Narrow job to the --tags/--limit touched since its last clean run.
+
+        Returns (decision, reason, job to run), or None when there's no clean
+        run of this job config to diff against or HEAD hasn't moved since it.
+        An unchanged HEAD is left to unchanged_mode. Anything that can't be
+        mapped falls back to a full run.
+        """
+        base_sha = job_state.last_success_sha
+        head_sha = self._job_checkout_sha(job.name)
+        if (
+            base_sha is None
+            or head_sha is None
+            or base_sha == head_sha
+            or job_state.last_success_job != job
+        ):
+            return None
+        if (
+            self.targeted_full_run_interval_seconds
+            and time() - job_state.last_full_run_epoch
+            >= self.targeted_full_run_interval_seconds
+        ):
+            return "run", "full_run_interval", job
+
+        changed_paths = await self._changed_paths(base_sha, head_sha)
+        if changed_paths is None:
+            return "run", "diff_failed", job
+        try:
+            rules = (
+                load_target_rules(self._job_checkout(job.name) / self.target_map_file)
+                if self.target_map_file
+                else []
+            )
+        except (OSError, ConfigParserError) as err:
+            LOG.error(f"Unable to load target_map_file: {err}")
+            return "run", "bad_target_map", job
+
+        target, unmapped = resolve_target(changed_paths, rules)
+        if unmapped:
+            LOG.info(
+                f"{job.name}: {len(unmapped)} changed paths don't map to tags or "
+                f"hosts (e.g. {unmapped[0]}); running in full"
+            )
+            return "run", "unmapped_path", job
+        targeted_job = narrow_job(job, target)
+        if targeted_job is None:
+            return "skip", "no_matching_changes", job
+        if targeted_job == job:
+            return "run", "full_target", job
+        LOG.info(
+            f"{job.name}: {len(changed_paths)} changed paths since {base_sha} "
+            f"map to --tags {targeted_job.tags} --limit {targeted_job.limit}"
+        )
+        return "targeted", "head_changed", targeted_job
+
+    def _record_run_outcome(
+        self,
+        job: JobConfig,
+        job_state: JobState,
+        check_mode: bool,
+        returncode: int,
+        parser: AnsibleOutputParser,
+        run_start_time: float,
+        targeted: bool = False,
+    ) -> None:
+        if check_mode:
+            drifted = returncode != 0 or any(
+                host_stats.get(k, 0)
+                for host_stats in parser.host_stats.values()
+                for k in CHECK_STAT_NAMES
+            )
+            if drifted:
+                LOG.info(f"{job.name} --check found drift; next run will be full")
+                job_state.last_success_sha = None
+            return
+
+        if not targeted:
+            job_state.last_full_run_epoch = run_start_time
+        if returncode == 0:
+            job_state.last_success_sha = self._job_checkout_sha(job.name)
+            job_state.last_success_job = job
+        else:
+            job_state.last_success_sha = None
+            job_state.last_success_job = None
+
+    async def _run_job(
+        self, job: JobConfig, semaphore: asyncio.Semaphore, forced: bool = False
+    ) -> None:
+        job_state = self.job_states[job.name]
+        run_start_time = time()
+        try:
+            async with self._repo_lock:
+                # Only rebase when no other job is running from the checkout.
+                # Worktrees never change under a running job.
+                if self.git_worktrees or not self._active_runs:
+                    with self.self_metrics.timed("rebase_or_clone_repo"):
+                        await self._rebase_or_clone_repo()
+                self._active_runs += 1
+                job_state.checkout_path = self.checkout_path
+                job_state.checkout_sha = self.repo_head_sha
+            try:
+                decision, reason = self._unchanged_run_decision(job, job_state, forced)
+                run_job = job
+                if self.targeted_runs and decision == "run" and not forced:
+                    targeted = await self._target_job(job, job_state)
+                    if targeted:
+                        decision, reason, run_job = targeted
+                job_state.last_decision = decision
+                job_state.last_decision_reason = reason
+                job_state.prom_stats["ansible_last_run_skipped"] = int(
+                    decision == "skip"
+                )
+                job_state.prom_stats["ansible_last_run_targeted"] = int(
+                    decision == "targeted"
+                )
+                if decision == "skip":
+                    LOG.info(
+                        f"Skipping {job.name} run at {job_state.checkout_sha}: {reason}"
+                    )
+                    self.prom_stats_update.set()
+                    return
+                # Run ansible playbook
+                check_mode = decision == "check"
+                with self.self_metrics.timed("run_ansible"):
+                    returncode, ansible_output = await self._run_ansible(
+                        run_job, check_mode, targeted=decision == "targeted"
+                    )
+            finally:
+                self._active_runs -= 1
+            self._record_run_outcome(
+                job,
+                job_state,
+                check_mode,
+                returncode,
+                ansible_output,
+                run_start_time,
+                targeted=decision == "targeted",
+            )
+            # Both run on the event loop, not an executor thread, because the
+            # exporters iterate the job state they write while other jobs run.
+            # Parse version check state before ansible stats because
+            # parse_ansible_stats sets the prom_stats_update event that
+            # triggers _update_prom_stats to export metrics.
+            with self.self_metrics.timed("parse_version_check_state"):
+                self.parse_version_check_state(job_state.checkout_path)
+            # Parse ansible success or error (sets prom_stats_update event)
+            self.parse_ansible_stats(
+                ansible_output,
+                returncode,
+                job.name,
+                check_mode,
+                targeted=decision == "targeted",
+            )
+        finally:
+            job_state.running = False
+            job_state.checkout_path = None
+            job_state.checkout_sha = None
+            semaphore.release()
+            self._job_finished.set()
+
+        run_time = int(time() - run_start_time)
+        if run_time > job.interval_seconds:
+            LOG.warning(
+                f"{job.name} ansible run exceeded configured interval by "
+                f"{run_time - job.interval_seconds}s"
+            )
+        next_run_in = max(int(job_state.next_run_epoch - time()), 0)
+        LOG.info(
+            f"Finished {job.name} ansible run in {run_time}s. "
+            f"Next run in {next_run_in}s"
+        )
+        LOG.debug(f"Stats:\n{dumps(job_state.prom_stats, indent=2, sort_keys=True)}")
+
+    def _next_prefetch_wait(self) -> float:
+        """Seconds until the next prefetch should start, 0 to fetch now"""
+        now = time()
+        next_run = min(
+            (s.next_run_epoch for s in self.job_states.values() if not s.running),
+            default=now + self.run_interval_seconds,
+        )
+        fetch_at = next_run - self.git_prefetch_lead_seconds
+        if fetch_at > now:
+            return min(fetch_at - now, GIT_PREFETCH_POLL_SECONDS)
+        if self.last_fetch_epoch >= fetch_at:
+            # Already fetched for this run; wait for it to start
+            return float(GIT_PREFETCH_POLL_SECONDS)
+        return 0.0
+
+    async def git_prefetcher(self) -> None:
+        """Fetch git_prefetch_lead seconds before the next run is due.
+
+        The run then only checks out the already fetched ref, so git/ssh
+        latency overlaps the sleep between runs instead of delaying it.
+        """
+        while True:
+            if not self.git_prefetch_lead_seconds or not self.init_file.exists():
+                await asyncio.sleep(GIT_PREFETCH_POLL_SECONDS)
+                continue
+            wait_seconds = self._next_prefetch_wait()
+            if wait_seconds > 0:
+                await asyncio.sleep(wait_seconds)
+                continue
+            # Serialized with run checkouts: concurrent fetches fight over ref locks
+            async with self._repo_lock:
+                try:
+                    await self.prefetch_repo()
+                    prefetch_failed = False
+                except Exception:
+                    LOG.exception("git prefetch failed; the next run will fetch")
+                    prefetch_failed = True
+            self.prom_stats_update.set()
+            if prefetch_failed:
+                # Don't retry in a tight loop, or hold up run checkouts meanwhile
+                await asyncio.sleep(GIT_PREFETCH_POLL_SECONDS)
+
     # TODO: Make coroutine cleanly exit on shutdown
     async def ansible_runner(self) -> None:
+        """Schedule every configured job on its own interval.
+
+        Jobs share one checkout and at most max_concurrent_jobs run at once.
+        max_concurrent_jobs is read at startup; other config is reloaded
+        before every dispatch.
+        """
         loop = asyncio.get_running_loop()
-        force_run_once = False
+        semaphore = asyncio.Semaphore(self.max_concurrent_jobs)
+        running_jobs: set[asyncio.Task[None]] = set()
+        prefetcher = asyncio.create_task(self.git_prefetcher())
 
         if "start_splay" in self.config[SHED_CONFIG_SECTION]:
             start_splay_int = self.config[SHED_CONFIG_SECTION].getint(
@@ -801,53 +2598,31 @@ class Shed:
                 await asyncio.sleep(splay_time)
 
         while True:
-            run_start_time = time()
-            # Reload Config File
-            self.config = await loop.run_in_executor(
-                None, _load_shed_config, self.config_path
-            )
-            self.reload_config_vars()
-
-            force_run_once = await self._wait_for_force_run(0)
+            # Surface job failures the same way the single run loop did
+            for finished_job in [t for t in running_jobs if t.done()]:
+                running_jobs.discard(finished_job)
+                finished_job.result()
+            if prefetcher.done():
+                prefetcher.result()
 
-            if self._is_paused() and not force_run_once:
-                if self.paused_until_epoch is not None:
-                    pause_until = datetime.fromtimestamp(
-                        self.paused_until_epoch, tz=timezone.utc
-                    ).isoformat()
-                    LOG.info(f"Paused until {pause_until}, skipping this runtime")
-                force_run_once = await self._wait_for_force_run(
-                    self.run_interval_seconds
+            # Reload Config File
+            with self.self_metrics.timed("config_reload"):
+                self.config = await loop.run_in_executor(
+                    None, _load_shed_config, self.config_path
                 )
-                if force_run_once:
-                    LOG.info("Force run requested while paused; running once")
+                self.reload_config_vars()
+
+            job, wait_seconds = self._next_due_job()
+            if job is None:
+                await self._wait_for_scheduler_wakeup(wait_seconds)
                 continue
-            force_run_once = False
-            # Rebase ansible repo
-            await loop.run_in_executor(None, self._rebase_or_clone_repo)
-            # Run ansible playbook
-            returncode, ansible_output = await loop.run_in_executor(
-                None, self._run_ansible
-            )
-            # Parse version check state before ansible stats because
-            # parse_ansible_stats sets the prom_stats_update event that
-            # triggers _update_prom_stats to export metrics.
-            await loop.run_in_executor(None, self.parse_version_check_state)
-            # Parse ansible success or error (sets prom_stats_update event)
-            await loop.run_in_executor(
-                None, self.parse_ansible_stats, ansible_output, returncode
-            )
 
-            run_finish_time = time()
-            run_time = int(run_finish_time - run_start_time)
-            if run_time > self.run_interval_seconds:
-                LOG.warning(
-                    "Ansible run exceeded configured interval by "
-                    f"{run_time - self.run_interval_seconds}s"
-                )
-            sleep_time = max(self.run_interval_seconds - run_time, 0)
-            LOG.info(f"Finished ansible run in {run_time}s. Sleeping for {sleep_time}s")
-            LOG.debug(f"Stats:\n{dumps(self.prom_stats, indent=2, sort_keys=True)}")
-            force_run_once = await self._wait_for_force_run(sleep_time)
-            if force_run_once:
-                LOG.info("Force run requested; starting next run now")
+            await semaphore.acquire()
+            job_state = self.job_states[job.name]
+            forced = job_state.force_run_pending
+            if forced and self._is_paused():
+                LOG.info(f"Force run requested while paused; running {job.name} once")
+            job_state.force_run_pending = False
+            job_state.running = True
+            job_state.next_run_epoch = time() + job.interval_seconds
+            running_jobs.add(asyncio.create_task(self._run_job(job, semaphore, forced)))
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+from collections.abc import Iterable
+from configparser import ConfigParser
+from dataclasses import dataclass, replace
+from fnmatch import fnmatchcase
+from pathlib import Path, PurePosixPath
+
+from ansible_shed.jobs import JobConfig
+
+ROLE_DIRS = frozenset({"roles"})
+HOST_VARS_DIRS = frozenset({"host_vars"})
+GROUP_VARS_DIRS = frozenset({"group_vars"})
+VARS_FILE_SUFFIXES = (".yml", ".yaml", ".json")
+
+
+@dataclass(frozen=True)
+class Target:
+    """What a change needs re-applied.
+
+    None means "everything" (no --tags / no --limit). An empty set means
+    "nothing", so an ignored path adds nothing when targets are merged.
+    """
+
+    tags: frozenset[str] | None = None
+    limits: frozenset[str] | None = None
+
+    @property
+    def is_full(self) -> bool:
+        return self.tags is None and self.limits is None
+
+    @property
+    def is_empty(self) -> bool:
+        return self.tags == frozenset() or self.limits == frozenset()
+
+
+NOTHING = Target(tags=frozenset(), limits=frozenset())
+
+
+@dataclass(frozen=True)
+class TargetRule:
+    """One [<glob>] section of the target map file"""
+
+    pattern: str
+    target: Target
+
+
+def _split_csv(value: str | None) -> frozenset[str] | None:
+    if not value:
+        return None
+    return frozenset(v.strip() for v in value.split(",") if v.strip()) or None
+
+
+def load_target_rules(map_file: Path) -> list[TargetRule]:
+    """Parse a target map file. Sections are globs matched against repo
+    relative paths in file order; each sets tags and/or limit (comma
+    separated) or ignore=true.
+    """
+    cp = ConfigParser()
+    with map_file.open("r") as f:
+        cp.read_file(f)
+    rules = []
+    for pattern in cp.sections():
+        section = cp[pattern]
+        if section.getboolean("ignore", fallback=False):
+            rules.append(TargetRule(pattern, NOTHING))
+            continue
+        rules.append(
+            TargetRule(
+                pattern,
+                Target(
+                    tags=_split_csv(section.get("tags")),
+                    limits=_split_csv(section.get("limit")),
+                ),
+            )
+        )
+    return rules
+
+
+def _vars_name(name: str) -> str:
+    for suffix in VARS_FILE_SUFFIXES:
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+def convention_target(path: str) -> Target | None:
+    """Map a path by the standard ansible repo layout.
+
+    roles/<role>/... -> --tags <role>, host_vars/<host>... -> --limit <host>
+    and group_vars/<group>... -> --limit <group>. Returns None for anything
+    else (playbooks, inventory, group_vars/all ...) which needs a full run.
+    """
+    parts = PurePosixPath(path).parts
+    # The innermost convention directory wins, e.g. playbooks/roles/<role>
+    for idx in range(len(parts) - 2, -1, -1):
+        part, name = parts[idx], parts[idx + 1]
+        if part in ROLE_DIRS and idx + 2 < len(parts):
+            return Target(tags=frozenset({name}))
+        if part in HOST_VARS_DIRS:
+            return Target(limits=frozenset({_vars_name(name)}))
+        if part in GROUP_VARS_DIRS:
+            group = _vars_name(name)
+            return None if group == "all" else Target(limits=frozenset({group}))
+    return None
+
+
+def target_for_path(path: str, rules: Iterable[TargetRule]) -> Target | None:
+    for rule in rules:
+        if fnmatchcase(path, rule.pattern):
+            return rule.target
+    return convention_target(path)
+
+
+def _merge(a: frozenset[str] | None, b: frozenset[str] | None) -> frozenset[str] | None:
+    if a is None or b is None:
+        return None
+    return a | b
+
+
+def resolve_target(
+    changed_paths: Iterable[str], rules: Iterable[TargetRule]
+) -> tuple[Target, list[str]]:
+    """Merge the targets for every changed path.
+
+    The result covers every change: a path needing all tags (or all hosts)
+    widens the whole run to all tags (or hosts). Also returns the paths that
+    couldn't be mapped; any of those means a full run.
+    """
+    rules = list(rules)
+    merged = NOTHING
+    unmapped = []
+    for path in changed_paths:
+        target = target_for_path(path, rules)
+        if target is None:
+            unmapped.append(path)
+            continue
+        merged = Target(
+            tags=_merge(merged.tags, target.tags),
+            limits=_merge(merged.limits, target.limits),
+        )
+    return merged, unmapped
+
+
+def narrow_job(job: JobConfig, target: Target) -> JobConfig | None:
+    """Restrict job to target, or None if the job has nothing left to run.
+
+    Target tags intersect the job's own ansible_tags. A job with its own
+    ansible_limit keeps it: arbitrary limit patterns can't be intersected
+    safely, so the run stays a (correct) superset.
+    """
+    if target.is_empty:
+        return None
+    tags = job.tags
+    if target.tags is not None:
+        wanted = target.tags
+        if job.tags:
+            wanted &= frozenset(t.strip() for t in job.tags.split(","))
+        if not wanted:
+            return None
+        tags = ",".join(sorted(wanted))
+    limit = job.limit
+    if target.limits is not None and not job.limit:
+        limit = ",".join(sorted(target.limits))
+    return replace(job, tags=tags, limit=limit)
@@ -1,18 +1,30 @@
 #!/usr/bin/env python3
 
+import asyncio
+import signal
 import unittest
 from pathlib import Path
 from tempfile import TemporaryDirectory
 from unittest.mock import Mock, patch
 
-from ansible_shed.shed import Shed
+from aioprometheus.collectors import Gauge, Histogram, Registry
+from aioprometheus.renderer import render
+
+from ansible_shed.constants import SHED_CONFIG_SECTION
+from ansible_shed.host_stats import HostStats
+from ansible_shed.jobs import DEFAULT_JOB_NAME
+from ansible_shed.label_tracker import LabelTracker
+from ansible_shed.output_parser import AnsibleOutputParser
+from ansible_shed.shed import RUN_DURATION_BUCKETS, Shed
 from ansible_shed.tests.ansible_output_fixtures import (
     ANSIBLE_FAIL_OUTPUT,
     ANSIBLE_PROFILE_OUTPUT,
     ANSIBLE_SUCCESS_OUTPUT,
+    EXPECTED_FAIL_HOST_STATS,
     EXPECTED_FAIL_STATS,
     EXPECTED_PROFILE_ROLES,
     EXPECTED_PROFILE_TASKS,
+    EXPECTED_SUCCESS_HOST_STATS,
     EXPECTED_SUCCESS_STATS,
     MALFORMED_RECAP,
     NO_ROLE_PREFIX_RECAP,
@@ -34,10 +46,13 @@ class AnsibleOutputTests(unittest.TestCase):
     def test_parsing_ansible_output(self, mock_time: Mock) -> None:
         mock_time.return_value = 69
         self.shed.parse_ansible_stats(ANSIBLE_SUCCESS_OUTPUT, 0)
+        host_stats = self.shed.job_states[DEFAULT_JOB_NAME].host_stats
         self.assertEqual(self.shed.prom_stats, EXPECTED_SUCCESS_STATS)
-        # Run fail stats to ensure clearing works
+        self.assertEqual(dict(host_stats.items()), EXPECTED_SUCCESS_HOST_STATS)
+        # Run fail stats to ensure replacing works
         self.shed.parse_ansible_stats(ANSIBLE_FAIL_OUTPUT, 1)
         self.assertEqual(self.shed.prom_stats, EXPECTED_FAIL_STATS)
+        self.assertEqual(dict(host_stats.items()), EXPECTED_FAIL_HOST_STATS)
 
 
 class AnsibleProfileTests(unittest.TestCase):
@@ -138,8 +153,10 @@ class AnsibleProfileTests(unittest.TestCase):
         self.shed.parse_ansible_stats(ANSIBLE_PROFILE_OUTPUT, 0)
 
         # Per-host stats are populated.
-        self.assertEqual(self.shed.prom_stats["host_host1.example.com_ok"], 10)
-        self.assertEqual(self.shed.prom_stats["host_host1.example.com_changed"], 2)
+        self.assertEqual(
+            self.shed.job_states[DEFAULT_JOB_NAME].host_stats.get("host1.example.com"),
+            HostStats(ok=10, changed=2, skipped=3),
+        )
         # Profile fields populated in the same pass.
         self.assertEqual(self.shed.prom_stats["ansible_profile_tasks_detected"], 1)
         self.assertEqual(self.shed.prom_stats["ansible_task_count_total"], 7)
@@ -149,52 +166,321 @@ class AnsibleProfileTests(unittest.TestCase):
         # ansible_shed.ini does not set profile_tasks_top_n; default is 20.
         self.assertEqual(self.shed.profile_tasks_top_n, 20)
 
+    def test_duration_histograms(self) -> None:
+        registry = Registry()
+        run_histogram = Histogram("run", "test", registry=registry, buckets=[60])
+        task_histogram = Histogram("task", "test", registry=registry, buckets=[10])
+        job_state = self.shed.job_states[DEFAULT_JOB_NAME]
+        job_state.run_duration_samples.extend(
+            [("full", 30), ("full", 90), ("check", 5)]
+        )
+        self.shed.parse_ansible_profile(ANSIBLE_PROFILE_OUTPUT)
+        self.shed.parse_ansible_profile(ANSIBLE_PROFILE_OUTPUT)
 
-class RunAnsibleStderrTests(unittest.TestCase):
-    """Ansible emits [WARNING]/[DEPRECATION WARNING] lines on stderr, so
-    _run_ansible must fold stderr into the returned output for the parser to
-    count them."""
+        self.shed._observe_duration_samples(run_histogram, task_histogram)
+        self.assertEqual(job_state.run_duration_samples, [])
+        self.assertEqual(job_state.task_duration_samples, [])
+        content = render(registry, [])[0].decode()
+        self.assertIn(
+            'run_bucket{le="60.0",mode="full",shed_job="default"} 1.0', content
+        )
+        self.assertIn('run_count{mode="full",shed_job="default"} 2.0', content)
+        # --check probes don't skew the full run quantiles
+        self.assertIn('run_count{mode="check",shed_job="default"} 1.0', content)
+        # Both runs' samples are kept, summed per role
+        self.assertIn(
+            'task_sum{role="networkd",shed_job="default"} '
+            f"{2 * EXPECTED_PROFILE_ROLES['networkd']}",
+            content,
+        )
+
+    @patch("pathlib.Path.mkdir")
+    def test_duration_buckets_config(self, mock_mkdir: Mock) -> None:
+        self.assertEqual(self.shed.run_duration_buckets, RUN_DURATION_BUCKETS)
+        self.shed.config[SHED_CONFIG_SECTION]["task_duration_buckets"] = "0.5, 2,8"
+        self.shed.reload_config_vars()
+        self.assertEqual(self.shed.task_duration_buckets, (0.5, 2, 8))
+        for bad in ("2,1", "fast", "0,1", ""):
+            self.shed.config[SHED_CONFIG_SECTION]["run_duration_buckets"] = bad
+            with self.assertLogs("ansible_shed.shed", "WARNING"):
+                self.shed.reload_config_vars()
+            self.assertEqual(self.shed.run_duration_buckets, RUN_DURATION_BUCKETS)
+
+    @patch("pathlib.Path.mkdir")
+    def test_config_warnings_logged_once(self, mock_mkdir: Mock) -> None:
+        self.shed.config[SHED_CONFIG_SECTION]["run_duration_buckets"] = "fast"
+        self.shed.config[SHED_CONFIG_SECTION]["shard_mode"] = "bogus"
+        with self.assertLogs("ansible_shed.shed", "WARNING") as logs:
+            self.shed.reload_config_vars()
+        self.assertEqual(len(logs.output), 2)
+        # Scheduler wakeups reload an unchanged config: stay quiet
+        with self.assertNoLogs("ansible_shed.shed", "WARNING"):
+            self.shed.reload_config_vars()
+            self.shed.reload_config_vars()
+        # A changed config warns again, and a fixed then re-broken one too
+        self.shed.config[SHED_CONFIG_SECTION]["shard_mode"] = "none"
+        self.shed.reload_config_vars()
+        self.shed.config[SHED_CONFIG_SECTION]["shard_mode"] = "bogus"
+        with self.assertLogs("ansible_shed.shed", "WARNING") as logs:
+            self.shed.reload_config_vars()
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("shard_mode", logs.output[0])
+
+
+class StreamingParserTests(unittest.TestCase):
+    """Feeding output a line at a time must produce the same stats as
+    parsing the whole run output at once."""
 
     @patch("pathlib.Path.mkdir")
     def setUp(self, mock_mkdir: Mock) -> None:
         self.shed = Shed(SHED_CONFIG_PATH)
         return super().setUp()
 
-    @patch("ansible_shed.shed.Popen")
-    def test_run_ansible_captures_stderr_warnings(self, mock_popen: Mock) -> None:
-        stdout_lines = [
-            "TASK [Gathering Facts] ****\n",
-            "ok: [host1.example.com]\n",
-        ]
-        stderr_text = (
-            "[WARNING]: kubernetes is not supported.\n"
-            "[DEPRECATION WARNING]: apt_repository has been deprecated.\n"
+    def _stream(self, output: str, top_n: int = 20) -> AnsibleOutputParser:
+        parser = AnsibleOutputParser(top_n)
+        for line in output.splitlines(keepends=True):
+            parser.feed(line)
+        return parser
+
+    @patch("ansible_shed.shed.time")
+    def test_streamed_stats_match_full_output(self, mock_time: Mock) -> None:
+        mock_time.return_value = 69
+        for output in (ANSIBLE_SUCCESS_OUTPUT, ANSIBLE_FAIL_OUTPUT):
+            self.shed.parse_ansible_stats(output, 0)
+            expected_stats = dict(self.shed.prom_stats)
+            self.shed.parse_ansible_stats(self._stream(output), 0)
+            self.assertEqual(self.shed.prom_stats, expected_stats)
+
+    def test_streamed_profile_matches_full_output(self) -> None:
+        self.shed.parse_ansible_profile(self._stream(ANSIBLE_PROFILE_OUTPUT))
+        self.assertEqual(self.shed.profile_task_runtimes, EXPECTED_PROFILE_TASKS)
+        self.assertEqual(self.shed.prom_stats["ansible_task_count_total"], 7)
+
+    def test_top_n_keeps_earliest_row_on_ties(self) -> None:
+        parser = self._stream(
+            "TASKS RECAP ****\n"
+            "a : first ------ 5.00s\n"
+            "b : second ----- 5.00s\n"
+            "c : third ------ 9.00s\n",
+            top_n=2,
         )
+        self.assertEqual(
+            parser.top_task_runtimes(),
+            [("c", "third", 9.0), ("a", "first", 5.0)],
+        )
+        self.assertEqual(parser.recap_row_count, 3)
+
+    def test_long_word_line_is_linear(self) -> None:
+        # Unanchored, the recap regex took minutes on this
+        parser = self._stream("x" * 1000000 + "\nweb_1 : ok=2 changed=1\n")
+        self.assertEqual(parser.host_stats, {"web_1": {"ok": 2, "changed": 1}})
+
+    def test_live_progress(self) -> None:
+        parser = self._stream(
+            "PLAY [Common Playbooks] ****\n"
+            "TASK [chrony : Install chrony] ****\n"
+            "fatal: [host1.example.com]: FAILED! => {}\n"
+            "fatal: [host2.example.com]: UNREACHABLE! => {}\n"
+            "failed: [host1.example.com] (item=ntp) => {}\n"
+            "fatal: [host3.example.com -> localhost]: FAILED! => {}\n"
+        )
+        self.assertEqual(parser.current_play, "Common Playbooks")
+        self.assertEqual(parser.current_task, "chrony : Install chrony")
+        self.assertEqual(
+            parser.live_host_failures,
+            {
+                "host1.example.com": {"failed": 2},
+                "host2.example.com": {"unreachable": 1},
+                "host3.example.com": {"failed": 1},
+            },
+        )
+
+
+class RunAnsibleStderrTests(unittest.TestCase):
+    """Ansible emits [WARNING]/[DEPRECATION WARNING] lines on stderr, so
+    _run_ansible must drain stderr alongside stdout and feed both to the
+    parser."""
+
+    def setUp(self) -> None:
+        self.test_dir = TemporaryDirectory()
+        self.test_path = Path(self.test_dir.name)
+        self.fake_ansible = self.test_path / "ansible-playbook"
+        self.config_file = self.test_path / "test_config.ini"
+        self.config_file.write_text(f"""[ansible_shed]
+interval=60
+port=12345
+log_dir={self.test_path / "logs"}
+repo_path={self.test_path}
+repo_url=git@github.com:test/test.git
+repo_key={self.test_path / "key"}
+ansible_playbook_binary={self.fake_ansible}
+ansible_hosts_inventory=hosts
+ansible_playbook_init=site.yaml
+""")
+        self.shed = Shed(self.config_file)
+        return super().setUp()
 
-        proc = Mock()
-        proc.stdout = iter(stdout_lines)
-        proc.stderr = Mock()
-        proc.stderr.read.return_value = stderr_text
-        proc.returncode = 0
-        mock_popen.return_value.__enter__ = Mock(return_value=proc)
-        mock_popen.return_value.__exit__ = Mock(return_value=False)
-
-        with TemporaryDirectory() as tmp:
-            log_path = Path(tmp) / "run.log"
-            with (
-                patch.object(self.shed, "_create_logfile", return_value=log_path),
-                patch.object(self.shed, "_update_latest_log_symlink"),
-            ):
-                _, ansible_output = self.shed._run_ansible()
-            log_contents = log_path.read_text()
-
-        # stderr content is folded into the parsed output...
-        self.assertIn("[DEPRECATION WARNING]", ansible_output)
-        self.assertIn("[WARNING]", ansible_output)
+    def tearDown(self) -> None:
+        self.test_dir.cleanup()
+
+    def _write_fake_ansible(self, script: str) -> None:
+        self.fake_ansible.write_text(f"#!/bin/sh\n{script}")
+        self.fake_ansible.chmod(0o755)
+
+    def test_run_ansible_captures_stderr_warnings(self) -> None:
+        self._write_fake_ansible(
+            "echo 'TASK [Gathering Facts] ****'\n"
+            "echo 'ok: [host1.example.com]'\n"
+            "echo '[WARNING]: kubernetes is not supported.' >&2\n"
+            "echo '[DEPRECATION WARNING]: apt_repository has been deprecated.' >&2\n"
+        )
+        returncode, parser = asyncio.run(self.shed._run_ansible())
+        log_contents = (self.test_path / "logs" / "latest.log").read_text()
+
+        self.assertEqual(returncode, 0)
+        # stderr content is fed to the streaming parser...
+        self.assertEqual(parser.task_count, 1)
+        self.assertEqual(parser.warnings_count, 1)
+        self.assertEqual(parser.deprecation_count, 1)
         # ...and is still written to the run log file.
         self.assertIn("[DEPRECATION WARNING]", log_contents)
+        self.assertIn("TASK [Gathering Facts]", log_contents)
 
         # The parser counts those stderr-sourced lines.
-        self.shed.parse_ansible_stats(ansible_output, 0)
+        self.shed.parse_ansible_stats(parser, 0)
         self.assertEqual(self.shed.prom_stats["ansible_warnings_count"], 1)
         self.assertEqual(self.shed.prom_stats["ansible_deprecation_warnings_count"], 1)
+
+    def test_run_ansible_noisy_stderr_does_not_deadlock(self) -> None:
+        # Far more than a pipe buffer of stderr before stdout is written
+        self._write_fake_ansible(
+            "i=0\n"
+            "while [ $i -lt 4000 ]; do\n"
+            "  echo '[WARNING]: noisy warning line padded out to fill the pipe' >&2\n"
+            "  i=$((i + 1))\n"
+            "done\n"
+            "echo 'TASK [done] ****'\n"
+            "exit 2\n"
+        )
+        returncode, parser = asyncio.run(
+            asyncio.wait_for(self.shed._run_ansible(), timeout=30)
+        )
+        self.assertEqual(returncode, 2)
+        self.assertEqual(parser.warnings_count, 4000)
+        self.assertEqual(parser.task_count, 1)
+
+    def test_run_ansible_long_line(self) -> None:
+        # One line over many read chunks, then a normal one
+        self._write_fake_ansible(
+            "head -c 1000000 /dev/zero | tr '\\0' '#'\n"
+            "echo\n"
+            "echo 'TASK [done] ****'\n"
+        )
+        returncode, parser = asyncio.run(self.shed._run_ansible())
+        self.assertEqual(returncode, 0)
+        self.assertEqual(parser.task_count, 1)
+        log_lines = (self.test_path / "logs" / "latest.log").read_text().splitlines()
+        self.assertEqual(log_lines, ["#" * 1000000, "TASK [done] ****"])
+
+    def test_run_ansible_timeout_terminates(self) -> None:
+        self._write_fake_ansible("echo 'TASK [sleep] ****'\nexec sleep 60\n")
+        self.shed.run_timeout_seconds = 1
+        returncode, parser = asyncio.run(self.shed._run_ansible())
+        self.assertEqual(returncode, -signal.SIGTERM)
+        self.assertEqual(parser.task_count, 1)
+
+    def test_run_ansible_cancel_terminates(self) -> None:
+        self._write_fake_ansible("exec sleep 60\n")
+
+        async def run_and_cancel() -> None:
+            task = asyncio.create_task(self.shed._run_ansible())
+            await asyncio.sleep(0.5)
+            task.cancel()
+            await task
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(run_and_cancel())
+
+
+class LiveRunStatsTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = TemporaryDirectory()
+        self.test_path = Path(self.test_dir.name)
+        fake_ansible = self.test_path / "ansible-playbook"
+        fake_ansible.write_text(
+            "#!/bin/sh\n"
+            "echo 'PLAY [Common Playbooks] ****'\n"
+            "echo 'TASK [chrony : Install chrony] ****'\n"
+            "echo 'fatal: [host1.example.com]: FAILED! => {}'\n"
+            "exec sleep 1\n"
+        )
+        fake_ansible.chmod(0o755)
+        self.config_file = self.test_path / "test_config.ini"
+        self.config_file.write_text(f"""[ansible_shed]
+interval=60
+port=12345
+repo_path={self.test_path}
+repo_url=git@github.com:test/test.git
+repo_key={self.test_path / "key"}
+ansible_playbook_binary={fake_ansible}
+ansible_hosts_inventory=hosts
+ansible_playbook_init=site.yaml
+""")
+        self.shed = Shed(self.config_file)
+        registry = Registry()
+        self.gauges = {
+            name: Gauge(name, name, registry=registry)
+            for name in (
+                "in_progress",
+                "elapsed",
+                "tasks",
+                "current_task",
+                "failed",
+                "unreachable",
+            )
+        }
+
+    def tearDown(self) -> None:
+        self.test_dir.cleanup()
+
+    def test_live_gauges_during_and_after_run(self) -> None:
+        job_labels = {"shed_job": "default"}
+        host_labels = {"hostname": "host1.example.com", "shed_job": "default"}
+        task_labels = {
+            "shed_job": "default",
+            "play": "Common Playbooks",
+            "task": "chrony : Install chrony",
+        }
+
+        tracker = LabelTracker()
+
+        async def run_and_sample() -> None:
+            run = asyncio.create_task(self.shed._run_ansible())
+            await asyncio.sleep(0.5)
+            self.shed._refresh_live_gauges(self.gauges, tracker)
+            self.assertEqual(self.gauges["in_progress"].get(job_labels), 1)
+            self.assertEqual(self.gauges["tasks"].get(job_labels), 1)
+            self.assertEqual(self.gauges["current_task"].get(task_labels), 1)
+            self.assertEqual(self.gauges["failed"].get(host_labels), 1)
+            await run
+
+        asyncio.run(run_and_sample())
+        self.shed._refresh_live_gauges(self.gauges, tracker)
+        self.assertEqual(self.gauges["in_progress"].get(job_labels), 0)
+        self.assertEqual(self.gauges["tasks"].get(job_labels), 0)
+        self.assertNotIn(task_labels, self.gauges["current_task"].values)
+        self.assertNotIn(host_labels, self.gauges["failed"].values)
+
+    def test_live_tasks_seen_across_shards(self) -> None:
+        shards = [AnsibleOutputParser(), AnsibleOutputParser()]
+        for shard, tasks in zip(shards, (3, 2), strict=True):
+            for task in range(tasks):
+                shard.feed(f"TASK [role : task {task}] ****\n")
+        job_state = self.shed.job_states[DEFAULT_JOB_NAME]
+        job_state.live_parsers = shards
+        self.shed._refresh_live_gauges(self.gauges, LabelTracker())
+        final = AnsibleOutputParser()
+        for shard in shards:
+            final.merge(shard)
+        self.assertEqual(final.task_count, 3)
+        self.assertEqual(self.gauges["tasks"].get({"shed_job": "default"}), 3)
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+from ansible_shed.host_stats import HostStats
 
 ANSIBLE_FAIL_OUTPUT = """\
 PLAY RECAP *********************************************************************
@@ -23,45 +24,24 @@ _PROFILE_ZERO_STATS = {
     "ansible_profile_tasks_detected": 0,
 }
 
-# ansible keys are only first because we run after SUCCESS parsing ...
 EXPECTED_FAIL_STATS = {
     "ansible_last_run_returncode": 1,
     "ansible_stats_last_updated": 69,
-    "host_unittest1.cooperlees.com_ok": 0,
-    "host_unittest1.cooperlees.com_changed": 0,
-    "host_unittest1.cooperlees.com_unreachable": 0,
-    "host_unittest1.cooperlees.com_failed": 1,
-    "host_unittest1.cooperlees.com_skipped": 1,
-    "host_unittest1.cooperlees.com_rescued": 0,
-    "host_unittest1.cooperlees.com_ignored": 0,
-    "host_unittest2.cooperlees.com_ok": 7,
-    "host_unittest2.cooperlees.com_changed": 0,
-    "host_unittest2.cooperlees.com_unreachable": 0,
-    "host_unittest2.cooperlees.com_failed": 0,
-    "host_unittest2.cooperlees.com_skipped": 1,
-    "host_unittest2.cooperlees.com_rescued": 0,
-    "host_unittest2.cooperlees.com_ignored": 0,
     **_PROFILE_ZERO_STATS,
 }
+EXPECTED_FAIL_HOST_STATS = {
+    "unittest1.cooperlees.com": HostStats(failed=1, skipped=1),
+    "unittest2.cooperlees.com": HostStats(ok=7, skipped=1),
+}
 EXPECTED_SUCCESS_STATS = {
-    "host_unittest1.cooperlees.com_ok": 7,
-    "host_unittest1.cooperlees.com_changed": 0,
-    "host_unittest1.cooperlees.com_unreachable": 0,
-    "host_unittest1.cooperlees.com_failed": 0,
-    "host_unittest1.cooperlees.com_skipped": 1,
-    "host_unittest1.cooperlees.com_rescued": 0,
-    "host_unittest1.cooperlees.com_ignored": 0,
-    "host_unittest2.cooperlees.com_ok": 7,
-    "host_unittest2.cooperlees.com_changed": 0,
-    "host_unittest2.cooperlees.com_unreachable": 0,
-    "host_unittest2.cooperlees.com_failed": 0,
-    "host_unittest2.cooperlees.com_skipped": 1,
-    "host_unittest2.cooperlees.com_rescued": 0,
-    "host_unittest2.cooperlees.com_ignored": 0,
     "ansible_last_run_returncode": 0,
     "ansible_stats_last_updated": 69,
     **_PROFILE_ZERO_STATS,
 }
+EXPECTED_SUCCESS_HOST_STATS = {
+    "unittest1.cooperlees.com": HostStats(ok=7, skipped=1),
+    "unittest2.cooperlees.com": HostStats(ok=7, skipped=1),
+}
 
 
 # Realistic ansible-playbook output with profile_tasks + timer callbacks
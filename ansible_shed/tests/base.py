@@ -8,15 +8,51 @@ from ansible_shed.main import main
 from ansible_shed.tests.ansible_output import (  # noqa: F401
     AnsibleOutputTests,
     AnsibleProfileTests,
+    LiveRunStatsTests,
+    RunAnsibleStderrTests,
+    StreamingParserTests,
 )
 from ansible_shed.tests.api import APITests  # noqa: F401
+from ansible_shed.tests.callback_events import (  # noqa: F401
+    CallbackPluginTests,
+    StructuredRunTests,
+)
+from ansible_shed.tests.cardinality import CardinalityTests  # noqa: F401
 from ansible_shed.tests.client_cli import ClientConfigAndCLITests  # noqa: F401
 from ansible_shed.tests.client_http import ClientHttpTests  # noqa: F401
+from ansible_shed.tests.fact_cache import FactCacheTests  # noqa: F401
+from ansible_shed.tests.git_backend import AsyncGitTests  # noqa: F401
+from ansible_shed.tests.host_stats import HostStatsTests  # noqa: F401
+from ansible_shed.tests.jobs import (  # noqa: F401
+    JobConfigTests,
+    JobSchedulerTests,
+    UnchangedModeTests,
+)
+from ansible_shed.tests.label_tracker import LabelTrackerTests  # noqa: F401
+from ansible_shed.tests.live_log import (  # noqa: F401
+    LiveRunLogAPITests,
+    LiveRunLogTests,
+)
+from ansible_shed.tests.metrics_cache import MetricsCacheTests  # noqa: F401
+from ansible_shed.tests.performance import PerformanceProfileTests  # noqa: F401
 from ansible_shed.tests.rebase_or_clone_repo import (  # noqa: F401
     RealRepoIntegrationTests,
     RebaseOrCloneRepoTests,
 )
+from ansible_shed.tests.run_history import (  # noqa: F401
+    RunHistoryTests,
+    ShedRunHistoryTests,
+)
+from ansible_shed.tests.run_logs import (  # noqa: F401
+    RunLogDownloadTests,
+    RunLogStoreTests,
+    ShedRunLogTests,
+)
+from ansible_shed.tests.self_metrics import SelfMetricsTests  # noqa: F401
+from ansible_shed.tests.sharding import ShardedRunTests, ShardingTests  # noqa: F401
+from ansible_shed.tests.targeting import TargetedRunTests, TargetingTests  # noqa: F401
 from ansible_shed.tests.version_check_state import VersionCheckStateTests  # noqa: F401
+from ansible_shed.tests.webhook import GitWebhookTests  # noqa: F401
 
 
 class TestCLI(unittest.TestCase):
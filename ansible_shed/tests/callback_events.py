@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+import asyncio
+import importlib
+import os
+import sys
+import tempfile
+import types
+import unittest
+from json import loads
+from pathlib import Path
+from typing import Any
+from unittest.mock import Mock, patch
+
+from ansible_shed.constants import EVENTS_FD_ENV
+from ansible_shed.jobs import DEFAULT_JOB_NAME
+from ansible_shed.output_parser import AnsibleOutputParser
+from ansible_shed.shed import Shed
+
+EVENTS: list[dict[str, Any]] = [
+    {"event": "play_start", "play": "Common Playbooks"},
+    {"event": "task_start", "role": "chrony", "task": "Install chrony"},
+    {"event": "host_result", "host": "host1", "status": "changed", "duration": 1.5},
+    {"event": "host_result", "host": "host2", "status": "failed", "duration": 2.0},
+    {"event": "task_end", "role": "chrony", "task": "Install chrony", "duration": 2.1},
+    {"event": "task_start", "role": "", "task": "Gathering Facts"},
+    {"event": "task_end", "role": "", "task": "Gathering Facts", "duration": 9.0},
+    {
+        "event": "stats",
+        "hosts": {
+            "host1": {"ok": 2, "changed": 1, "failed": 0, "unreachable": 0},
+            "host2": {"ok": 1, "changed": 0, "failed": 1, "unreachable": 0},
+        },
+    },
+]
+
+# Plays the part of ansible-playbook + the callback plugin
+FAKE_ANSIBLE_PLAYBOOK = """\
+#!{python}
+import json, os, sys
+events = os.fdopen(int(os.environ["{env}"]), "w")
+print("TASK [this text is ignored] ****")
+print("host1 : ok=99 changed=99 unreachable=0 failed=0")
+print("[WARNING]: still counted from stderr", file=sys.stderr)
+for event in {events!r}:
+    events.write(json.dumps(event) + "\\n")
+events.write("not json\\n")
+"""
+
+
+class _FakeCallbackBase:
+    def __init__(self) -> None:
+        pass
+
+
+class CallbackPluginTests(unittest.TestCase):
+    """Drive the bundled plugin with stand-ins for ansible's objects"""
+
+    def setUp(self) -> None:
+        callback_module = types.ModuleType("ansible.plugins.callback")
+        callback_module.CallbackBase = _FakeCallbackBase  # type: ignore[attr-defined]
+        self.modules = patch.dict(
+            sys.modules,
+            {
+                "ansible": types.ModuleType("ansible"),
+                "ansible.plugins": types.ModuleType("ansible.plugins"),
+                "ansible.plugins.callback": callback_module,
+            },
+        )
+        self.modules.start()
+        self.plugin = importlib.import_module(
+            "ansible_shed.callback_plugins.ansible_shed_events"
+        )
+        self.read_fd, write_fd = os.pipe()
+        self.env = patch.dict(os.environ, {EVENTS_FD_ENV: str(write_fd)})
+        self.env.start()
+
+    def tearDown(self) -> None:
+        self.env.stop()
+        self.modules.stop()
+        sys.modules.pop("ansible_shed.callback_plugins.ansible_shed_events", None)
+        os.close(self.read_fd)
+
+    def _result(self, host: str, **result: Any) -> Mock:
+        return Mock(_host=Mock(get_name=Mock(return_value=host)), _result=result)
+
+    def test_events(self) -> None:
+        callback = self.plugin.CallbackModule()
+        task = Mock(get_name=Mock(return_value="Install chrony"))
+        task._role.get_name.return_value = "chrony"
+        stats = Mock(processed={"host1": 1})
+        stats.summarize.return_value = {"ok": 2, "changed": 1, "failures": 0}
+
+        callback.v2_playbook_on_play_start(Mock(get_name=Mock(return_value="all ")))
+        callback.v2_playbook_on_task_start(task, False)
+        callback.v2_runner_on_ok(self._result("host1", changed=True))
+        callback.v2_runner_on_failed(self._result("host2"), ignore_errors=True)
+        callback.v2_runner_on_unreachable(self._result("host3"))
+        callback.v2_playbook_on_stats(stats)
+
+        with os.fdopen(self.read_fd, "r", closefd=False) as f:
+            events = [loads(line) for line in f]
+        self.assertEqual(
+            [(e["event"], e.get("status")) for e in events],
+            [
+                ("play_start", None),
+                ("task_start", None),
+                ("host_result", "changed"),
+                ("host_result", "ignored"),
+                ("host_result", "unreachable"),
+                ("task_end", None),
+                ("stats", None),
+            ],
+        )
+        self.assertEqual(events[0]["play"], "all")
+        self.assertEqual(events[5]["role"], "chrony")
+        self.assertEqual(
+            events[6]["hosts"], {"host1": {"ok": 2, "changed": 1, "failed": 0}}
+        )
+
+
+class StructuredRunTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.test_path = Path(self.test_dir.name)
+        fake_ansible = self.test_path / "ansible-playbook"
+        fake_ansible.write_text(
+            FAKE_ANSIBLE_PLAYBOOK.format(
+                python=sys.executable, env=EVENTS_FD_ENV, events=EVENTS
+            )
+        )
+        fake_ansible.chmod(0o755)
+        self.config_file = self.test_path / "test_config.ini"
+        self.config_file.write_text(f"""[ansible_shed]
+interval=60
+port=12345
+repo_path={self.test_path}
+repo_url=git@github.com:test/test.git
+repo_key={self.test_path / "key"}
+ansible_playbook_binary={fake_ansible}
+ansible_hosts_inventory=hosts
+ansible_playbook_init=site.yaml
+ansible_events=true
+""")
+
+    def tearDown(self) -> None:
+        self.test_dir.cleanup()
+
+    def test_feed_event(self) -> None:
+        parser = AnsibleOutputParser(structured=True)
+        for event in EVENTS:
+            parser.feed_event(event)
+        self.assertEqual(parser.task_count, 2)
+        self.assertEqual(parser.current_play, "Common Playbooks")
+        self.assertEqual(parser.current_task, "Gathering Facts")
+        self.assertEqual(parser.live_host_failures, {"host2": {"failed": 1}})
+        self.assertEqual(
+            parser.top_task_runtimes(),
+            [("", "Gathering Facts", 9.0), ("chrony", "Install chrony", 2.1)],
+        )
+        self.assertEqual(parser.host_stats["host2"]["failed"], 1)
+        with self.assertRaises(KeyError):
+            parser.feed_event({"event": "task_start"})
+
+    def test_run_consumes_events_not_text(self) -> None:
+        shed = Shed(self.config_file)
+        self.assertIn(
+            str(Path(__file__).parent.parent / "callback_plugins"),
+            shed._ansible_events_env(99)["ANSIBLE_CALLBACK_PLUGINS"],
+        )
+
+        returncode, parser = asyncio.run(shed._run_ansible())
+
+        self.assertEqual(returncode, 0)
+        self.assertEqual(parser.event_count, len(EVENTS))
+        self.assertEqual(parser.task_count, 2)
+        self.assertEqual(parser.host_stats["host1"]["changed"], 1)
+        self.assertEqual(parser.warnings_count, 1)
+        shed.parse_ansible_stats(parser, returncode)
+        host_stats = shed.job_states[DEFAULT_JOB_NAME].host_stats.get("host2")
+        assert host_stats is not None
+        self.assertEqual(host_stats.failed, 1)
+        self.assertEqual(shed.prom_stats["ansible_profile_tasks_detected"], 1)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from aioprometheus.collectors import Gauge, Registry
+
+from ansible_shed.cardinality import compile_normalizers, normalize, SeriesBudget
+from ansible_shed.label_tracker import LabelTracker
+from ansible_shed.shed import Shed
+
+
+class CardinalityTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.registry = Registry()
+        self.tracker = LabelTracker()
+
+    def _series(self, gauge: Gauge) -> dict[tuple[tuple[str, str], ...], float]:
+        return {
+            tuple(sorted(labels.items())): float(value)  # type: ignore[arg-type]
+            for labels, value in gauge.get_all()
+        }
+
+    def test_budget_rolls_up_past_limit(self) -> None:
+        gauge = Gauge("test_tasks", "test", registry=self.registry)
+        budget = SeriesBudget("test_tasks", limit=2)
+        other = {"task": "other"}
+        for task, seconds in (("a", 5.0), ("b", 4.0), ("a", 1.0), ("c", 2), ("d", 1)):
+            budget.add({"task": task}, seconds, other)
+        self.assertEqual(budget.export(self.tracker, gauge), 2)
+        self.tracker.prune()
+        self.assertEqual(
+            self._series(gauge),
+            {(("task", "a"),): 6, (("task", "b"),): 4, (("task", "other"),): 3},
+        )
+
+        # Reset by export; under the limit nothing is dropped and other goes
+        budget.add({"task": "a"}, 1, other)
+        self.assertEqual(budget.export(self.tracker, gauge), 0)
+        self.tracker.prune()
+        self.assertEqual(self._series(gauge), {(("task", "a"),): 1})
+
+        unlimited = SeriesBudget("test_tasks")
+        for idx in range(1000):
+            unlimited.add({"task": str(idx)}, 1, other)
+        self.assertEqual(unlimited.export(self.tracker, gauge), 0)
+
+    def test_normalize(self) -> None:
+        patterns = compile_normalizers(
+            "\n  \\(item=.*\\)$\n[unclosed\n\\b\\d+\\.\\d+\\.\\d+\\b\n"
+        )
+        self.assertEqual(len(patterns), 2)
+        self.assertEqual(
+            normalize("common : Create user (item=alice)", patterns),
+            "common : Create user *",
+        )
+        self.assertEqual(normalize("Install tool 1.2.3", patterns), "Install tool *")
+        self.assertEqual(normalize("Install tool", ()), "Install tool")
+
+    def test_shed_limits(self) -> None:
+        with tempfile.TemporaryDirectory() as test_dir:
+            test_path = Path(test_dir)
+            config_file = test_path / "test_config.ini"
+            config_file.write_text(f"""[ansible_shed]
+interval=60
+port=12345
+repo_path={test_path / "repo"}
+repo_url=git@github.com:test/test.git
+repo_key={test_path / "key"}
+ansible_hosts_inventory=hosts
+ansible_playbook_init=site.yaml
+task_runtime_series_limit=1
+version_check_package_series_limit=1
+task_label_normalize = \\(item=.*\\)$
+
+[job:nightly]
+interval=1440
+""")
+            shed = Shed(config_file)
+        shed.profile_task_runtimes.extend(
+            {
+                "role": "users",
+                "task": f"users : Create user (item={user})",
+                "seconds": 2,
+            }
+            for user in ("alice", "bob")
+        )
+        shed.profile_task_runtimes.append(
+            {"role": "common", "task": "common : Install chrony", "seconds": 1.5}
+        )
+        # Faster than anything in default, but within its own job's limit
+        shed.job_states["nightly"].profile_task_runtimes = [
+            {"role": "zfs", "task": "zfs : Scrub", "seconds": 0.5}
+        ]
+        shed.version_check_packages = [
+            {"name": name, "current_version": "1", "latest_version": "2"}
+            for name in ("ansible", "black", "mypy")
+        ]
+        task_gauge = Gauge("tasks", "test", registry=self.registry)
+        role_gauge = Gauge("roles", "test", registry=self.registry)
+        package_gauge = Gauge("packages", "test", registry=self.registry)
+
+        self.assertEqual(
+            shed._refresh_profile_gauges(self.tracker, task_gauge, role_gauge), 1
+        )
+        self.assertEqual(
+            self._series(task_gauge),
+            {
+                (
+                    ("role", "users"),
+                    ("shed_job", "default"),
+                    ("task", "users : Create user *"),
+                ): 4,
+                (("role", "other"), ("shed_job", "default"), ("task", "other")): 1.5,
+                (
+                    ("role", "zfs"),
+                    ("shed_job", "nightly"),
+                    ("task", "zfs : Scrub"),
+                ): 0.5,
+            },
+        )
+        self.assertEqual(
+            shed._refresh_version_check_packages(self.tracker, package_gauge), 2
+        )
+        self.assertEqual(
+            self._series(package_gauge),
+            {
+                (
+                    ("current_version", "1"),
+                    ("latest_version", "2"),
+                    ("name", "ansible"),
+                ): 1,
+                (
+                    ("current_version", "other"),
+                    ("latest_version", "other"),
+                    ("name", "other"),
+                ): 2,
+            },
+        )
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -92,6 +92,30 @@ class ClientHttpTests(unittest.IsolatedAsyncioTestCase):
         with self.assertRaisesRegex(RuntimeError, "Unexpected non-JSON response"):
             await client.force_run()
 
+    async def test_force_run_single_job(self) -> None:
+        session = _FakeSession(_FakeResponse(200, {"status": "scheduled"}))
+        client = AnsibleShedApiClient(
+            base_url="http://localhost:12345",
+            api_token="test-token",
+            session=cast(Any, session),
+        )
+        await client.force_run(job="networkd")
+        await client.force_run()
+        self.assertEqual(session.calls[0]["json"], {"job": "networkd"})
+        self.assertIsNone(session.calls[1]["json"])
+
+    async def test_invalidate_facts(self) -> None:
+        session = _FakeSession(_FakeResponse(200, {"invalidated": ["web1"]}))
+        client = AnsibleShedApiClient(
+            base_url="http://localhost:12345",
+            api_token="test-token",
+            session=cast(Any, session),
+        )
+        await client.invalidate_facts(host="web1")
+        await client.invalidate_facts()
+        self.assertEqual(session.calls[0]["json"], {"host": "web1"})
+        self.assertIsNone(session.calls[1]["json"])
+
     async def test_request_json_raises_on_http_error(self) -> None:
         session = _FakeSession(_FakeResponse(401, {"error": "unauthorized"}))
         client = AnsibleShedApiClient(
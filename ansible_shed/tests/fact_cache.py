@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from time import time
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from ansible_shed.fact_cache import FactCache
+from ansible_shed.shed import Shed
+
+API_HEADERS = {"X-API-Token": "test-token"}
+
+
+class FactCacheTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.test_path = Path(self.test_dir.name)
+        self.cache_dir = self.test_path / "repo.facts"
+        self.cache_dir.mkdir()
+        self.config_file = self.test_path / "test_config.ini"
+        self.config_file.write_text(f"""[ansible_shed]
+interval=60
+port=12345
+repo_path={self.test_path / "repo"}
+repo_url=git@github.com:test/test.git
+repo_key={self.test_path / "key"}
+ansible_hosts_inventory=hosts
+ansible_playbook_init=site.yaml
+api_token=test-token
+
+[performance]
+fact_cache_ttl=7200
+""")
+        self.shed = Shed(self.config_file)
+        self.client = TestClient(TestServer(self.shed._api_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self) -> None:
+        await self.client.close()
+        self.test_dir.cleanup()
+
+    def _cache_host(self, host: str, age: float = 0) -> None:
+        path = self.cache_dir / host
+        path.write_text("{}")
+        mtime = time() - age
+        os.utime(path, (mtime, mtime))
+
+    def test_env(self) -> None:
+        assert self.shed.fact_cache is not None
+        self.assertEqual(self.shed.fact_cache.cache_dir, self.cache_dir)
+        env = self.shed._ansible_env()
+        assert env is not None
+        self.assertEqual(env["ANSIBLE_GATHERING"], "smart")
+        self.assertEqual(env["ANSIBLE_CACHE_PLUGIN"], "jsonfile")
+        self.assertEqual(env["ANSIBLE_CACHE_PLUGIN_CONNECTION"], str(self.cache_dir))
+        self.assertEqual(env["ANSIBLE_CACHE_PLUGIN_TIMEOUT"], "7200")
+
+        self.config_file.write_text(
+            self.config_file.read_text().replace("fact_cache_ttl=7200", "")
+        )
+        self.assertIsNone(Shed(self.config_file).fact_cache)
+
+    async def test_run_stats(self) -> None:
+        run_start = time()
+        self._cache_host("cached", age=600)
+        self._cache_host("gathered")
+        self._cache_host("other", age=60)
+        job_stats: dict[str, int] = {}
+        await self.shed._update_fact_cache_stats(
+            job_stats, ["cached", "gathered", "uncached"], run_start - 1
+        )
+        self.assertEqual(
+            job_stats, {"ansible_fact_cache_hits": 1, "ansible_fact_cache_misses": 1}
+        )
+        self.assertEqual(self.shed.prom_stats["ansible_fact_cache_hosts"], 3)
+        self.assertAlmostEqual(
+            self.shed.prom_stats["ansible_fact_cache_oldest_age_seconds"], 600, delta=2
+        )
+
+    def test_invalidate(self) -> None:
+        cache = FactCache(self.cache_dir)
+        for host in ("a", "b", "c"):
+            self._cache_host(host)
+        (self.test_path / "outside").write_text("keep")
+        self.assertEqual(cache.invalidate("../outside"), [])
+        self.assertEqual(cache.invalidate("missing"), [])
+        self.assertEqual(cache.invalidate("a"), ["a"])
+        self.assertEqual(cache.invalidate(), ["b", "c"])
+        self.assertEqual(list(self.cache_dir.iterdir()), [])
+        self.assertTrue((self.test_path / "outside").exists())
+        self.assertEqual(cache.host_count_and_oldest_age(time()), (0, 0))
+        self.assertEqual(FactCache(self.test_path / "nope").invalidate(), [])
+
+    async def test_invalidate_api(self) -> None:
+        self._cache_host("web1")
+        self._cache_host("web2")
+        resp = await self.client.post("/facts/invalidate")
+        self.assertEqual(resp.status, 401)
+
+        resp = await self.client.post(
+            "/facts/invalidate", json={"host": "db1"}, headers=API_HEADERS
+        )
+        self.assertEqual(resp.status, 404)
+        for host in (["web1"], 1, {"name": "web1"}):
+            resp = await self.client.post(
+                "/facts/invalidate", json={"host": host}, headers=API_HEADERS
+            )
+            self.assertEqual(resp.status, 400)
+        self.assertTrue((self.cache_dir / "web1").exists())
+        resp = await self.client.post(
+            "/facts/invalidate", params={"host": "web1"}, headers=API_HEADERS
+        )
+        self.assertEqual(await resp.json(), {"invalidated": ["web1"]})
+        self.assertEqual(self.shed.prom_stats["ansible_fact_cache_hosts"], 1)
+        resp = await self.client.post("/facts/invalidate", headers=API_HEADERS)
+        self.assertEqual(await resp.json(), {"invalidated": ["web2"]})
+        self.assertEqual(self.shed.prom_stats["ansible_fact_cache_hosts"], 0)
+
+        self.shed.fact_cache = None
+        resp = await self.client.post("/facts/invalidate", headers=API_HEADERS)
+        self.assertEqual(resp.status, 404)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import asyncio
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from time import monotonic
+
+from ansible_shed.git_backend import AsyncGit, GitError
+
+
+class AsyncGitTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.repo_path = Path(self.test_dir.name) / "repo"
+        self.repo_path.mkdir()
+        subprocess.run(["git", "init", "-q", "-b", "main"], cwd=self.repo_path)
+        self.pid_file = Path(self.test_dir.name) / "sleep.pid"
+        # A "remote" that never answers; echo $$ so the test can check it died
+        self.git = AsyncGit(
+            self.repo_path,
+            {"GIT_SHED_TEST_PID_FILE": str(self.pid_file)},
+            timeout_seconds=0.5,
+        )
+        self.hang = (
+            "-c",
+            'alias.hang=!echo $$ > "$GIT_SHED_TEST_PID_FILE"; exec sleep 30',
+        )
+
+    async def asyncTearDown(self) -> None:
+        self.test_dir.cleanup()
+
+    async def _assert_hang_killed(self) -> None:
+        # The orphaned sleep may linger as a zombie until init reaps it, and
+        # SIGKILL delivery to it isn't synchronous with git's exit
+        stat_file = Path("/proc") / self.pid_file.read_text().strip() / "stat"
+        deadline = monotonic() + 5
+        while True:
+            try:
+                state = stat_file.read_text().rsplit(")", 1)[1].split()[0]
+            except FileNotFoundError:
+                return
+            if state == "Z" or monotonic() > deadline:
+                break
+            await asyncio.sleep(0.05)
+        self.assertEqual(state, "Z")
+
+    async def test_run_and_errors(self) -> None:
+        self.assertEqual(
+            (await self.git.run("rev-parse", "--is-inside-work-tree")).strip(), "true"
+        )
+        with self.assertRaisesRegex(GitError, "rev-parse --verify .* exited 128"):
+            await self.git.rev_parse("origin/main")
+        self.assertEqual(self.git.env["GIT_TERMINAL_PROMPT"], "0")
+
+    async def test_timeout_kills_process_group(self) -> None:
+        start = monotonic()
+        with self.assertRaisesRegex(GitError, "timed out after 0.5s"):
+            await self.git.run(*self.hang, "hang")
+        self.assertLess(monotonic() - start, 10)
+        await self._assert_hang_killed()
+
+    async def test_cancel_kills_process_group(self) -> None:
+        task = asyncio.create_task(self.git.run(*self.hang, "hang", timeout=30))
+        while not self.pid_file.exists() or not self.pid_file.read_text():
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        await self._assert_hang_killed()
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from ansible_shed.host_stats import HOST_STAT_NAMES, HostStats, HostStatsStore
+
+
+class HostStatsTests(unittest.TestCase):
+    def test_from_recap(self) -> None:
+        stats = HostStats.from_recap({"ok": 3, "failed": 1, "bogus": 9})
+        self.assertEqual(stats, HostStats(ok=3, failed=1))
+        self.assertEqual(
+            dict(zip(HOST_STAT_NAMES, stats.values(), strict=True))["failed"],
+            stats.failed,
+        )
+        self.assertFalse(hasattr(stats, "__dict__"))
+        self.assertTrue(repr(HostStats(ok=1)).startswith("HostStats(ok=1, changed=0"))
+
+    def test_store_replace(self) -> None:
+        store = HostStatsStore()
+        store.replace({"web_1": {"ok": 1}, "db-1.example.com": {"changed": 2}})
+        self.assertEqual(sorted(store), ["db-1.example.com", "web_1"])
+        self.assertEqual(store.get("web_1"), HostStats(ok=1))
+
+        store.replace({"web_1": {"ok": 5}})
+        self.assertEqual(len(store), 1)
+        self.assertIsNone(store.get("db-1.example.com"))
+        self.assertEqual([(h, s.ok) for h, s in store.items()], [("web_1", 5)])
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+
+import asyncio
+import tempfile
+import unittest
+from configparser import ConfigParser
+from pathlib import Path
+from time import time
+from unittest.mock import AsyncMock, Mock, patch
+
+from aioprometheus.collectors import Registry
+from aioprometheus.renderer import render
+
+from ansible_shed.jobs import DEFAULT_JOB_NAME, JobConfig, load_job_configs
+from ansible_shed.output_parser import AnsibleOutputParser
+from ansible_shed.shed import Shed
+
+JOBS_CONFIG = """\
+[ansible_shed]
+interval=60
+port=12345
+repo_path={repo_path}
+repo_url=git@github.com:test/test.git
+repo_key=/dev/null
+ansible_playbook_binary=/usr/bin/ansible-playbook
+ansible_hosts_inventory=hosts
+ansible_playbook_init=site.yaml
+ansible_show_diff=true
+ansible_tags=everything
+max_concurrent_jobs=2
+
+[job:networkd]
+interval=5
+priority=-1
+ansible_tags=networkd
+
+[job:zfs]
+interval=1440
+ansible_playbook_init=zfs.yaml
+ansible_limit=nas.example.com
+ansible_show_diff=false
+"""
+
+
+class JobConfigTests(unittest.TestCase):
+    def test_load_job_configs(self) -> None:
+        cp = ConfigParser()
+        cp.read_string(JOBS_CONFIG.format(repo_path="/tmp/repo"))
+        jobs = load_job_configs(cp)
+
+        self.assertEqual(list(jobs), [DEFAULT_JOB_NAME, "networkd", "zfs"])
+        self.assertEqual(jobs[DEFAULT_JOB_NAME].interval_seconds, 3600)
+        self.assertEqual(jobs[DEFAULT_JOB_NAME].tags, "everything")
+        networkd = jobs["networkd"]
+        self.assertEqual(networkd.interval_seconds, 300)
+        self.assertEqual(networkd.playbook, "site.yaml")
+        self.assertTrue(networkd.show_diff)
+        self.assertEqual(networkd.tags, "networkd")
+        zfs = jobs["zfs"]
+        self.assertEqual(zfs.playbook, "zfs.yaml")
+        self.assertFalse(zfs.show_diff)
+        # Filters are never inherited from [ansible_shed]
+        self.assertIsNone(zfs.tags)
+        self.assertEqual(zfs.limit, "nas.example.com")
+
+    def test_empty_job_name_rejected(self) -> None:
+        cp = ConfigParser()
+        cp.read_string(JOBS_CONFIG.format(repo_path="/tmp/repo") + "[job: ]\n")
+        with self.assertRaises(ValueError):
+            load_job_configs(cp)
+
+
+class JobSchedulerTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.test_path = Path(self.test_dir.name)
+        self.config_file = self.test_path / "test_config.ini"
+        self.config_file.write_text(JOBS_CONFIG.format(repo_path=self.test_path))
+
+    def tearDown(self) -> None:
+        self.test_dir.cleanup()
+
+    @patch("pathlib.Path.mkdir")
+    def test_cmd_per_job(self, mock_mkdir: Mock) -> None:
+        shed = Shed(self.config_file)
+        self.assertEqual(
+            shed._ansible_playbook_cmd(shed.jobs["zfs"]),
+            [
+                "/usr/bin/ansible-playbook",
+                "--inventory",
+                "hosts",
+                "zfs.yaml",
+                "--limit",
+                "nas.example.com",
+            ],
+        )
+        self.assertIn("--diff", shed._ansible_playbook_cmd(shed.jobs["networkd"]))
+
+    @patch("pathlib.Path.mkdir")
+    def test_next_due_job_orders_by_time_then_priority(self, mock_mkdir: Mock) -> None:
+        shed = Shed(self.config_file)
+        # Everything is due at start; networkd has the lowest priority value
+        job, _ = shed._next_due_job()
+        assert job is not None
+        self.assertEqual(job.name, "networkd")
+
+        now = time()
+        shed.job_states["networkd"].next_run_epoch = now + 300
+        shed.job_states[DEFAULT_JOB_NAME].next_run_epoch = now - 10
+        shed.job_states["zfs"].next_run_epoch = now - 20
+        job, _ = shed._next_due_job()
+        assert job is not None
+        self.assertEqual(job.name, "zfs")
+
+        shed.job_states["zfs"].running = True
+        shed.job_states[DEFAULT_JOB_NAME].next_run_epoch = now + 600
+        job, wait_seconds = shed._next_due_job()
+        self.assertIsNone(job)
+        self.assertAlmostEqual(wait_seconds, 300, delta=5)
+
+    @patch("pathlib.Path.mkdir")
+    def test_force_run_single_job_while_paused(self, mock_mkdir: Mock) -> None:
+        shed = Shed(self.config_file)
+        for job_state in shed.job_states.values():
+            job_state.next_run_epoch = time() + 600
+        shed.paused_until_epoch = int(time()) + 3600
+
+        self.assertIsNone(shed._next_due_job()[0])
+        shed.request_force_run("zfs")
+        self.assertTrue(shed.force_run_requested.is_set())
+        job, _ = shed._next_due_job()
+        assert job is not None
+        self.assertEqual(job.name, "zfs")
+
+    @patch("pathlib.Path.mkdir")
+    def test_run_job_stats_are_per_job(self, mock_mkdir: Mock) -> None:
+        shed = Shed(self.config_file)
+        parser = AnsibleOutputParser()
+        parser.feed("host1.example.com : ok=4 changed=2\n")
+        shed._rebase_or_clone_repo = AsyncMock()  # type: ignore[method-assign]
+
+        async def fake_run_ansible(
+            *args: object, **kwargs: object
+        ) -> tuple[int, AnsibleOutputParser]:
+            await asyncio.sleep(0.05)
+            return 2, parser
+
+        shed._run_ansible = AsyncMock(side_effect=fake_run_ansible)  # type: ignore[method-assign]
+
+        async def run_jobs() -> None:
+            semaphore = asyncio.Semaphore(2)
+            await semaphore.acquire()
+            await semaphore.acquire()
+            await asyncio.gather(
+                shed._run_job(shed.jobs["networkd"], semaphore),
+                shed._run_job(shed.jobs["zfs"], semaphore),
+            )
+
+        asyncio.run(run_jobs())
+
+        # Only the first job to take the repo lock rebases the checkout
+        shed._rebase_or_clone_repo.assert_awaited_once()
+        for job_name in ("networkd", "zfs"):
+            job_stats = shed.job_states[job_name].prom_stats
+            host_stats = shed.job_states[job_name].host_stats.get("host1.example.com")
+            assert host_stats is not None
+            self.assertEqual(host_stats.changed, 2)
+            self.assertEqual(job_stats["ansible_last_run_returncode"], 2)
+            self.assertFalse(shed.job_states[job_name].running)
+        self.assertNotIn("ansible_last_run_returncode", shed.prom_stats)
+
+    @patch("pathlib.Path.mkdir")
+    def test_metrics_exported_per_job(self, mock_mkdir: Mock) -> None:
+        shed = Shed(self.config_file)
+        shed.prom_registry = Registry()
+        shed.parse_ansible_stats(
+            "host1.example.com : ok=4 changed=2\nweb_1 : ok=1 failed=1\n", 0, "zfs"
+        )
+
+        exports: list[str] = []
+
+        async def export() -> None:
+            exporter = asyncio.create_task(shed._update_prom_stats())
+            await asyncio.sleep(0.05)
+            exports.append(render(shed.prom_registry, [])[0].decode())
+            # host1 is decommissioned
+            shed.parse_ansible_stats("web_1 : ok=2\n", 0, "zfs")
+            await asyncio.sleep(0.05)
+            exports.append(render(shed.prom_registry, [])[0].decode())
+            self.assertFalse(exporter.done())
+            exporter.cancel()
+
+        asyncio.run(export())
+        self.assertIn(
+            'ansible_changed{hostname="host1.example.com",shed_job="zfs"} 2',
+            exports[0],
+        )
+        # Underscores in hostnames survive the export
+        self.assertIn('ansible_failed{hostname="web_1",shed_job="zfs"} 1', exports[0])
+        self.assertNotIn("host1.example.com", exports[1])
+        self.assertIn('ansible_ok{hostname="web_1",shed_job="zfs"} 2', exports[1])
+
+    @patch("pathlib.Path.mkdir")
+    def test_narrowed_runs_keep_full_run_host_stats(self, mock_mkdir: Mock) -> None:
+        shed = Shed(self.config_file)
+        shed.prom_registry = Registry()
+        shed.parse_ansible_stats("web_1 : ok=2\ndb_1 : ok=3\n", 0, "zfs")
+        shed.parse_ansible_stats("web_1 : ok=1 changed=1\n", 0, "zfs", check_mode=True)
+        shed.parse_ansible_stats("web_1 : ok=4\n", 0, "zfs", targeted=True)
+        job_state = shed.job_states["zfs"]
+        self.assertEqual(sorted(job_state.host_stats), ["db_1", "web_1"])
+        web_stats = job_state.host_stats.get("web_1")
+        assert web_stats is not None
+        self.assertEqual((web_stats.ok, web_stats.changed), (4, 0))
+
+        async def export() -> str:
+            exporter = asyncio.create_task(shed._update_prom_stats())
+            await asyncio.sleep(0.05)
+            exporter.cancel()
+            return render(shed.prom_registry, [])[0].decode()
+
+        export_text = asyncio.run(export())
+        self.assertIn('ansible_ok{hostname="db_1",shed_job="zfs"} 3', export_text)
+        self.assertIn(
+            'ansible_check_changed{hostname="web_1",shed_job="zfs"} 1', export_text
+        )
+        self.assertIn('ansible_changed{hostname="web_1",shed_job="zfs"} 0', export_text)
+
+
+class UnchangedModeTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.test_path = Path(self.test_dir.name)
+        self.config_file = self.test_path / "test_config.ini"
+        self.config_file.write_text(
+            JOBS_CONFIG.format(repo_path=self.test_path).replace(
+                "max_concurrent_jobs=2\n",
+                "max_concurrent_jobs=2\nunchanged_mode=skip\nmax_skip_interval=60\n",
+            )
+        )
+
+    def tearDown(self) -> None:
+        self.test_dir.cleanup()
+
+    def _clean_parser(self) -> AnsibleOutputParser:
+        parser = AnsibleOutputParser()
+        parser.feed("host1.example.com : ok=4 changed=0 unreachable=0 failed=0\n")
+        return parser
+
+    @patch("pathlib.Path.mkdir")
+    def test_decisions(self, mock_mkdir: Mock) -> None:
+        shed = Shed(self.config_file)
+        job = shed.default_job
+        job_state = shed.job_states[job.name]
+        shed.repo_head_sha = "abc"
+        self.assertEqual(
+            shed._unchanged_run_decision(job, job_state, False), ("run", "no_clean_run")
+        )
+
+        shed._record_run_outcome(job, job_state, False, 0, self._clean_parser(), time())
+        self.assertEqual(
+            shed._unchanged_run_decision(job, job_state, False), ("skip", "unchanged")
+        )
+        self.assertEqual(
+            shed._unchanged_run_decision(job, job_state, True), ("run", "forced")
+        )
+        self.assertEqual(
+            shed._unchanged_run_decision(shed.jobs["zfs"], job_state, False),
+            ("run", "config_changed"),
+        )
+        shed.unchanged_mode = "check"
+        self.assertEqual(
+            shed._unchanged_run_decision(job, job_state, False), ("check", "unchanged")
+        )
+
+        job_state.last_full_run_epoch = time() - 3601
+        self.assertEqual(
+            shed._unchanged_run_decision(job, job_state, False),
+            ("run", "max_skip_interval"),
+        )
+        shed.repo_head_sha = "def"
+        self.assertEqual(
+            shed._unchanged_run_decision(job, job_state, False), ("run", "head_changed")
+        )
+
+        # A failed run is never skipped next time
+        shed._record_run_outcome(job, job_state, False, 2, self._clean_parser(), time())
+        self.assertEqual(
+            shed._unchanged_run_decision(job, job_state, False), ("run", "no_clean_run")
+        )
+
+    @patch("pathlib.Path.mkdir")
+    def test_check_mode_drift_forces_full_run(self, mock_mkdir: Mock) -> None:
+        shed = Shed(self.config_file)
+        job = shed.default_job
+        job_state = shed.job_states[job.name]
+        shed.repo_head_sha = "abc"
+        shed._record_run_outcome(job, job_state, False, 0, self._clean_parser(), time())
+
+        shed._record_run_outcome(job, job_state, True, 0, self._clean_parser(), time())
+        self.assertEqual(job_state.last_success_sha, "abc")
+
+        drifted = AnsibleOutputParser()
+        drifted.feed("host1.example.com : ok=4 changed=1 unreachable=0 failed=0\n")
+        shed._record_run_outcome(job, job_state, True, 0, drifted, time())
+        self.assertIsNone(job_state.last_success_sha)
+
+    @patch("pathlib.Path.mkdir")
+    def test_run_job_skips_unchanged_head(self, mock_mkdir: Mock) -> None:
+        shed = Shed(self.config_file)
+        shed._rebase_or_clone_repo = AsyncMock()  # type: ignore[method-assign]
+        shed._run_ansible = AsyncMock(  # type: ignore[method-assign]
+            return_value=(0, self._clean_parser())
+        )
+        shed.repo_head_sha = "abc"
+
+        async def run_twice() -> None:
+            semaphore = asyncio.Semaphore(1)
+            for _ in range(2):
+                await semaphore.acquire()
+                await shed._run_job(shed.default_job, semaphore)
+
+        asyncio.run(run_twice())
+
+        shed._run_ansible.assert_awaited_once()
+        job_state = shed.job_states[DEFAULT_JOB_NAME]
+        self.assertEqual(job_state.last_decision, "skip")
+        self.assertEqual(job_state.prom_stats["ansible_last_run_skipped"], 1)
+
+    @patch("pathlib.Path.mkdir")
+    def test_concurrent_jobs_keep_their_sha(self, mock_mkdir: Mock) -> None:
+        shed = Shed(self.config_file)
+        shed.git_worktrees = True
+        shas = iter(("abc", "def"))
+        second_started = asyncio.Event()
+
+        async def rebase() -> None:
+            shed.repo_head_sha = next(shas)
+
+        async def run_ansible(
+            job: JobConfig, check_mode: bool = False, targeted: bool = False
+        ) -> tuple[int, AnsibleOutputParser]:
+            if job.name == DEFAULT_JOB_NAME:
+                # The second job rebases onto "def" while this one runs
+                await second_started.wait()
+            else:
+                second_started.set()
+            return 0, self._clean_parser()
+
+        shed._rebase_or_clone_repo = AsyncMock(side_effect=rebase)  # type: ignore[method-assign]
+        shed._run_ansible = AsyncMock(side_effect=run_ansible)  # type: ignore[method-assign]
+
+        async def run_both() -> None:
+            semaphore = asyncio.Semaphore(2)
+            for _ in range(2):
+                await semaphore.acquire()
+            await asyncio.gather(
+                shed._run_job(shed.default_job, semaphore),
+                shed._run_job(shed.jobs["networkd"], semaphore),
+            )
+
+        asyncio.run(run_both())
+
+        self.assertEqual(shed.repo_head_sha, "def")
+        self.assertEqual(shed.job_states[DEFAULT_JOB_NAME].last_success_sha, "abc")
+        self.assertEqual(shed.job_states["networkd"].last_success_sha, "def")
+        self.assertIsNone(shed.job_states[DEFAULT_JOB_NAME].checkout_sha)
+
+    @patch("pathlib.Path.mkdir")
+    def test_check_mode_cmd(self, mock_mkdir: Mock) -> None:
+        shed = Shed(self.config_file)
+        cmd = shed._ansible_playbook_cmd(shed.default_job, check_mode=True)
+        self.assertEqual(cmd[-1], "--check")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+import unittest
+
+from aioprometheus.collectors import Gauge, Registry
+
+from ansible_shed.label_tracker import label_key, LabelTracker
+
+
+class LabelTrackerTests(unittest.TestCase):
+    def setUp(self) -> None:
+        registry = Registry()
+        self.hosts = Gauge("test_hosts", "test", registry=registry)
+        self.packages = Gauge("test_packages", "test", registry=registry)
+        self.tracker = LabelTracker()
+
+    def _series(self, gauge: Gauge) -> list[dict[str, str]]:
+        return sorted(
+            (labels for labels, _ in gauge.get_all()), key=lambda d: sorted(d.items())
+        )
+
+    def test_prune_removes_unset_series(self) -> None:
+        for host in ("web1", "web2", "db1"):
+            self.tracker.set(self.hosts, {"hostname": host, "shed_job": "default"}, 1)
+        self.tracker.set(self.packages, {"name": "ansible"}, 1)
+        self.assertEqual(self.tracker.prune(), 4)
+
+        # web2 decommissioned, no packages need upgrading any more
+        for host in ("web1", "db1"):
+            self.tracker.set(self.hosts, {"shed_job": "default", "hostname": host}, 2)
+        self.assertEqual(self.tracker.prune(), 2)
+        self.assertEqual(
+            self._series(self.hosts),
+            [
+                {"hostname": "db1", "shed_job": "default"},
+                {"hostname": "web1", "shed_job": "default"},
+            ],
+        )
+        self.assertEqual(self._series(self.packages), [])
+        self.assertEqual(
+            self.tracker.active(self.hosts),
+            {
+                label_key({"hostname": "db1", "shed_job": "default"}),
+                label_key({"hostname": "web1", "shed_job": "default"}),
+            },
+        )
+
+    def test_unlabeled_series(self) -> None:
+        self.tracker.set(self.hosts, {}, 3)
+        self.tracker.prune()
+        self.assertEqual(self.hosts.get({}), 3)
+        self.tracker.prune()
+        self.assertEqual(self._series(self.hosts), [])
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from ansible_shed.live_log import LiveRunLog
+from ansible_shed.shed import Shed
+
+API_HEADERS = {"X-API-Token": "test-token"}
+
+
+class LiveRunLogTests(unittest.IsolatedAsyncioTestCase):
+    def test_read_and_trim(self) -> None:
+        live_log = LiveRunLog("run1", "default", max_bytes=8)
+        self.assertEqual(live_log.read(0), (0, b""))
+        live_log.publish(b"abc\n")
+        live_log.publish(b"")
+        live_log.publish(b"def\n")
+        self.assertEqual(live_log.read(0), (0, b"abc\ndef\n"))
+        self.assertEqual(live_log.read(2), (2, b"c\ndef\n"))
+        self.assertEqual(live_log.read(100), (8, b""))
+
+        live_log.publish(b"ghi\n")
+        self.assertEqual((live_log.start_offset, live_log.end_offset), (4, 12))
+        # Dropped bytes are skipped
+        self.assertEqual(live_log.read(0), (4, b"def\nghi\n"))
+        # The newest chunk is kept even when it's over max_bytes
+        live_log.publish(b"0123456789\n")
+        self.assertEqual(live_log.read(0), (12, b"0123456789\n"))
+
+        live_log.close(2)
+        live_log.publish(b"late\n")
+        self.assertEqual((live_log.end_offset, live_log.returncode), (23, 2))
+
+    async def test_follow(self) -> None:
+        live_log = LiveRunLog("run1", "default")
+        live_log.publish(b"one\n")
+
+        async def collect(offset: int) -> list[tuple[int, bytes]]:
+            return [chunk async for chunk in live_log.follow(offset)]
+
+        followers = [asyncio.create_task(collect(offset)) for offset in (0, 2)]
+        await asyncio.sleep(0)
+        live_log.publish(b"two\n")
+        await asyncio.sleep(0)
+        live_log.publish(b"three\n")
+        live_log.close(0)
+        first, second = await asyncio.wait_for(asyncio.gather(*followers), 5)
+        self.assertEqual(b"".join(data for _, data in first), b"one\ntwo\nthree\n")
+        self.assertEqual(second[0], (2, b"e\n"))
+        self.assertEqual(await collect(0), [(0, b"one\ntwo\nthree\n")])
+
+
+class LiveRunLogAPITests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.test_path = Path(self.test_dir.name)
+        self.release = self.test_path / "release"
+        fake_ansible = self.test_path / "ansible-playbook"
+        fake_ansible.write_text(
+            "#!/bin/sh\necho 'TASK [x] ****'\n"
+            f"while [ ! -e {self.release} ]; do sleep 0.05; done\n"
+            "echo 'web_1 : ok=2    changed=1    failed=0'\nexit 2\n"
+        )
+        fake_ansible.chmod(0o755)
+        self.config_file = self.test_path / "test_config.ini"
+        self.config_file.write_text(f"""[ansible_shed]
+interval=60
+port=12345
+repo_path={self.test_path}
+repo_url=git@github.com:test/test.git
+repo_key={self.test_path / "key"}
+ansible_playbook_binary={fake_ansible}
+ansible_hosts_inventory=hosts
+ansible_playbook_init=site.yaml
+api_token=test-token
+log_dir={self.test_path / "logs"}
+""")
+        self.shed = Shed(self.config_file)
+        self.client = TestClient(TestServer(self.shed._api_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self) -> None:
+        self.release.touch()
+        await self.client.close()
+        self.test_dir.cleanup()
+
+    async def _start_run(self) -> "asyncio.Task[object]":
+        run = asyncio.create_task(self.shed._run_ansible())
+        for _ in range(100):
+            live_log = self.shed.job_states["default"].live_log
+            if live_log and live_log.end_offset:
+                return run
+            await asyncio.sleep(0.05)
+        self.fail("ansible-playbook output never reached the live log")
+
+    async def test_errors(self) -> None:
+        resp = await self.client.get("/runs/current/log")
+        self.assertEqual(resp.status, 401)
+        resp = await self.client.get("/runs/current/log", headers=API_HEADERS)
+        self.assertEqual(resp.status, 404)
+
+        run = await self._start_run()
+        resp = await self.client.get(
+            "/runs/current/log", params={"offset": "-1"}, headers=API_HEADERS
+        )
+        self.assertEqual(resp.status, 400)
+        resp = await self.client.get(
+            "/runs/current/log", params={"job": "nope"}, headers=API_HEADERS
+        )
+        self.assertEqual(resp.status, 404)
+        self.release.touch()
+        await run
+
+    async def test_sse_matches_run_log(self) -> None:
+        run = await self._start_run()
+        live_log = self.shed.job_states["default"].live_log
+        assert live_log is not None
+        resp = await self.client.get("/runs/current/log", headers=API_HEADERS)
+        self.assertEqual(resp.headers["Content-Type"], "text/event-stream")
+        self.release.touch()
+        body = (await resp.read()).decode()
+        await run
+
+        self.assertIsNone(self.shed.job_states["default"].live_log)
+        self.assertIn("data: TASK [x] ****\n", body)
+        self.assertIn("data: web_1 : ok=2    changed=1    failed=0\n", body)
+        end_id = f"{live_log.run_id}:{live_log.end_offset}"
+        self.assertTrue(
+            body.endswith(f'event: end\nid: {end_id}\ndata: {{"returncode": 2}}\n\n')
+        )
+        # Offsets are the run log file's bytes
+        assert self.shed.log_dir_path is not None
+        run_log = self.shed.log_dir_path / f"{live_log.run_id}.log"
+        self.assertEqual(run_log.stat().st_size, live_log.end_offset)
+
+    async def test_resume_and_websocket(self) -> None:
+        run = await self._start_run()
+        live_log = self.shed.job_states["default"].live_log
+        assert live_log is not None
+        first_line_end = live_log.end_offset
+
+        ws = await self.client.ws_connect("/runs/current/log", headers=API_HEADERS)
+        frame = await ws.receive_json(timeout=5)
+        self.assertEqual(
+            frame,
+            {
+                "run_id": live_log.run_id,
+                "start": 0,
+                "offset": first_line_end,
+                "data": "TASK [x] ****\n",
+            },
+        )
+        # An EventSource reconnect only gets what it hasn't seen
+        resp = await self.client.get(
+            "/runs/current/log",
+            headers={
+                **API_HEADERS,
+                "Last-Event-ID": f"{live_log.run_id}:{first_line_end}",
+            },
+        )
+        self.release.touch()
+        frames = [await ws.receive_json(timeout=5) for _ in range(2)]
+        await run
+        self.assertEqual(frames[0]["data"], "web_1 : ok=2    changed=1    failed=0\n")
+        self.assertEqual(frames[1]["end"], True)
+        self.assertEqual(frames[1]["returncode"], 2)
+        await ws.close()
+        self.assertNotIn("TASK [x]", (await resp.read()).decode())
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
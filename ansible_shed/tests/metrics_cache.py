@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+import gzip
+import tempfile
+import unittest
+from collections.abc import Mapping
+from pathlib import Path
+
+from aiohttp.test_utils import TestClient, TestServer
+from aioprometheus.collectors import Gauge, Registry
+
+from ansible_shed.metrics_cache import accepts_gzip, etag_matches, MetricsCache
+from ansible_shed.shed import Shed
+
+
+class MetricsCacheTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.test_path = Path(self.test_dir.name)
+        self.config_file = self.test_path / "test_config.ini"
+        self.config_file.write_text(f"""[ansible_shed]
+interval=60
+port=12345
+repo_path={self.test_path / "repo"}
+repo_url=git@github.com:test/test.git
+repo_key={self.test_path / "key"}
+ansible_hosts_inventory=hosts
+ansible_playbook_init=site.yaml
+""")
+        self.shed = Shed(self.config_file)
+        self.shed.prom_registry = Registry()
+        self.gauge = Gauge("test_gauge", "test", registry=self.shed.prom_registry)
+        self.gauge.set({}, 1)
+        self.client = TestClient(TestServer(self.shed._api_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self) -> None:
+        await self.client.close()
+        self.test_dir.cleanup()
+
+    async def _scrape(self, **headers: str) -> tuple[int, bytes, Mapping[str, str]]:
+        resp = await self.client.get("/metrics", headers=headers, auto_decompress=False)
+        return resp.status, await resp.read(), resp.headers
+
+    async def test_cached_until_invalidated(self) -> None:
+        _, body, headers = await self._scrape(**{"Accept-Encoding": "identity"})
+        self.assertIn(b"test_gauge 1", body)
+        self.assertNotIn("Content-Encoding", headers)
+        self.gauge.set({}, 2)
+        _, cached_body, _ = await self._scrape(**{"Accept-Encoding": "identity"})
+        self.assertEqual(cached_body, body)
+        self.assertEqual(self.shed.metrics_cache.renders, 1)
+
+        self.shed.metrics_cache.invalidate()
+        _, body, _ = await self._scrape(**{"Accept-Encoding": "identity"})
+        self.assertIn(b"test_gauge 2", body)
+        self.assertEqual(self.shed.metrics_cache.renders, 2)
+
+    async def test_gzip_and_etag(self) -> None:
+        status, body, headers = await self._scrape(**{"Accept-Encoding": "gzip"})
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertIn(b"test_gauge 1", gzip.decompress(body))
+        etag = headers["ETag"]
+
+        status, body, headers = await self._scrape(
+            **{"Accept-Encoding": "gzip", "If-None-Match": etag}
+        )
+        self.assertEqual((status, body, headers["ETag"]), (304, b"", etag))
+
+        # Same content after an invalidation keeps its ETag
+        self.shed.metrics_cache.invalidate()
+        status, _, _ = await self._scrape(
+            **{"Accept-Encoding": "gzip", "If-None-Match": f"W/{etag}"}
+        )
+        self.assertEqual(status, 304)
+        self.gauge.set({}, 3)
+        self.shed.metrics_cache.invalidate()
+        status, _, headers = await self._scrape(
+            **{"Accept-Encoding": "gzip", "If-None-Match": etag}
+        )
+        self.assertEqual(status, 200)
+        self.assertNotEqual(headers["ETag"], etag)
+
+        _, _, headers = await self._scrape(**{"Accept-Encoding": "gzip;q=0, br"})
+        self.assertNotIn("Content-Encoding", headers)
+        self.shed.metrics_gzip = False
+        _, _, headers = await self._scrape(**{"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", headers)
+
+    def test_accepts_gzip(self) -> None:
+        self.assertTrue(accepts_gzip("gzip, deflate"))
+        self.assertTrue(accepts_gzip("deflate;q=1.0, GZIP;q=0.5"))
+        self.assertTrue(accepts_gzip("br, *"))
+        self.assertFalse(accepts_gzip(""))
+        self.assertFalse(accepts_gzip("identity"))
+        self.assertFalse(accepts_gzip("gzip;q=0"))
+        self.assertFalse(accepts_gzip("gzip; q=0.000, *"))
+        self.assertFalse(accepts_gzip("*;q=0"))
+        self.assertFalse(accepts_gzip("gzip;q=high"))
+
+    def test_etag_matches(self) -> None:
+        self.assertTrue(etag_matches('"a", "b"', '"b"'))
+        self.assertTrue(etag_matches("*", '"b"'))
+        self.assertFalse(etag_matches("", '"b"'))
+        self.assertFalse(etag_matches('"a"', '"b"'))
+        self.assertEqual(MetricsCache().generation, 0)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
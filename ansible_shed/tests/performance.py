@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+import tempfile
+import unittest
+from configparser import ConfigParser
+from pathlib import Path
+
+from aioprometheus.collectors import Gauge, Registry
+
+from ansible_shed.constants import EVENTS_FD_ENV
+from ansible_shed.label_tracker import LabelTracker
+from ansible_shed.performance import load_performance_profile, PerformanceProfile
+from ansible_shed.shed import Shed
+
+PERFORMANCE_CONFIG = """\
+[performance]
+forks=25
+pipelining=true
+control_persist=1800
+strategy=free
+callbacks=ansible.posix.profile_tasks, ansible.posix.timer
+"""
+
+
+class PerformanceProfileTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.test_path = Path(self.test_dir.name)
+        self.repo_path = self.test_path / "repo"
+        self.config_file = self.test_path / "test_config.ini"
+        self.config_file.write_text(f"""[ansible_shed]
+interval=60
+port=12345
+repo_path={self.repo_path}
+repo_url=git@github.com:test/test.git
+repo_key={self.test_path / "key"}
+ansible_hosts_inventory=hosts
+ansible_playbook_init=site.yaml
+
+{PERFORMANCE_CONFIG}""")
+
+    def tearDown(self) -> None:
+        self.test_dir.cleanup()
+
+    def _load(self, config_text: str) -> PerformanceProfile:
+        cp = ConfigParser()
+        cp.read_string(config_text)
+        return load_performance_profile(cp, Path("/cp"), Path("/facts"))
+
+    def test_env(self) -> None:
+        self.assertEqual(self._load("").env(), {})
+        self.assertEqual(
+            self._load(PERFORMANCE_CONFIG).env(),
+            {
+                "ANSIBLE_FORKS": "25",
+                "ANSIBLE_PIPELINING": "True",
+                "ANSIBLE_SSH_ARGS": (
+                    "-C -o ControlMaster=auto -o ControlPersist=1800s"
+                ),
+                "ANSIBLE_SSH_CONTROL_PATH_DIR": "/cp",
+                "ANSIBLE_SSH_CONTROL_PATH": "%(directory)s/%%C",
+                "ANSIBLE_STRATEGY": "free",
+                "ANSIBLE_CALLBACKS_ENABLED": "ansible.posix.profile_tasks,ansible.posix.timer",
+            },
+        )
+        self.assertEqual(
+            self._load("[performance]\ncontrol_persist=0\n").env(),
+            {"ANSIBLE_SSH_ARGS": "-C -o ControlMaster=no"},
+        )
+        self.assertEqual(
+            self._load("[performance]\ncallbacks=\n").env(),
+            {"ANSIBLE_CALLBACKS_ENABLED": ""},
+        )
+
+    def test_invalid(self) -> None:
+        for bad in (
+            "forks=0",
+            "forks=many",
+            "strategy=fast",
+            "control_persist=-1",
+            "fact_cache_ttl=-5",
+        ):
+            with self.assertRaises(ValueError):
+                self._load(f"[performance]\n{bad}\n")
+
+        self.config_file.write_text(
+            self.config_file.read_text().replace("forks=25", "forks=0")
+        )
+        with self.assertLogs("ansible_shed.shed", "WARNING"):
+            shed = Shed(self.config_file)
+        self.assertEqual(shed.performance, PerformanceProfile())
+        self.assertIsNone(shed._ansible_env())
+
+    def test_shed_ansible_env(self) -> None:
+        shed = Shed(self.config_file)
+        env = shed._ansible_env(42)
+        assert env is not None
+        control_path_dir = self.test_path / "repo.ssh"
+        self.assertEqual(env["ANSIBLE_SSH_CONTROL_PATH_DIR"], str(control_path_dir))
+        self.assertEqual(control_path_dir.stat().st_mode & 0o777, 0o700)
+        self.assertEqual(env["ANSIBLE_FORKS"], "25")
+        self.assertEqual(env[EVENTS_FD_ENV], "42")
+        self.assertIn("PATH", env)
+
+    def test_info_metric(self) -> None:
+        shed = Shed(self.config_file)
+        gauge = Gauge("ansible_performance_info", "test", registry=Registry())
+        tracker = LabelTracker()
+        shed._refresh_performance_info(tracker, gauge)
+        tracker.prune()
+        self.assertEqual(
+            [labels for labels, _ in gauge.get_all()],
+            [
+                {
+                    "forks": "25",
+                    "pipelining": "true",
+                    "control_persist": "1800",
+                    "strategy": "free",
+                    "callbacks": "ansible.posix.profile_tasks,ansible.posix.timer",
+                    "fact_cache_ttl": "ansible.cfg",
+                }
+            ],
+        )
+        shed.performance = PerformanceProfile(forks=5)
+        shed._refresh_performance_info(tracker, gauge)
+        tracker.prune()
+        self.assertEqual(
+            [labels for labels, _ in gauge.get_all()],
+            [shed.performance.info_labels()],
+        )
+        self.assertEqual(shed.performance.info_labels()["strategy"], "ansible.cfg")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -1,27 +1,22 @@
 #!/usr/bin/env python3
 
+import asyncio
 import subprocess
 import tempfile
 import unittest
 from pathlib import Path
-from unittest.mock import MagicMock, patch
+from time import time
+from unittest.mock import AsyncMock
 
-from git import Repo
+from aioprometheus.collectors import Registry
+from aioprometheus.renderer import render
 
+from ansible_shed.git_backend import AsyncGit
 from ansible_shed.shed import Shed
 
 
 class RebaseOrCloneRepoTests(unittest.TestCase):
-    """Regression tests for the leaked `git cat-file --batch-check` bug.
-
-    `Repo(...)` must always be used as a context manager (or otherwise
-    explicitly `.close()`-d): GitPython lazily starts a persistent
-    `git cat-file --batch-check` helper process per `Repo` instance and never
-    tears it down on its own. `_rebase_or_clone_repo` builds a fresh `Repo`
-    every run_interval_seconds forever, so an unclosed one leaks one such
-    process per cycle - enough of these accumulating eventually wedges a
-    later fetch/checkout indefinitely, with no exception and no crash.
-    """
+    """Which git operations _rebase_or_clone_repo does, with git mocked out"""
 
     def setUp(self) -> None:
         self.test_dir = tempfile.TemporaryDirectory()
@@ -41,52 +36,95 @@ ansible_playbook_init=site.yaml
     def tearDown(self) -> None:
         self.test_dir.cleanup()
 
-    @patch("ansible_shed.shed.Repo")
-    def test_fetch_and_checkout_path_closes_repo(
-        self, mock_repo_cls: MagicMock
-    ) -> None:
+    def _shed_with_mock_git(self) -> tuple[Shed, AsyncMock]:
+        shed = Shed(self.config_file)
+        mock_git = AsyncMock(spec=AsyncGit)
+        mock_git.rev_parse.return_value = "a" * 40
+        shed.git = mock_git
+        return shed, mock_git
+
+    def test_fetch_and_checkout_path(self) -> None:
         self.repo_path.mkdir(parents=True)
         (self.repo_path / "site.yaml").write_text("---")
-        shed = Shed(self.config_file)
+        shed, mock_git = self._shed_with_mock_git()
 
-        mock_repo = mock_repo_cls.return_value
-        mock_repo.__enter__.return_value = mock_repo
+        asyncio.run(shed._rebase_or_clone_repo())
 
-        shed._rebase_or_clone_repo()
+        mock_git.fetch.assert_awaited_once_with(0)
+        mock_git.checkout.assert_awaited_once_with("origin/main")
+        mock_git.clone.assert_not_awaited()
+        self.assertEqual(shed.repo_head_sha, "a" * 40)
 
-        mock_repo_cls.assert_called_once_with(self.repo_path)
-        mock_repo.__enter__.assert_called_once()
-        mock_repo.__exit__.assert_called_once()
-        mock_repo.remotes.origin.fetch.assert_called_once()
-        mock_repo.remotes.origin.refs.main.checkout.assert_called_once()
+    def test_fresh_prefetch_skips_fetch(self) -> None:
+        self.repo_path.mkdir(parents=True)
+        (self.repo_path / "site.yaml").write_text("---")
+        shed, mock_git = self._shed_with_mock_git()
+        shed.git_prefetch_lead_seconds = 300
+        shed.last_fetch_epoch = time() - 400
 
-    @patch("ansible_shed.shed.Repo")
-    def test_clone_path_closes_repo(self, mock_repo_cls: MagicMock) -> None:
-        # repo_path doesn't exist and site.yaml (init_file) doesn't either,
-        # so this takes the clone_from(...) branch instead.
-        shed = Shed(self.config_file)
+        asyncio.run(shed._rebase_or_clone_repo())
+        mock_git.fetch.assert_not_awaited()
+        mock_git.checkout.assert_awaited_once_with("origin/main")
+        self.assertGreaterEqual(shed.prom_stats["git_checkout_fetch_age_seconds"], 400)
+
+        # Too old to reuse
+        shed.last_fetch_epoch = time() - 601
+        asyncio.run(shed._rebase_or_clone_repo())
+        mock_git.fetch.assert_awaited_once()
 
-        mock_repo = mock_repo_cls.clone_from.return_value
-        mock_repo.__enter__.return_value = mock_repo
+    def test_next_prefetch_wait(self) -> None:
+        shed = Shed(self.config_file)
+        shed.git_prefetch_lead_seconds = 120
+        for job_state in shed.job_states.values():
+            job_state.next_run_epoch = time() + 150
+        self.assertAlmostEqual(shed._next_prefetch_wait(), 30, delta=2)
+
+        for job_state in shed.job_states.values():
+            job_state.next_run_epoch = time() + 60
+        self.assertEqual(shed._next_prefetch_wait(), 0)
+        # Already prefetched for that run
+        shed.last_fetch_epoch = time()
+        self.assertEqual(shed._next_prefetch_wait(), 60)
+
+    def test_failed_prefetch_backs_off_without_repo_lock(self) -> None:
+        self.repo_path.mkdir(parents=True)
+        (self.repo_path / "site.yaml").write_text("---")
+        shed = Shed(self.config_file)
+        shed.git_prefetch_lead_seconds = 120
+        for job_state in shed.job_states.values():
+            job_state.next_run_epoch = time() + 60
+        prefetch_repo = AsyncMock(side_effect=RuntimeError("fetch failed"))
+        shed.prefetch_repo = prefetch_repo  # type: ignore[method-assign]
+
+        async def prefetch_once() -> None:
+            prefetcher = asyncio.create_task(shed.git_prefetcher())
+            await asyncio.sleep(0.1)
+            # Backing off until the next attempt, but runs can still check out
+            prefetch_repo.assert_awaited_once()
+            self.assertFalse(shed._repo_lock.locked())
+            prefetcher.cancel()
+
+        with self.assertLogs("ansible_shed.shed", "ERROR"):
+            asyncio.run(prefetch_once())
+
+    def test_clone_path(self) -> None:
+        # repo_path doesn't exist and site.yaml (init_file) doesn't either,
+        # so this takes the clone branch instead.
+        shed, mock_git = self._shed_with_mock_git()
+        shed.git_clone_depth = 1
 
-        shed._rebase_or_clone_repo()
+        asyncio.run(shed._rebase_or_clone_repo())
 
-        mock_repo_cls.clone_from.assert_called_once()
-        mock_repo.__enter__.assert_called_once()
-        mock_repo.__exit__.assert_called_once()
+        mock_git.clone.assert_awaited_once_with(
+            "git@github.com:test/test.git", "main", ["--depth=1"]
+        )
+        mock_git.fetch.assert_not_awaited()
+        self.assertEqual(shed.repo_head_sha, "a" * 40)
 
 
 class RealRepoIntegrationTests(unittest.TestCase):
     """Exercises _rebase_or_clone_repo against a real local git repo with
-    `git.Repo` completely unmocked.
-
-    The tests above mock `ansible_shed.shed.Repo` out entirely, so they only
-    prove our code *calls* `__enter__`/`__exit__` - they can't tell us
-    whether the real GitPython `Repo` class actually supports being used as a
-    context manager. This proves that concretely: if it didn't, this test
-    would raise `TypeError: 'Repo' object does not support the context
-    manager protocol` the moment `_rebase_or_clone_repo` ran.
-    """
+    git completely unmocked."""
 
     def setUp(self) -> None:
         self.test_dir = tempfile.TemporaryDirectory()
@@ -142,12 +180,11 @@ ansible_playbook_init=site.yaml
     def test_clone_then_fetch_and_checkout_against_real_repo(self) -> None:
         shed = Shed(self.config_file)
 
-        # repo_path doesn't exist yet -> takes the clone_from(...) path.
-        shed._rebase_or_clone_repo()
+        # repo_path doesn't exist yet -> takes the clone path.
+        asyncio.run(shed._rebase_or_clone_repo())
 
         self.assertTrue((self.repo_path / "site.yaml").exists())
-        with Repo(self.repo_path) as cloned:
-            self.assertEqual(cloned.head.commit.hexsha, self._remote_head())
+        self.assertEqual(self._local_git("rev-parse", "HEAD"), self._remote_head())
 
         # Add a second commit on the "remote" then rerun -> now init_file
         # (site.yaml) exists in repo_path, so this takes the real
@@ -156,11 +193,154 @@ ansible_playbook_init=site.yaml
         self._git("add", "site.yaml")
         self._commit("second")
 
-        shed._rebase_or_clone_repo()
+        asyncio.run(shed._rebase_or_clone_repo())
+
+        self.assertEqual(self._local_git("rev-parse", "HEAD"), self._remote_head())
+        self.assertEqual(shed.repo_head_sha, self._remote_head())
+        self.assertEqual((self.repo_path / "site.yaml").read_text(), "---\n# v2\n")
+
+    def test_prefetch_then_checkout_against_real_repo(self) -> None:
+        shed = Shed(self.config_file)
+        shed.git_prefetch_lead_seconds = 300
+        asyncio.run(shed._rebase_or_clone_repo())
+        (self.remote_path / "site.yaml").write_text("---\n# v2\n")
+        self._git("add", "site.yaml")
+        self._commit("second")
+        second_sha = self._remote_head()
+
+        asyncio.run(shed.prefetch_repo())
+        # The checkout jobs run from is untouched by the prefetch
+        self.assertEqual((self.repo_path / "site.yaml").read_text(), "---\n# v1\n")
+
+        # Commits after the prefetch wait for the next fetch
+        (self.remote_path / "site.yaml").write_text("---\n# v3\n")
+        self._git("add", "site.yaml")
+        self._commit("third")
+
+        asyncio.run(shed._rebase_or_clone_repo())
+        self.assertEqual(shed.repo_head_sha, second_sha)
+        self.assertEqual((self.repo_path / "site.yaml").read_text(), "---\n# v2\n")
+
+    def _local_git(self, *args: str) -> str:
+        return subprocess.run(
+            ["git", *args],
+            cwd=self.repo_path,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+
+    def test_shallow_partial_clone(self) -> None:
+        (self.remote_path / "site.yaml").write_text("---\n# v2\n")
+        self._git("add", "site.yaml")
+        self._commit("second")
+        self._git("config", "uploadpack.allowFilter", "true")
+
+        shed = Shed(self.config_file)
+        # --depth is ignored for plain path clones
+        shed.repo_url = f"file://{self.remote_path}"
+        shed.git_clone_depth = 1
+        shed.git_clone_filter = "blob:none"
+        asyncio.run(shed._rebase_or_clone_repo())
+
+        self.assertEqual(self._local_git("rev-list", "--count", "HEAD"), "1")
+        self.assertEqual(
+            self._local_git("config", "remote.origin.partialclonefilter"),
+            "blob:none",
+        )
+        self.assertGreater(shed.prom_stats["git_clone_bytes"], 0)
+
+        (self.remote_path / "site.yaml").write_text("---\n# v3\n")
+        self._git("add", "site.yaml")
+        self._commit("third")
+        asyncio.run(shed._rebase_or_clone_repo())
+        self.assertEqual(shed.repo_head_sha, self._remote_head())
+        self.assertEqual(self._local_git("rev-list", "--count", "HEAD"), "1")
+
+    def test_recovers_in_place(self) -> None:
+        shed = Shed(self.config_file)
+        asyncio.run(shed._rebase_or_clone_repo())
+        # Only survives if .git isn't thrown away
+        (self.repo_path / ".git" / "ansible_shed_marker").touch()
+        (self.repo_path / "site.yaml").unlink()
+        (self.repo_path / "stray.txt").write_text("stray")
+        (self.remote_path / "site.yaml").write_text("---\n# v2\n")
+        self._git("add", "site.yaml")
+        self._commit("second")
 
-        with Repo(self.repo_path) as updated:
-            self.assertEqual(updated.head.commit.hexsha, self._remote_head())
+        asyncio.run(shed._rebase_or_clone_repo())
         self.assertEqual((self.repo_path / "site.yaml").read_text(), "---\n# v2\n")
+        self.assertFalse((self.repo_path / "stray.txt").exists())
+        self.assertTrue((self.repo_path / ".git" / "ansible_shed_marker").exists())
+        self.assertEqual(shed.repo_head_sha, self._remote_head())
+        self.assertIn("git_recovery_duration_seconds", shed.prom_stats)
+        self.assertGreater(shed.prom_stats["git_recovery_bytes"], 0)
+
+    def test_unrecoverable_repo_is_recloned(self) -> None:
+        self.repo_path.mkdir()
+        (self.repo_path / "stray.txt").write_text("not a git repo")
+        shed = Shed(self.config_file)
+        asyncio.run(shed._rebase_or_clone_repo())
+        self.assertFalse((self.repo_path / "stray.txt").exists())
+        self.assertEqual(shed.repo_head_sha, self._remote_head())
+        self.assertNotIn("git_recovery_duration_seconds", shed.prom_stats)
+        self.assertIn("git_clone_duration_seconds", shed.prom_stats)
+
+    def _new_remote_commit(self, content: str) -> str:
+        (self.remote_path / "site.yaml").write_text(content)
+        self._git("add", "site.yaml")
+        self._commit(content)
+        return self._remote_head()
+
+    def test_worktree_checkouts(self) -> None:
+        self.config_file.write_text(
+            self.config_file.read_text() + "git_worktrees=true\n"
+        )
+        shed = Shed(self.config_file)
+        asyncio.run(shed._rebase_or_clone_repo())
+        first = shed.worktrees_dir / self._remote_head()
+        self.assertEqual(shed.checkout_path, first)
+        self.assertEqual(shed.current_checkout_link.resolve(), first.resolve())
+        self.assertEqual((first / "site.yaml").read_text(), "---\n# v1\n")
+
+        # A running job keeps its worktree through swaps
+        job_state = shed.job_states["default"]
+        job_state.checkout_path = first
+        second_sha = self._new_remote_commit("---\n# v2\n")
+        asyncio.run(shed._rebase_or_clone_repo())
+        second = shed.worktrees_dir / second_sha
+        self.assertEqual(shed.checkout_path, second)
+        self.assertEqual(shed.current_checkout_link.resolve(), second.resolve())
+        self.assertEqual((first / "site.yaml").read_text(), "---\n# v1\n")
+        self.assertEqual((second / "site.yaml").read_text(), "---\n# v2\n")
+        self.assertEqual(shed._job_checkout("default"), first)
+        self.assertEqual(shed.prom_stats["git_worktrees"], 2)
+
+        # Once it finishes the old worktree is garbage collected
+        job_state.checkout_path = None
+        third_sha = self._new_remote_commit("---\n# v3\n")
+        asyncio.run(shed._rebase_or_clone_repo())
+        self.assertEqual(
+            sorted(p.name for p in shed.worktrees_dir.iterdir()), [third_sha]
+        )
+        self.assertEqual(shed.prom_stats["git_worktrees"], 1)
+
+        async def export() -> str:
+            exporter = asyncio.create_task(shed._update_prom_stats())
+            shed.prom_stats_update.set()
+            await asyncio.sleep(0.05)
+            self.assertFalse(exporter.done())
+            exporter.cancel()
+            return render(shed.prom_registry, [])[0].decode()
+
+        shed.prom_registry = Registry()
+        self.assertIn("git_worktrees 1", asyncio.run(export()))
+        # repo_path itself is never checked out past the clone
+        self.assertEqual((self.repo_path / "site.yaml").read_text(), "---\n# v1\n")
+
+        # Picks the current worktree back up on restart
+        restarted = Shed(self.config_file)
+        self.assertEqual(restarted.checkout_path, shed.worktrees_dir / third_sha)
 
 
 if __name__ == "__main__":  # pragma: no cover
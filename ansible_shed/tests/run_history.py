@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from time import time
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from ansible_shed.host_stats import HostStats
+from ansible_shed.run_history import percentile, RunHistory, RunRecord
+from ansible_shed.shed import Shed
+
+API_HEADERS = {"X-API-Token": "test-token"}
+
+
+def _run(run_id: str, start: float, duration: float, job: str = "default") -> RunRecord:
+    return RunRecord(
+        run_id=run_id,
+        job=job,
+        sha="abc123",
+        start=start,
+        end=start + duration,
+        returncode=0,
+        hosts={"web_1": HostStats(ok=3, changed=1)},
+        tasks=[("common", "common : Install chrony", duration / 2)],
+    )
+
+
+class RunHistoryTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.test_dir.name) / "history" / "runs.sqlite"
+        self.history = RunHistory(self.db_path, max_runs=3, max_age_seconds=3600)
+
+    def tearDown(self) -> None:
+        self.history.close()
+        self.test_dir.cleanup()
+
+    def test_percentile(self) -> None:
+        values = [float(v) for v in range(1, 101)]
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile([7.0], 95), 7)
+        self.assertEqual(percentile([], 50), 0)
+
+    def test_record_and_retention(self) -> None:
+        now = time()
+        self.history.record(_run("ancient", now - 7200, 10)).result()
+        for idx in range(4):
+            self.history.record(_run(f"run{idx}", now - 100 + idx, 10 * (idx + 1)))
+        self.history.record(_run("other", now, 5, job="zfs")).result()
+
+        runs = self.history.submit(self.history.list_runs).result()
+        self.assertEqual([r["run_id"] for r in runs], ["other", "run3", "run2"])
+        zfs_runs = self.history.submit(self.history.list_runs, "zfs").result()
+        self.assertEqual([r["run_id"] for r in zfs_runs], ["other"])
+        # Deleting runs cascades to their hosts and tasks
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(
+                conn.execute("SELECT COUNT(*) FROM run_tasks").fetchone()[0], 3
+            )
+            self.assertEqual(
+                conn.execute("PRAGMA journal_mode").fetchone()[0].lower(), "wal"
+            )
+
+        run = self.history.submit(self.history.get_run, "run3").result()
+        assert run is not None
+        self.assertEqual(run["duration"], 40)
+        self.assertEqual(run["sha"], "abc123")
+        self.assertEqual(
+            run["hosts"],
+            {
+                "web_1": {
+                    "ok": 3,
+                    "changed": 1,
+                    "unreachable": 0,
+                    "failed": 0,
+                    "skipped": 0,
+                    "rescued": 0,
+                    "ignored": 0,
+                }
+            },
+        )
+        self.assertEqual(
+            run["tasks"],
+            [{"role": "common", "task": "common : Install chrony", "seconds": 20}],
+        )
+        self.assertIsNone(self.history.submit(self.history.get_run, "run0").result())
+
+    def test_summary(self) -> None:
+        now = time()
+        for idx, duration in enumerate((10, 20, 30)):
+            self.history.record(_run(f"run{idx}", now - 10 + idx, duration))
+        summary = self.history.submit(self.history.summary, "default").result()
+        self.assertEqual(summary["runs"], 3)
+        self.assertEqual(summary["duration"], {"p50": 20, "p95": 30, "max": 30})
+        self.assertEqual(
+            summary["tasks"],
+            [
+                {
+                    "role": "common",
+                    "task": "common : Install chrony",
+                    "runs": 3,
+                    "p50": 10,
+                    "p95": 15,
+                    "max": 15,
+                }
+            ],
+        )
+        empty = self.history.submit(self.history.summary, "zfs").result()
+        self.assertEqual(empty["duration"], {"p50": 0, "p95": 0, "max": 0})
+
+
+class ShedRunHistoryTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.test_path = Path(self.test_dir.name)
+        fake_ansible = self.test_path / "ansible-playbook"
+        fake_ansible.write_text(
+            "#!/bin/sh\necho 'TASK [x] ****'\n"
+            "echo 'web_1 : ok=2    changed=1    failed=0'\n"
+            "echo 'TASKS RECAP ****'\n"
+            "echo 'common : Install chrony ------------ 7.00s'\n"
+            "echo 'users : Add ------------ 1.00s'\nexit 2\n"
+        )
+        fake_ansible.chmod(0o755)
+        self.config_file = self.test_path / "test_config.ini"
+        self.config_file.write_text(f"""[ansible_shed]
+interval=60
+port=12345
+repo_path={self.test_path}
+repo_url=git@github.com:test/test.git
+repo_key={self.test_path / "key"}
+ansible_playbook_binary={fake_ansible}
+ansible_hosts_inventory=hosts
+ansible_playbook_init=site.yaml
+api_token=test-token
+run_history_db={self.test_path / "runs.sqlite"}
+profile_tasks_top_n=1
+""")
+        self.shed = Shed(self.config_file)
+        self.client = TestClient(TestServer(self.shed._api_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self) -> None:
+        await self.client.close()
+        assert self.shed.run_history is not None
+        self.shed.run_history.close()
+        self.test_dir.cleanup()
+
+    async def test_runs_api(self) -> None:
+        self.shed.repo_head_sha = "abc123"
+        await self.shed._run_ansible()
+
+        resp = await self.client.get("/runs")
+        self.assertEqual(resp.status, 401)
+        resp = await self.client.get("/runs", headers=API_HEADERS)
+        body = await resp.json()
+        (run,) = body["runs"]
+        self.assertEqual((run["job"], run["returncode"]), ("default", 2))
+        self.assertEqual(run["sha"], "abc123")
+        self.assertEqual(body["summary"]["runs"], 1)
+
+        resp = await self.client.get(f"/runs/{run['run_id']}", headers=API_HEADERS)
+        run_detail = await resp.json()
+        self.assertEqual(
+            run_detail["hosts"]["web_1"],
+            {
+                "ok": 2,
+                "changed": 1,
+                "unreachable": 0,
+                "failed": 0,
+                "skipped": 0,
+                "rescued": 0,
+                "ignored": 0,
+            },
+        )
+        # Every task is recorded, not only the top profile_tasks_top_n
+        self.assertEqual(
+            run_detail["tasks"],
+            [
+                {"role": "common", "task": "Install chrony", "seconds": 7.0},
+                {"role": "users", "task": "Add", "seconds": 1.0},
+            ],
+        )
+        resp = await self.client.get("/runs/nope", headers=API_HEADERS)
+        self.assertEqual(resp.status, 404)
+        resp = await self.client.get(
+            "/runs", params={"limit": "0"}, headers=API_HEADERS
+        )
+        self.assertEqual(resp.status, 400)
+        resp = await self.client.get(
+            "/runs", params={"job": "zfs", "window": "60"}, headers=API_HEADERS
+        )
+        self.assertEqual((await resp.json())["runs"], [])
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
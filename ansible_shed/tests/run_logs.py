@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+import asyncio
+import gzip
+import lzma
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from time import time
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from ansible_shed.run_logs import RetentionPolicy, RunLogEntry, RunLogStore
+from ansible_shed.shed import Shed
+
+
+class RunLogStoreTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.log_dir = Path(self.test_dir.name)
+        self.latest = self.log_dir / "latest.log"
+
+    def tearDown(self) -> None:
+        self.test_dir.cleanup()
+
+    def _finish(
+        self, store: RunLogStore, run_id: str, start: float, policy: RetentionPolicy
+    ) -> None:
+        log_path = self.log_dir / f"{run_id}.log"
+        log_path.write_text(f"{run_id} output\n" * 100)
+        if self.latest.is_symlink():
+            self.latest.unlink()
+        self.latest.symlink_to(log_path)
+        store.submit(
+            RunLogEntry(run_id, "default", log_path.name, start, start + 1, 0), policy
+        ).result()
+
+    def test_existing_logs_indexed_once(self) -> None:
+        (self.log_dir / "ansible_shed_run_20250101000000.log").write_text("a\n")
+        (self.log_dir / "ansible_shed_run_zfs_20250101000000.log.gz").write_bytes(
+            gzip.compress(b"b\n")
+        )
+        store = RunLogStore(self.log_dir, self.latest)
+        store.flush()
+        entries = store.load_index()
+        self.assertEqual(
+            sorted((e.run_id, e.job) for e in entries),
+            [
+                ("ansible_shed_run_20250101000000", "default"),
+                ("ansible_shed_run_zfs_20250101000000", "zfs"),
+            ],
+        )
+        found = store.find("ansible_shed_run_20250101000000")
+        assert found is not None
+        self.assertEqual(found.size_bytes, 2)
+
+    def test_compress_all_but_latest(self) -> None:
+        store = RunLogStore(self.log_dir, self.latest)
+        policy = RetentionPolicy(compression="xz")
+        self._finish(store, "ansible_shed_run_1", 1, policy)
+        self._finish(store, "ansible_shed_run_2", 2, policy)
+
+        first, second = store.load_index()
+        self.assertEqual(first.log_name, "ansible_shed_run_1.log.xz")
+        self.assertLess(first.stored_bytes, first.size_bytes)
+        self.assertEqual(
+            lzma.decompress((self.log_dir / first.log_name).read_bytes()),
+            b"ansible_shed_run_1 output\n" * 100,
+        )
+        self.assertFalse((self.log_dir / "ansible_shed_run_1.log").exists())
+        self.assertEqual(
+            store.log_path("ansible_shed_run_1"),
+            self.log_dir / "ansible_shed_run_1.log.xz",
+        )
+        self.assertIsNone(store.log_path("ansible_shed_run_0"))
+        # latest.log still points at an uncompressed log
+        self.assertEqual(second.log_name, "ansible_shed_run_2.log")
+        self.assertTrue(self.latest.read_text().startswith("ansible_shed_run_2"))
+
+    def test_retention(self) -> None:
+        store = RunLogStore(self.log_dir, self.latest)
+        now = time()
+        for i in range(5):
+            self._finish(store, f"ansible_shed_run_{i}", now + i, RetentionPolicy())
+        self._finish(store, "ansible_shed_run_5", now + 5, RetentionPolicy(max_count=3))
+        self.assertEqual(
+            [e.run_id for e in store.load_index()],
+            ["ansible_shed_run_3", "ansible_shed_run_4", "ansible_shed_run_5"],
+        )
+        self.assertEqual(
+            sorted(p.name for p in self.log_dir.glob("ansible_shed_run_*")),
+            [
+                "ansible_shed_run_3.log",
+                "ansible_shed_run_4.log",
+                "ansible_shed_run_5.log",
+            ],
+        )
+
+        # Each log is 2500 bytes
+        self._finish(
+            store, "ansible_shed_run_6", now + 6, RetentionPolicy(max_bytes=6000)
+        )
+        self.assertEqual(len(store.load_index()), 2)
+
+        # The latest log survives even when it is too old...
+        max_age = RetentionPolicy(max_age_seconds=60)
+        self._finish(store, "ansible_shed_run_7", now - 7200, max_age)
+        self.assertIn("ansible_shed_run_7", [e.run_id for e in store.load_index()])
+        # ...until it no longer is the latest
+        self._finish(store, "ansible_shed_run_8", now + 8, max_age)
+        self.assertEqual(
+            [e.run_id for e in store.load_index()],
+            ["ansible_shed_run_5", "ansible_shed_run_6", "ansible_shed_run_8"],
+        )
+
+
+class ShedRunLogTests(unittest.TestCase):
+    def test_runs_are_indexed(self) -> None:
+        with tempfile.TemporaryDirectory() as test_dir:
+            test_path = Path(test_dir)
+            fake_ansible = test_path / "ansible-playbook"
+            fake_ansible.write_text("#!/bin/sh\necho 'TASK [x] ****'\nexit 2\n")
+            fake_ansible.chmod(0o755)
+            config_file = test_path / "test_config.ini"
+            config_file.write_text(f"""[ansible_shed]
+interval=60
+port=12345
+log_dir={test_path / "logs"}
+log_compression=gzip
+log_retention_count=10
+repo_path={test_path}
+repo_url=git@github.com:test/test.git
+repo_key={test_path / "key"}
+ansible_playbook_binary={fake_ansible}
+ansible_hosts_inventory=hosts
+ansible_playbook_init=site.yaml
+""")
+            shed = Shed(config_file)
+            asyncio.run(shed._run_ansible())
+            assert shed.run_logs is not None
+            shed.run_logs.flush()
+
+            (entry,) = shed.run_logs.load_index()
+            self.assertEqual(entry.returncode, 2)
+            self.assertEqual(entry.job, "default")
+            self.assertEqual(entry.size_bytes, len("TASK [x] ****\n"))
+            latest = test_path / "logs" / "latest.log"
+            self.assertEqual(
+                os.readlink(latest), str(test_path / "logs" / entry.log_name)
+            )
+
+
+class RunLogDownloadTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.test_path = Path(self.test_dir.name)
+        self.log_dir = self.test_path / "logs"
+        self.config_file = self.test_path / "test_config.ini"
+        self.config_file.write_text(f"""[ansible_shed]
+interval=60
+port=12345
+log_dir={self.log_dir}
+repo_path={self.test_path}
+repo_url=git@github.com:test/test.git
+repo_key={self.test_path / "key"}
+ansible_hosts_inventory=hosts
+ansible_playbook_init=site.yaml
+api_token=test-token
+""")
+        self.shed = Shed(self.config_file)
+        self.output = b"".join(f"line {i}\n".encode() for i in range(1000))
+        for run_id, log_name, data in (
+            ("plain", "plain.log", self.output),
+            ("gz", "gz.log.gz", gzip.compress(self.output)),
+            ("xz", "xz.log.xz", lzma.compress(self.output)),
+        ):
+            (self.log_dir / log_name).write_bytes(data)
+            assert self.shed.run_logs is not None
+            self.shed.run_logs.submit(
+                RunLogEntry(run_id, "default", log_name, 1, 2, 0), RetentionPolicy()
+            ).result()
+        self.client = TestClient(TestServer(self.shed._api_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self) -> None:
+        await self.client.close()
+        self.test_dir.cleanup()
+
+    async def _get(
+        self, run_id: str, **headers: str
+    ) -> tuple[int, bytes, dict[str, str]]:
+        resp = await self.client.get(
+            f"/runs/{run_id}/log",
+            headers={"X-API-Token": "test-token", **headers},
+            auto_decompress=False,
+        )
+        return resp.status, await resp.read(), dict(resp.headers)
+
+    async def test_plain_and_range(self) -> None:
+        resp = await self.client.get("/runs/plain/log")
+        self.assertEqual(resp.status, 401)
+        status, _, _ = await self._get("nope")
+        self.assertEqual(status, 404)
+
+        status, body, headers = await self._get("plain")
+        self.assertEqual((status, body), (200, self.output))
+        self.assertEqual(headers["Content-Type"], "text/plain; charset=utf-8")
+        self.assertEqual(headers["Accept-Ranges"], "bytes")
+
+        status, body, headers = await self._get("plain", Range="bytes=7-13")
+        self.assertEqual((status, body), (206, b"line 1\n"))
+        self.assertEqual(headers["Content-Range"], f"bytes 7-13/{len(self.output)}")
+        status, body, _ = await self._get("plain", Range="bytes=-9")
+        self.assertEqual((status, body), (206, b"line 999\n"))
+
+    async def test_compressed_sent_as_stored(self) -> None:
+        status, body, headers = await self._get("gz", **{"Accept-Encoding": "gzip"})
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertEqual(headers["Content-Type"], "text/plain; charset=utf-8")
+        self.assertEqual(gzip.decompress(body), self.output)
+        stored = (self.log_dir / "gz.log.gz").read_bytes()
+        status, body, _ = await self._get(
+            "gz", **{"Accept-Encoding": "gzip", "Range": "bytes=0-9"}
+        )
+        self.assertEqual((status, body), (206, stored[:10]))
+
+        status, body, headers = await self._get("gz", **{"Accept-Encoding": "identity"})
+        self.assertEqual(body, stored)
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertEqual(headers["Content-Type"], "application/gzip")
+        self.assertIn('filename="gz.log.gz"', headers["Content-Disposition"])
+        _, body, headers = await self._get("gz", **{"Accept-Encoding": "gzip;q=0"})
+        self.assertEqual(body, stored)
+        self.assertNotIn("Content-Encoding", headers)
+
+        status, body, headers = await self._get("xz", **{"Accept-Encoding": "gzip"})
+        self.assertEqual(lzma.decompress(body), self.output)
+        self.assertEqual(headers["Content-Type"], "application/x-xz")
+        self.assertNotIn("Content-Encoding", headers)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+import asyncio
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from aioprometheus.collectors import Counter, Gauge, Histogram, Registry
+
+from ansible_shed.output_parser import AnsibleOutputParser
+from ansible_shed.self_metrics import CountingExecutor, read_proc_self_stat, SelfMetrics
+from ansible_shed.shed import Shed
+
+
+class SelfMetricsTests(unittest.IsolatedAsyncioTestCase):
+    def test_timed_and_drain(self) -> None:
+        self_metrics = SelfMetrics()
+        with self_metrics.timed("parse"):
+            pass
+        with self.assertRaises(ValueError):
+            with self_metrics.timed("parse"):
+                raise ValueError("still timed")
+        self_metrics.observe("parse", 0.5)
+        histogram = Histogram("test_seconds", "test", registry=Registry())
+        self_metrics.drain(histogram)
+        self.assertEqual(histogram.get({"operation": "parse"})["count"], 3)
+        self_metrics.drain(histogram)
+        self.assertEqual(histogram.get({"operation": "parse"})["count"], 3)
+
+        disabled = SelfMetrics(enabled=False)
+        with disabled.timed("parse"):
+            pass
+        disabled.drain(histogram)
+        self.assertEqual(histogram.get({"operation": "parse"})["count"], 3)
+
+    def test_counting_executor(self) -> None:
+        executor = CountingExecutor(max_workers=1)
+        release = threading.Event()
+        try:
+            blocked = executor.submit(release.wait, 5)
+            queued = [executor.submit(divmod, 7, n) for n in (1, 2)]
+            self.assertEqual(executor.queue_depth(), 2)
+            release.set()
+            self.assertTrue(blocked.result(5))
+            self.assertEqual([f.result(5) for f in queued], [(7, 0), (3, 1)])
+            self.assertEqual(executor.queue_depth(), 0)
+        finally:
+            release.set()
+            executor.shutdown()
+        with self.assertRaises(RuntimeError):
+            executor.submit(divmod, 7, 2)
+        self.assertEqual(executor.queue_depth(), 0)
+
+    def test_read_proc_self_stat(self) -> None:
+        proc_stat = read_proc_self_stat()
+        if proc_stat is None:  # pragma: no cover
+            self.skipTest("No /proc on this platform")
+        cpu_seconds, rss_bytes = proc_stat
+        self.assertGreater(rss_bytes, 0)
+        self.assertGreaterEqual(cpu_seconds, 0)
+        with patch("ansible_shed.self_metrics.PROC_SELF_STAT", Path("/nonexistent")):
+            self.assertIsNone(read_proc_self_stat())
+
+    async def test_run(self) -> None:
+        registry = Registry()
+        self_metrics = SelfMetrics()
+        updates = asyncio.Event()
+        with self_metrics.timed("parse"):
+            pass
+        task = asyncio.create_task(
+            self_metrics.run(
+                registry,
+                0.01,
+                executor_queue_depth=lambda: 3,
+                on_update=updates.set,
+            )
+        )
+        await asyncio.wait_for(updates.wait(), 5)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        gauges = {c.name: c for c in registry.get_all() if isinstance(c, Gauge)}
+        self.assertEqual(gauges["ansible_shed_executor_queue_depth"].get({}), 3)
+        lag = gauges["ansible_shed_event_loop_lag_seconds"].get({})
+        assert isinstance(lag, float)
+        self.assertGreaterEqual(lag, 0)
+        (histogram,) = (c for c in registry.get_all() if isinstance(c, Histogram))
+        self.assertEqual(histogram.name, "ansible_shed_operation_duration_seconds")
+        self.assertEqual(histogram.get({"operation": "parse"})["count"], 1)
+        if read_proc_self_stat() is not None:
+            rss = gauges["ansible_shed_resident_memory_bytes"].get({})
+            assert isinstance(rss, int)
+            self.assertGreater(rss, 0)
+            (cpu,) = (c for c in registry.get_all() if isinstance(c, Counter))
+            self.assertEqual(cpu.name, "ansible_shed_cpu_seconds_total")
+
+    def _shed(self, extra_config: str = "") -> Shed:
+        with tempfile.TemporaryDirectory() as test_dir:
+            test_path = Path(test_dir)
+            config_file = test_path / "test_config.ini"
+            config_file.write_text(f"""[ansible_shed]
+interval=60
+port=12345
+repo_path={test_path / "repo"}
+repo_url=git@github.com:test/test.git
+repo_key={test_path / "key"}
+ansible_hosts_inventory=hosts
+ansible_playbook_init=site.yaml
+{extra_config}""")
+            return Shed(config_file)
+
+    def test_parse_time_is_feed_time(self) -> None:
+        shed = self._shed()
+        shards = [AnsibleOutputParser(), AnsibleOutputParser()]
+        for shard in shards:
+            shard.feed("TASK [role : task] ****\nweb_1 : ok=1 changed=0\n")
+        parser = AnsibleOutputParser()
+        for shard in shards:
+            parser.merge(shard)
+        self.assertEqual(
+            parser.feed_seconds, shards[0].feed_seconds + shards[1].feed_seconds
+        )
+        self.assertGreater(parser.feed_seconds, 0)
+        shed.parse_ansible_stats(parser, 0)
+        self.assertEqual(
+            list(shed.self_metrics._pending),
+            [("parse_ansible_stats", parser.feed_seconds)],
+        )
+
+    def test_shed_config(self) -> None:
+        shed = self._shed("self_metrics=false\nself_metrics_interval=0\n")
+        self.assertFalse(shed.self_metrics.enabled)
+        self.assertEqual(shed.self_metrics_interval_seconds, 1)
+        shed.parse_ansible_stats("", 0)
+        self.assertEqual(len(shed.self_metrics._pending), 0)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+from ansible_shed.output_parser import AnsibleOutputParser
+from ansible_shed.sharding import dedupe_shards, hash_shards, parse_list_hosts
+from ansible_shed.shed import Shed
+
+LIST_HOSTS_OUTPUT = """\
+  hosts (3):
+    host1.example.com
+    host2.example.com
+    host3.example.com
+"""
+
+# Prints a PLAY RECAP line for every host in the --limit @file it was given
+FAKE_ANSIBLE_PLAYBOOK = """\
+#!/bin/sh
+while [ $# -gt 0 ]; do
+  if [ "$1" = "--limit" ]; then
+    limit_file="${2#@}"
+  fi
+  shift
+done
+echo "TASK [Gathering Facts] ****"
+echo "PLAY RECAP ****"
+while read -r host; do
+  echo "$host : ok=3    changed=1    unreachable=0    failed=0"
+done < "$limit_file"
+"""
+
+FAKE_ANSIBLE = """\
+#!/bin/sh
+echo "  hosts (4):"
+echo "    a.example.com"
+echo "    b.example.com"
+echo "    c.example.com"
+echo "    d.example.com"
+"""
+
+
+class ShardingTests(unittest.TestCase):
+    def test_parse_list_hosts(self) -> None:
+        self.assertEqual(
+            parse_list_hosts(LIST_HOSTS_OUTPUT),
+            ["host1.example.com", "host2.example.com", "host3.example.com"],
+        )
+        self.assertEqual(parse_list_hosts("  hosts (0):\n"), [])
+
+    def test_hash_shards_stable_and_complete(self) -> None:
+        hosts = [f"host{i}.example.com" for i in range(50)]
+        shards = hash_shards(hosts, 4)
+        self.assertEqual(sorted(h for shard in shards for h in shard), sorted(hosts))
+        self.assertEqual(shards, hash_shards(reversed(hosts), 4))
+        self.assertEqual(hash_shards(["only.example.com"], 4), [["only.example.com"]])
+
+    def test_merge_overlapping_tasks(self) -> None:
+        shards = []
+        for seconds, extra_row in (
+            (5.0, "common : Only here ---------- 2.00s\n"),
+            (7.0, ""),
+        ):
+            shard = AnsibleOutputParser(profile_tasks_top_n=3, keep_task_runtimes=True)
+            shard.feed(
+                "TASK [common : Install chrony] ****\n"
+                "TASK [users : Add] ****\n"
+                "[WARNING]: slow host\n"
+                "TASKS RECAP ****\n"
+                f"common : Install chrony ---------- {seconds:.2f}s\n"
+                f"{extra_row}"
+                "users : Add ---------- 1.00s\n"
+            )
+            shards.append(shard)
+
+        merged = AnsibleOutputParser(profile_tasks_top_n=2, keep_task_runtimes=True)
+        for shard in shards:
+            merged.merge(shard)
+        self.assertEqual(
+            merged.top_task_runtimes(),
+            [("common", "Install chrony", 7.0), ("common", "Only here", 2.0)],
+        )
+        self.assertEqual(
+            merged.task_runtimes,
+            [
+                ("common", "Install chrony", 7.0),
+                ("common", "Only here", 2.0),
+                ("users", "Add", 1.0),
+            ],
+        )
+        self.assertEqual(merged.task_count, 2)
+        self.assertEqual(merged.warnings_count, 2)
+
+    def test_dedupe_shards(self) -> None:
+        self.assertEqual(
+            dedupe_shards([["a", "b"], ["b", "c"], ["a"], ["a", "b", "c", "d"]]),
+            [["a", "b"], ["c"], ["d"]],
+        )
+
+
+class ShardedRunTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.test_path = Path(self.test_dir.name)
+        bin_path = self.test_path / "bin"
+        bin_path.mkdir()
+        for name, script in (
+            ("ansible-playbook", FAKE_ANSIBLE_PLAYBOOK),
+            ("ansible", FAKE_ANSIBLE),
+        ):
+            (bin_path / name).write_text(script)
+            (bin_path / name).chmod(0o755)
+        self.config_file = self.test_path / "test_config.ini"
+        self.config_file.write_text(f"""[ansible_shed]
+interval=60
+port=12345
+log_dir={self.test_path / "logs"}
+repo_path={self.test_path}
+repo_url=git@github.com:test/test.git
+repo_key={self.test_path / "key"}
+ansible_playbook_binary={bin_path / "ansible-playbook"}
+ansible_hosts_inventory=hosts
+ansible_playbook_init=site.yaml
+shard_mode=hash
+shards=3
+shard_concurrency=2
+""")
+
+    def tearDown(self) -> None:
+        self.test_dir.cleanup()
+
+    def test_sharded_run_merges_host_stats(self) -> None:
+        shed = Shed(self.config_file)
+        returncode, parser = asyncio.run(shed._run_ansible())
+
+        self.assertEqual(returncode, 0)
+        self.assertEqual(
+            sorted(parser.host_stats),
+            ["a.example.com", "b.example.com", "c.example.com", "d.example.com"],
+        )
+        self.assertEqual(parser.host_stats["c.example.com"]["changed"], 1)
+        shard_count = len(hash_shards(parser.host_stats, 3))
+        # Every shard runs the same one task
+        self.assertEqual(parser.task_count, 1)
+        self.assertEqual(shed.prom_stats["ansible_last_run_shards"], shard_count)
+        log_contents = (self.test_path / "logs" / "latest.log").read_text()
+        self.assertIn("[shard 0] PLAY RECAP", log_contents)
+
+    def test_explicit_shards_dedupe(self) -> None:
+        shed = Shed(self.config_file)
+        shed.shard_mode = "explicit"
+        shed.shard_limits = ["web", "db"]
+        # The fake `ansible` returns every host for every pattern, so the
+        # second shard is fully claimed by the first and dropped
+        shards = asyncio.run(shed._resolve_shards(shed.default_job))
+        self.assertEqual(len(shards), 1)
+        self.assertEqual(len(shards[0]), 4)
+
+    def test_sharding_disabled_by_default(self) -> None:
+        shed = Shed(self.config_file)
+        shed.shard_mode = "none"
+        self.assertEqual(asyncio.run(shed._resolve_shards(shed.default_job)), [])
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
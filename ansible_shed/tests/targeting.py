@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+import asyncio
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from time import time
+
+from ansible_shed.jobs import DEFAULT_JOB_NAME, JobConfig
+from ansible_shed.shed import Shed
+from ansible_shed.targeting import (
+    convention_target,
+    load_target_rules,
+    narrow_job,
+    resolve_target,
+    Target,
+)
+
+TARGET_MAP = """\
+[docs/*]
+ignore=true
+
+[inventory/webservers.yaml]
+limit=webservers
+
+[playbooks/zfs.yaml]
+tags=zfs
+limit=nas.example.com
+"""
+
+
+class TargetingTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.map_file = Path(self.test_dir.name) / "targets.ini"
+        self.map_file.write_text(TARGET_MAP)
+        self.rules = load_target_rules(self.map_file)
+        self.job = JobConfig(
+            name=DEFAULT_JOB_NAME,
+            playbook="site.yaml",
+            inventory="hosts",
+            interval_seconds=3600,
+        )
+
+    def tearDown(self) -> None:
+        self.test_dir.cleanup()
+
+    def test_convention_target(self) -> None:
+        self.assertEqual(
+            convention_target("roles/chrony/tasks/main.yaml"),
+            Target(tags=frozenset({"chrony"})),
+        )
+        self.assertEqual(
+            convention_target("inventory/host_vars/nas.example.com.yaml"),
+            Target(limits=frozenset({"nas.example.com"})),
+        )
+        self.assertEqual(
+            convention_target("group_vars/webservers/vars.yaml"),
+            Target(limits=frozenset({"webservers"})),
+        )
+        self.assertIsNone(convention_target("group_vars/all.yaml"))
+        self.assertIsNone(convention_target("site.yaml"))
+
+    def test_resolve_target(self) -> None:
+        target, unmapped = resolve_target(
+            ["roles/chrony/tasks/main.yaml", "roles/zfs/files/x", "docs/README.md"],
+            self.rules,
+        )
+        self.assertEqual(unmapped, [])
+        self.assertEqual(target, Target(tags=frozenset({"chrony", "zfs"})))
+
+        # Tags for all hosts + every tag for some hosts covers everything
+        target, _ = resolve_target(
+            ["roles/chrony/tasks/main.yaml", "inventory/webservers.yaml"], self.rules
+        )
+        self.assertTrue(target.is_full)
+
+        target, _ = resolve_target(["docs/README.md"], self.rules)
+        self.assertTrue(target.is_empty)
+
+        _, unmapped = resolve_target(["site.yaml", "docs/a.md"], self.rules)
+        self.assertEqual(unmapped, ["site.yaml"])
+
+    def test_narrow_job(self) -> None:
+        narrowed = narrow_job(
+            self.job, Target(tags=frozenset({"zfs"}), limits=frozenset({"nas"}))
+        )
+        assert narrowed is not None
+        self.assertEqual((narrowed.tags, narrowed.limit), ("zfs", "nas"))
+
+        tagged_job = JobConfig(
+            name="networkd",
+            playbook="site.yaml",
+            inventory="hosts",
+            interval_seconds=300,
+            tags="networkd",
+        )
+        self.assertIsNone(narrow_job(tagged_job, Target(tags=frozenset({"zfs"}))))
+        self.assertEqual(
+            narrow_job(tagged_job, Target(limits=frozenset({"web"}))),
+            JobConfig(
+                name="networkd",
+                playbook="site.yaml",
+                inventory="hosts",
+                interval_seconds=300,
+                tags="networkd",
+                limit="web",
+            ),
+        )
+
+
+class TargetedRunTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.repo_path = Path(self.test_dir.name) / "repo"
+        (self.repo_path / "roles" / "chrony" / "tasks").mkdir(parents=True)
+        (self.repo_path / "site.yaml").write_text("---\n")
+        (self.repo_path / "targets.ini").write_text(TARGET_MAP)
+        self._git("init", "-q", "-b", "main")
+        self.base_sha = self._commit("first")
+
+        self.config_file = Path(self.test_dir.name) / "test_config.ini"
+        self.config_file.write_text(f"""[ansible_shed]
+interval=60
+port=12345
+repo_path={self.repo_path}
+repo_url=git@github.com:test/test.git
+repo_key=/dev/null
+ansible_playbook_binary=/usr/bin/ansible-playbook
+ansible_hosts_inventory=hosts
+ansible_playbook_init=site.yaml
+targeted_runs=true
+target_map_file=targets.ini
+""")
+        self.shed = Shed(self.config_file)
+        self.job_state = self.shed.job_states[DEFAULT_JOB_NAME]
+        self.job_state.last_success_sha = self.base_sha
+        self.job_state.last_success_job = self.shed.default_job
+        self.job_state.last_full_run_epoch = time()
+
+    def tearDown(self) -> None:
+        self.test_dir.cleanup()
+
+    def _git(self, *args: str) -> str:
+        return subprocess.run(
+            ["git", "-c", "user.email=t@t.com", "-c", "user.name=t", *args],
+            cwd=self.repo_path,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+
+    def _commit(self, message: str) -> str:
+        self._git("add", "-A")
+        self._git("commit", "-q", "-m", message)
+        return self._git("rev-parse", "HEAD")
+
+    def test_role_change_targets_role_tag(self) -> None:
+        (self.repo_path / "roles" / "chrony" / "tasks" / "main.yaml").write_text("-")
+        self.shed.repo_head_sha = self._commit("chrony")
+        targeted = asyncio.run(
+            self.shed._target_job(self.shed.default_job, self.job_state)
+        )
+        assert targeted is not None
+        decision, reason, job = targeted
+        self.assertEqual((decision, reason), ("targeted", "head_changed"))
+        self.assertEqual(job.tags, "chrony")
+        self.assertIsNone(job.limit)
+        self.assertIn("--tags", self.shed._ansible_playbook_cmd(job))
+
+    def test_warns_without_unchanged_mode(self) -> None:
+        with self.assertLogs("ansible_shed.shed", "WARNING") as logs:
+            Shed(self.config_file)
+        self.assertTrue(any("unchanged_mode" in line for line in logs.output))
+        # HEAD unchanged: nothing to target, unchanged_mode decides
+        self.shed.repo_head_sha = self.base_sha
+        self.assertIsNone(
+            asyncio.run(self.shed._target_job(self.shed.default_job, self.job_state))
+        )
+
+        with self.config_file.open("a") as f:
+            f.write("unchanged_mode=skip\n")
+        with self.assertLogs("ansible_shed.shed", "WARNING") as logs:
+            Shed(self.config_file)
+        self.assertFalse(any("unchanged_mode" in line for line in logs.output))
+
+    def test_fallbacks_to_full_run(self) -> None:
+        (self.repo_path / "site.yaml").write_text("---\n# v2\n")
+        self.shed.repo_head_sha = self._commit("playbook")
+        self.assertEqual(
+            asyncio.run(self.shed._target_job(self.shed.default_job, self.job_state)),
+            ("run", "unmapped_path", self.shed.default_job),
+        )
+
+        self.job_state.last_full_run_epoch = time() - 86401
+        self.assertEqual(
+            asyncio.run(self.shed._target_job(self.shed.default_job, self.job_state)),
+            ("run", "full_run_interval", self.shed.default_job),
+        )
+
+        self.job_state.last_full_run_epoch = time()
+        self.job_state.last_success_sha = "0" * 40
+        self.assertEqual(
+            asyncio.run(self.shed._target_job(self.shed.default_job, self.job_state)),
+            ("run", "diff_failed", self.shed.default_job),
+        )
+
+        self.job_state.last_success_sha = None
+        self.assertIsNone(
+            asyncio.run(self.shed._target_job(self.shed.default_job, self.job_state))
+        )
+
+    def test_ignored_changes_skip_run(self) -> None:
+        (self.repo_path / "docs").mkdir()
+        (self.repo_path / "docs" / "README.md").write_text("docs")
+        self.shed.repo_head_sha = self._commit("docs")
+        self.assertEqual(
+            asyncio.run(self.shed._target_job(self.shed.default_job, self.job_state)),
+            ("skip", "no_matching_changes", self.shed.default_job),
+        )
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
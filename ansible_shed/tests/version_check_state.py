@@ -6,7 +6,7 @@ import tempfile
 import unittest
 from datetime import datetime, timezone
 from pathlib import Path
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
 from ansible_shed.shed import Shed
 
@@ -150,9 +150,9 @@ version_check_state_enabled=false
         original_parse_version_check = shed.parse_version_check_state
         original_parse_stats = shed.parse_ansible_stats
 
-        def tracked_parse_version_check() -> None:
+        def tracked_parse_version_check(checkout: Path | None = None) -> None:
             call_order.append("parse_version_check_state")
-            original_parse_version_check()
+            original_parse_version_check(checkout)
 
         def tracked_parse_stats(output: str, returncode: int) -> None:
             call_order.append("parse_ansible_stats")
@@ -164,13 +164,13 @@ version_check_state_enabled=false
         shed.parse_ansible_stats = tracked_parse_stats  # type: ignore[assignment,method-assign]
 
         # Stub out methods we don't need for this test
-        shed._rebase_or_clone_repo = Mock()  # type: ignore[method-assign]
-        shed._run_ansible = Mock(return_value=(0, ""))  # type: ignore[method-assign]
+        shed._rebase_or_clone_repo = AsyncMock()  # type: ignore[method-assign]
+        shed._run_ansible = AsyncMock(return_value=(0, ""))  # type: ignore[method-assign]
 
         async def run_one_iteration() -> None:
             loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, shed._rebase_or_clone_repo)
-            await loop.run_in_executor(None, shed._run_ansible)
+            await shed._rebase_or_clone_repo()
+            await shed._run_ansible()
             # Mirror the actual ansible_runner call order
             await loop.run_in_executor(None, shed.parse_version_check_state)
             await loop.run_in_executor(None, shed.parse_ansible_stats, "", 0)
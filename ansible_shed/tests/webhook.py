@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+import asyncio
+import hashlib
+import hmac
+import tempfile
+import unittest
+from json import dumps
+from pathlib import Path
+from time import time
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from ansible_shed.jobs import DEFAULT_JOB_NAME
+from ansible_shed.shed import Shed
+
+SECRET = "webhook-secret"
+
+
+def _signed(body: bytes, secret: str = SECRET) -> dict[str, str]:
+    digest = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return {"X-Hub-Signature-256": f"sha256={digest}"}
+
+
+class GitWebhookTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.test_path = Path(self.test_dir.name)
+        self.config_file = self.test_path / "test_config.ini"
+        self.config_file.write_text(f"""[ansible_shed]
+interval=60
+port=12345
+repo_path={self.test_path / "repo"}
+repo_url=git@github.com:test/test.git
+repo_key={self.test_path / "key"}
+ansible_hosts_inventory=hosts
+ansible_playbook_init=site.yaml
+webhook_secret={SECRET}
+webhook_debounce=0
+
+[job:zfs]
+interval=120
+""")
+        self.shed = Shed(self.config_file)
+        self.client = TestClient(TestServer(self.shed._api_app()))
+        await self.client.start_server()
+
+    async def asyncTearDown(self) -> None:
+        await self.client.close()
+        self.test_dir.cleanup()
+
+    async def _push(self, ref: str = "refs/heads/main") -> tuple[int, str]:
+        body = dumps({"ref": ref}).encode()
+        resp = await self.client.post("/webhook/git", data=body, headers=_signed(body))
+        return resp.status, (await resp.json())["status"]
+
+    async def test_signature_required(self) -> None:
+        body = b'{"ref": "refs/heads/main"}'
+        for headers in ({}, _signed(body, "wrong"), {"X-Hub-Signature-256": "ü"}):
+            resp = await self.client.post("/webhook/git", data=body, headers=headers)
+            self.assertEqual(resp.status, 401)
+        self.shed.webhook_secret = None
+        resp = await self.client.post("/webhook/git", data=body, headers=_signed(body))
+        self.assertEqual(resp.status, 401)
+        self.assertNotIn("webhook_pushes_total", self.shed.prom_stats)
+
+    async def test_ping_and_other_branches_ignored(self) -> None:
+        headers = {"X-GitHub-Event": "ping", **_signed(b"{}")}
+        resp = await self.client.post("/webhook/git", data=b"{}", headers=headers)
+        self.assertEqual((await resp.json())["status"], "pong")
+        self.assertEqual(await self._push("refs/heads/feature"), (200, "ignored"))
+        self.assertIsNone(self.shed._webhook_debounce_task)
+
+    async def test_pushes_are_coalesced(self) -> None:
+        self.shed.webhook_debounce_seconds = 1
+        self.shed.last_fetch_epoch = time()
+        for job_state in self.shed.job_states.values():
+            job_state.next_run_epoch = time() + 3600
+
+        self.assertEqual(await self._push(), (202, "scheduled"))
+        self.assertEqual(await self._push(), (202, "coalesced"))
+        self.assertFalse(self.shed.webhook_run_requested.is_set())
+        assert self.shed._webhook_debounce_task is not None
+        await self.shed._webhook_debounce_task
+
+        self.assertTrue(self.shed.webhook_run_requested.is_set())
+        self.assertEqual(self.shed.last_fetch_epoch, 0.0)
+        self.assertEqual(self.shed.prom_stats["webhook_pushes_total"], 2)
+        self.assertEqual(self.shed.prom_stats["webhook_runs_triggered_total"], 1)
+        job, _ = self.shed._next_due_job()
+        assert job is not None
+        self.assertEqual(job.name, DEFAULT_JOB_NAME)
+
+    async def test_push_during_run_queues_one_follow_up(self) -> None:
+        job_state = self.shed.job_states["zfs"]
+        job_state.running = True
+        job_state.next_run_epoch = time() + 120
+        for _ in range(3):
+            await self._push()
+            assert self.shed._webhook_debounce_task is not None
+            await self.shed._webhook_debounce_task
+        self.assertLessEqual(job_state.next_run_epoch, time())
+        self.assertFalse(job_state.force_run_pending)
+        self.assertEqual(self.shed.prom_stats["webhook_runs_triggered_total"], 3)
+
+        # Still running: not due yet, then due exactly once when it finishes
+        self.shed.job_states[DEFAULT_JOB_NAME].next_run_epoch = time() + 3600
+        self.assertIsNone(self.shed._next_due_job()[0])
+        job_state.running = False
+        job, _ = self.shed._next_due_job()
+        assert job is not None
+        self.assertEqual(job.name, "zfs")
+        job_state.next_run_epoch = time() + 120
+        self.assertIsNone(self.shed._next_due_job()[0])
+
+    async def test_wakes_scheduler(self) -> None:
+        wakeup = asyncio.create_task(self.shed._wait_for_scheduler_wakeup(30))
+        await self._push()
+        await asyncio.wait_for(wakeup, 5)
+        self.assertFalse(self.shed.webhook_run_requested.is_set())
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -12,8 +12,23 @@ if "MYPYC_BUILD" in environ:
     ext_modules = mypycify(
         [
             "ansible_shed/__init__.py",
+            "ansible_shed/cardinality.py",
+            "ansible_shed/fact_cache.py",
+            "ansible_shed/git_backend.py",
+            "ansible_shed/host_stats.py",
+            "ansible_shed/jobs.py",
+            "ansible_shed/label_tracker.py",
+            "ansible_shed/live_log.py",
             "ansible_shed/main.py",
+            "ansible_shed/metrics_cache.py",
+            "ansible_shed/output_parser.py",
+            "ansible_shed/performance.py",
+            "ansible_shed/run_history.py",
+            "ansible_shed/run_logs.py",
+            "ansible_shed/self_metrics.py",
+            "ansible_shed/sharding.py",
             "ansible_shed/shed.py",
+            "ansible_shed/targeting.py",
         ],
         opt_level="3",
         verbose=True,